@@ -0,0 +1,96 @@
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from datetime import datetime, timezone
+from typing import Optional
+from database.connection import transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+def search_key(params: dict) -> str:
+    """
+    Вычисляет ключ ответа поиска по параметрам запроса (без API ключа).
+    Returns:
+        str: sha256 от отсортированных параметров запроса.
+    """
+    payload = json.dumps(sorted((name, str(value)) for name, value in params.items()
+                                if name != "key"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """
+    Кэш ответов YouTube Data API с ETag. Сохраненный ETag отправляется в
+    заголовке If-None-Match, и при ответе 304 используется сохраненный ответ.
+    Если db_name не задан, кэш хранится только в памяти процесса, иначе -
+    в таблице youtube_search_cache.
+    """
+
+    def __init__(self, db_name: Optional[str] = None):
+        """
+        Args:
+            db_name(str): Имя файла базы данных; None - кэш в памяти.
+        """
+        self.db_name = db_name
+        self._memory: dict[str, tuple[str, dict]] = {}
+        self._lock = threading.Lock()
+        if db_name is None:
+            return
+        try:
+            with transaction(db_name) as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS youtube_search_cache (
+                        key TEXT PRIMARY KEY,
+                        etag TEXT NOT NULL,
+                        body TEXT NOT NULL,
+                        created_at TEXT NOT NULL
+                    );
+                    """)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка инициализации кэша поиска: {e}")
+
+    def get(self, key: str) -> Optional[tuple[str, dict]]:
+        """
+        Возвращает сохраненный ответ.
+        Args:
+            key(str): Ключ, вычисленный search_key.
+        Returns:
+            Optional[tuple[str, dict]]: ETag и тело ответа или None.
+        """
+        if self.db_name is None:
+            with self._lock:
+                return self._memory.get(key)
+        try:
+            with transaction(self.db_name) as conn:
+                row = conn.execute("SELECT etag, body FROM youtube_search_cache WHERE key = ?",
+                                   (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения кэша поиска: {e}")
+            return None
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set(self, key: str, etag: str, body: dict) -> None:
+        """
+        Сохраняет ответ.
+        Args:
+            key(str): Ключ, вычисленный search_key.
+            etag(str): ETag ответа.
+            body(dict): Тело ответа.
+        """
+        if self.db_name is None:
+            with self._lock:
+                self._memory[key] = (etag, body)
+            return
+        try:
+            with transaction(self.db_name) as conn:
+                conn.execute("INSERT OR REPLACE INTO youtube_search_cache "
+                             "(key, etag, body, created_at) VALUES (?, ?, ?, ?)",
+                             (key, etag, json.dumps(body, ensure_ascii=False),
+                              datetime.now(timezone.utc).isoformat(timespec="seconds")))
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи в кэш поиска: {e}")
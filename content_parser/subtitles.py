@@ -0,0 +1,136 @@
+from array import array
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+
+MANUAL = "manual"
+GENERATED = "generated"
+TRANSLATED = "translated"
+
+# Порядок выбора субтитров: (язык, вид). Вид translated - перевод YouTube
+# любых субтитров, которые можно перевести на этот язык.
+DEFAULT_PREFERENCES = (
+    ("ru", MANUAL),
+    ("ru", GENERATED),
+    ("en", MANUAL),
+    ("en", GENERATED),
+    ("ru", TRANSLATED),
+)
+
+
+class SubtitleLine(NamedTuple):
+    text: str
+    start: float
+    duration: float
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+
+class Subtitles:
+    """
+    Субтитры ролика с таймингами строк.
+    Текст всех строк хранится одной строкой, а границы строк, начала и
+    длительности - в массивах array, поэтому на строку не создается
+    отдельных объектов, пока к ней не обратились.
+    """
+
+    def __init__(self, lines: Iterable[tuple[str, float, float]], language_code: str,
+                 kind: str = MANUAL):
+        """
+        Args:
+            lines(Iterable[tuple[str, float, float]]): Строки: текст, начало
+            и длительность в секундах.
+            language_code(str): Код языка субтитров.
+            kind(str): Вид субтитров: manual, generated или translated.
+        """
+        self.language_code = language_code
+        self.kind = kind
+        self.starts = array('d')
+        self.durations = array('d')
+        self._offsets = array('L', [0])
+        texts = []
+        position = 0
+        for text, start, duration in lines:
+            texts.append(text)
+            position += len(text) + 1
+            self._offsets.append(position)
+            self.starts.append(start)
+            self.durations.append(duration)
+        # Строки разделены переводом строки, как в TextFormatter.
+        self.text = '\n'.join(texts)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict], language_code: str,
+                     kind: str = MANUAL) -> "Subtitles":
+        """Создает субтитры из ответа Transcript.fetch()."""
+        return cls(((entry['text'], entry['start'], entry.get('duration', 0.0))
+                    for entry in entries), language_code, kind)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def line_text(self, index: int) -> str:
+        """Возвращает текст строки index без создания SubtitleLine."""
+        return self.text[self._offsets[index]:self._offsets[index + 1] - 1]
+
+    def __getitem__(self, index: int) -> SubtitleLine:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Номер строки субтитров вне диапазона.")
+        return SubtitleLine(self.line_text(index), self.starts[index], self.durations[index])
+
+    def __iter__(self) -> Iterator[SubtitleLine]:
+        for index in range(len(self)):
+            yield SubtitleLine(self.line_text(index), self.starts[index], self.durations[index])
+
+    def line_at(self, offset: int) -> int:
+        """
+        Находит строку, в которую попадает позиция offset в self.text.
+        Returns:
+            int: Номер строки.
+        """
+        low, high = 0, len(self) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._offsets[middle] <= offset:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def time_at(self, offset: int) -> float:
+        """Возвращает время начала строки, содержащей позицию offset в self.text."""
+        return self.starts[self.line_at(offset)] if len(self) else 0.0
+
+    @property
+    def duration(self) -> float:
+        """Время окончания последней строки в секундах."""
+        return self.starts[-1] + self.durations[-1] if len(self) else 0.0
+
+
+def select_transcript(transcripts: Iterable, preferences=DEFAULT_PREFERENCES) -> Optional[tuple]:
+    """
+    Выбирает субтитры по списку предпочтений.
+    Args:
+        transcripts(Iterable): Субтитры ролика (TranscriptList или список
+        объектов с language_code, is_generated, is_translatable и
+        translation_languages).
+        preferences: Пары (язык, вид) в порядке предпочтения.
+    Returns:
+        Optional[tuple]: Выбранные субтитры (для вида translated - уже
+        переведенные через translate()), код языка и вид; None, если ни
+        одна пара не подошла.
+    """
+    transcripts = list(transcripts)
+    for language_code, kind in preferences:
+        for transcript in transcripts:
+            if kind == TRANSLATED:
+                codes = {language['language_code'] for language in transcript.translation_languages}
+                if transcript.is_translatable and language_code in codes:
+                    return transcript.translate(language_code), language_code, kind
+            elif (transcript.language_code == language_code
+                  and transcript.is_generated == (kind == GENERATED)):
+                return transcript, language_code, kind
+    return None
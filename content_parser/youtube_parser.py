@@ -4,116 +4,201 @@ import random
 import logging
 import requests
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, Optional, Union
 from dotenv import load_dotenv
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-from youtube_transcript_api.formatters import TextFormatter
+from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled
+from utils import transport
+from utils.transport import RetryPolicy
+from utils.rate_limit import get_limiter
+from content_parser.search_cache import SearchCache, search_key
+from content_parser.subtitles import (DEFAULT_PREFERENCES, MANUAL, GENERATED, Subtitles,
+                                      select_transcript)
 
 
 logger = logging.getLogger(__name__)
 
+YOUTUBE_SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
+# Максимальный maxResults метода search.
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_WORKERS = 4
+
+
+def _search_page(api_key: str, query: str, page_size: int, page_token: Optional[str],
+                 cache: Optional[SearchCache], retry: RetryPolicy) -> tuple[list[str], Optional[str]]:
+    """
+    Запрашивает одну страницу выдачи YouTube.
+    Если задан cache, отправляет сохраненный ETag в If-None-Match и при
+    ответе 304 использует сохраненный ответ.
+    Returns:
+        tuple[list[str], Optional[str]]: ID видео на странице и токен
+        следующей страницы (None - страниц больше нет).
+    Raises:
+        requests.exceptions.RequestException: При сетевой ошибке или ответе
+        с ошибкой.
+    """
+    params = {"part": "snippet", "maxResults": page_size, "q": query, "type": "video",
+              "videoDuration": "long", "key": api_key}
+    if page_token:
+        params["pageToken"] = page_token
+    key = search_key(params)
+    cached = cache.get(key) if cache is not None else None
+    headers = {"If-None-Match": cached[0]} if cached else {}
+
+    response = transport.get(YOUTUBE_SEARCH_URL, params=params, headers=headers,
+                             retry=retry, provider="youtube")
+    if response.status_code == 304 and cached:
+        logger.info(f"Страница выдачи по запросу '{query}' не изменилась, взята из кэша.")
+        data = cached[1]
+    elif response.status_code == 200:
+        data = response.json()
+        etag = data.get("etag") or response.headers.get("ETag")
+        if cache is not None and etag:
+            cache.set(key, etag, data)
+    else:
+        raise requests.exceptions.HTTPError(
+            f"Ошибка запроса к API YouTube: {response.status_code}", response=response)
+
+    video_ids = []
+    for item in data.get('items', []):
+        video_id = item['id'].get('videoId')
+        title = item['snippet'].get('title')
+        if video_id and title:
+            video_ids.append(video_id)
+            logger.info(f"ID: {video_id}, Title: {title}")
+        else:
+            logger.warning("Недостаточные данные для одного из видео")
+    return video_ids, data.get('nextPageToken')
+
+
+def iter_video_ids(YOUTUBE_API_KEY: str,
+                   queries: Union[str, Iterable[str]],
+                   max_results: int,
+                   cache: Optional[SearchCache] = None,
+                   max_workers=SEARCH_MAX_WORKERS,
+                   retries=3,
+                   backoff_time=2) -> Iterator[str]:
+    """
+    Выдает id видео из выдачи YouTube по одному или нескольким запросам.
+    Запросы выполняются параллельно, по одной странице каждого запроса за
+    раунд; следующая страница берется по nextPageToken. Повторяющиеся id
+    пропускаются. Новые страницы не запрашиваются, как только набрано
+    max_results id или выдача закончилась.
+    Args:
+        YOUTUBE_API_KEY(str): API ключ YouTube.
+        queries(str | Iterable[str]): Поисковый запрос или список запросов.
+        max_results(int): Максимальное количество id.
+        cache(SearchCache): Кэш ответов с ETag.
+        max_workers(int): Количество запросов, выполняемых одновременно.
+        retries(int): Количество повторных попыток в случае неудачи.
+        backoff_time(int): Время задержки перед повторной попыткой (в секундах).
+    Yields:
+        str: ID видео в порядке получения.
+    """
+    if not YOUTUBE_API_KEY:
+        logger.error("API ключ для YouTube не может быть пустым.")
+        return
+    if max_results <= 0:
+        logger.error("max_results должно быть больше нуля.")
+        return
+
+    queries = [queries] if isinstance(queries, str) else list(dict.fromkeys(queries))
+    retry = RetryPolicy(retries=retries, backoff_time=backoff_time)
+    # Запрос -> токен следующей страницы (None - первая страница).
+    active: dict[str, Optional[str]] = {query: None for query in queries}
+    seen = set()
+    counts = dict.fromkeys(queries, 0)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries)))) as executor:
+        while active and len(seen) < max_results:
+            page_size = min(SEARCH_PAGE_SIZE, max_results - len(seen))
+            futures = {executor.submit(_search_page, YOUTUBE_API_KEY, query, page_size, token,
+                                       cache, retry): query
+                       for query, token in active.items()}
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    video_ids, next_token = future.result()
+                except requests.exceptions.RequestException as e:
+                    logger.error(f"Ошибка при запросе '{query}': {e}")
+                    active.pop(query)
+                    continue
+                if next_token and video_ids:
+                    active[query] = next_token
+                else:
+                    active.pop(query)
+                for video_id in video_ids:
+                    if video_id in seen or len(seen) >= max_results:
+                        continue
+                    seen.add(video_id)
+                    counts[query] += 1
+                    yield video_id
+
+    for query, count in counts.items():
+        logger.info(f"Получено {count} id по запросу '{query}' на YouTube")
+
 
 def youtube_video_id_parser(YOUTUBE_API_KEY: str,
-                            query: str,
+                            query: Union[str, Iterable[str]],
                             max_results: int,
                             retries=3,
-                            backoff_time=2) -> list[str]:
+                            backoff_time=2,
+                            cache: Optional[SearchCache] = None) -> list[str]:
     """
     Парсит выдачу YouTube по запросу.
-    Парсит выдачу YouTube по запросу query и возвращает список результатов в
-    количестве max_results штук.
+    Парсит выдачу YouTube по запросу query (или нескольким запросам) и
+    возвращает список уникальных результатов в количестве max_results штук,
+    проходя по страницам выдачи (см. iter_video_ids).
     Args:
         YOUTUBE_API_KEY(str): API ключ YouTube.
-        query(str): Поисковый запрос.
+        query(str | Iterable[str]): Поисковый запрос или список запросов.
         max_results(int): Максимальное количество получаемых результатов.
         retries(int): Количество повторных попыток в случае неудачи.
         backoff_time(int): Время задержки перед повторной попыткой (в секундах).
+        cache(SearchCache): Кэш ответов с ETag.
     Returns:
         list[str]: Список id видео из первых результатов поиска в количестве
                     max_results штук.
-    Raises:
     """
-    if not YOUTUBE_API_KEY:
-        logger.error("API ключ для YouTube не может быть пустым.")
-        return []
-
-    if max_results <=0:
-        logger.error("max_results должно быть больше нуля.")
-        return []
-
-    url_youtube_data_api = (f"https://www.googleapis.com/youtube/v3/search?"
-                            f"part=snippet&"
-                            f"maxResults={max_results}&"
-                            f"q={query}&"
-                            f"type=video&"
-                            f"videoDuration=long&"
-                            f"key={YOUTUBE_API_KEY}")
-
-    list_of_id = []
-
-    for attempt in range(retries):
-        try:
-            response = requests.get(url_youtube_data_api)
-
-            if response.status_code == 200:
-                data = response.json()
-
-                for item in data.get('items', []):
-                    video_id = item['id'].get('videoId')
-                    title = item['snippet'].get('title')
+    return list(iter_video_ids(YOUTUBE_API_KEY, query, max_results, cache=cache,
+                               retries=retries, backoff_time=backoff_time))
 
-                    if video_id and title:
-                        list_of_id.append(video_id)
-                        logger.info(f"ID: {video_id}, Title: {title}")
-                    else:
-                        logger.warning("Недостаточные данные для одного из видео")
-                logger.info(f"Получено {len(list_of_id)} id по запросу '{query}' на YouTube")
-                return list_of_id
 
-            else:
-                logger.error(f"Ошибка запроса к API YouTube: {response.status_code}")
-                break
-        except requests.exceptions.Timeout:
-            logger.warning(f"Превышено время ожидания. Попытка {attempt+1} из {retries}.")
-            time.sleep(backoff_time)
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при запросе: {e}")
-            break
-
-    return list_of_id
-
-
-def youtube_subtitles_parser(video_id: str, language_code="en",
-                             retries=3, backoff_time=2) -> str:
+def fetch_subtitles(video_id: str, preferences=DEFAULT_PREFERENCES,
+                    retries=3, backoff_time=2) -> Optional[Subtitles]:
     """
-    Парсит субтитры c YouTube на указанном языке.
+    Получает субтитры ролика за один запрос списка субтитров.
+    Список субтитров запрашивается один раз, из него выбираются лучшие
+    субтитры по preferences (по умолчанию: ручные ru, автоматические ru,
+    ручные en, автоматические en, перевод YouTube на ru).
     Args:
         video_id(str): ID видео на YouTube.
-        language_code(str): Язык субтитров, по умолчанию "en".
+        preferences: Пары (язык, вид) в порядке предпочтения, см.
+        content_parser.subtitles.DEFAULT_PREFERENCES.
         retries(int): Количество повторных попыток в случае неудачи.
         backoff_time(int): Время задержки перед повторной попыткой (в секундах).
     Returns:
-        str: Субтитры на указанном языке или None, если их нет.
+        Optional[Subtitles]: Субтитры с таймингами или None, если подходящих нет.
     """
     if not video_id:
         logger.error("video_id не может быть пустым.")
         return None
 
+    limiter = get_limiter("youtube")
     for attempt in range(retries):
         try:
+            limiter.acquire()
             transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-            if language_code in transcript_list._manually_created_transcripts:
-                transcript = transcript_list.find_manually_created_transcript([language_code])
-                logger.info(f"Получены вручную созданные субтитры на языке {language_code}.")
-            else:
-                transcript = transcript_list.find_generated_transcript([language_code])
-                logger.info(f"Получены сгенерированные субтитры на языке {language_code}.")
-            formatter = TextFormatter()
-            subtitles_text = formatter.format_transcript(transcript.fetch())
-            return subtitles_text
-
-        except NoTranscriptFound:
-            logger.error(f"Субтитры на языке '{language_code}' не найдены для видео ID {video_id}.")
-            return None
+            selected = select_transcript(transcript_list, preferences)
+            if selected is None:
+                logger.error(f"Подходящие субтитры не найдены для видео ID {video_id}.")
+                return None
+            transcript, language_code, kind = selected
+            limiter.acquire()
+            subtitles = Subtitles.from_entries(transcript.fetch(), language_code, kind)
+            logger.info(f"Получены субтитры ({kind}) на языке {language_code}, "
+                        f"строк: {len(subtitles)}.")
+            return subtitles
 
         except TranscriptsDisabled:
             logger.error(f"Субтитры отключены для видео ID {video_id}.")
@@ -133,6 +218,23 @@ def youtube_subtitles_parser(video_id: str, language_code="en",
             return None
 
 
+def youtube_subtitles_parser(video_id: str, language_code="en",
+                             retries=3, backoff_time=2) -> str:
+    """
+    Парсит субтитры c YouTube на указанном языке.
+    Args:
+        video_id(str): ID видео на YouTube.
+        language_code(str): Язык субтитров, по умолчанию "en".
+        retries(int): Количество повторных попыток в случае неудачи.
+        backoff_time(int): Время задержки перед повторной попыткой (в секундах).
+    Returns:
+        str: Субтитры на указанном языке или None, если их нет.
+    """
+    subtitles = fetch_subtitles(video_id, ((language_code, MANUAL), (language_code, GENERATED)),
+                                retries=retries, backoff_time=backoff_time)
+    return subtitles.text if subtitles else None
+
+
 def main():
     load_dotenv()
     YOUTUBE_API_KEY = os.environ.get('YOUTUBE_API_KEY')
@@ -140,16 +242,10 @@ def main():
     max_results = 5
     res = youtube_video_id_parser(YOUTUBE_API_KEY, query, max_results)
     print(res)
-    subtitles = ""
-    subtitles = youtube_subtitles_parser(res[0], 'ru')
+    subtitles = fetch_subtitles(res[0])
     if subtitles:
-        print("Оригинальные субтитры YouTube на русском языке:")
-        print(subtitles)
-    else:
-        print("Переведенные субтитры YouTube на русском языке:")
-        subtitles = youtube_subtitles_parser(res[0], 'en')
-        print(text_translator_mymemory(subtitles))
-
+        print(f"Субтитры YouTube ({subtitles.kind}) на языке {subtitles.language_code}:")
+        print(subtitles.text)
 
 if __name__ == '__main__':
     main()
@@ -1,2 +1,8 @@
+from .codec import *
+from .connection import *
+from .reference import *
 from .database import *
 from .db_models import *
+from .translation_memory import *
+from .rewrite_progress import *
+from .fulltext import *
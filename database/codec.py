@@ -0,0 +1,371 @@
+import zlib
+import sqlite3
+import logging
+import threading
+
+from typing import NamedTuple, Optional, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["COMPRESSED_COLUMNS", "CompressionReport", "LazyText", "compress_text",
+           "decompress_text", "lazy_text", "compression_enabled", "enable_compression",
+           "train_dictionary", "migrate_compression"]
+
+# Колонки с большими текстами, которые хранятся сжатыми.
+COMPRESSED_COLUMNS = {
+    "original_texts": "text",
+    "translates": "translated_text",
+    "rewrites": "rewrite_text",
+}
+
+# Сжатое значение хранится как BLOB: MAGIC, байт метода и сжатые данные.
+MAGIC = b"HZ"
+METHOD_ZLIB = b"z"
+METHOD_ZSTD = b"s"
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+DICTIONARY_SIZE = 64 * 1024
+
+_settings: dict[str, bool] = {}
+_dictionaries: dict[int, bytes] = {}
+# Файлы БД зарегистрированных соединений, из которых догружаются словари.
+_sources: set[str] = set()
+_lock = threading.Lock()
+
+
+class CompressionReport(NamedTuple):
+    rows: int
+    bytes_before: int
+    bytes_after: int
+
+    @property
+    def saved_ratio(self) -> float:
+        return 1 - self.bytes_after / self.bytes_before if self.bytes_before else 0.0
+
+
+def _ensure_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS codec_settings (
+            db_key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS codec_dictionaries (
+            dict_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL
+        );
+        """)
+
+
+def register_connection(conn: sqlite3.Connection) -> None:
+    """
+    Регистрирует в соединении SQL-функцию harvester_decompress() и загружает
+    обученные словари zstd. Вызывается для каждого соединения get_connection().
+    Триггеры полнотекстового индекса (см. enable_fulltext) вызывают
+    harvester_decompress(), поэтому соединение, открытое в обход
+    get_connection (sqlite3.connect, сторонние инструменты), должно быть
+    передано в эту функцию до записи в original_texts и rewrites, иначе
+    запись завершится ошибкой "no such function".
+    Args:
+        conn(sqlite3.Connection): Соединение с БД.
+    """
+    conn.create_function("harvester_decompress", 1, decompress_text, deterministic=True)
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    try:
+        rows = conn.execute("SELECT dict_id, data FROM codec_dictionaries").fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    with _lock:
+        if path:
+            _sources.add(path)
+        _dictionaries.update(rows)
+
+
+def _dictionary(dict_id: int) -> bytes:
+    """
+    Возвращает словарь zstd по ID. Словарь, обученный после открытия
+    соединений (например, другим процессом-воркером), загружается из БД.
+    """
+    with _lock:
+        data = _dictionaries.get(dict_id)
+        sources = list(_sources)
+    if data is not None:
+        return data
+    for path in sources:
+        # Отдельное соединение: функция может выполняться внутри запроса.
+        try:
+            conn = sqlite3.connect(path)
+            try:
+                row = conn.execute("SELECT data FROM codec_dictionaries WHERE dict_id = ?",
+                                   (dict_id,)).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            continue
+        if row:
+            with _lock:
+                _dictionaries[dict_id] = row[0]
+            return row[0]
+    raise ValueError(f"Словарь zstd {dict_id} не найден.")
+
+
+def _latest_dictionary() -> Optional[tuple[int, bytes]]:
+    with _lock:
+        if not _dictionaries:
+            return None
+        dict_id = max(_dictionaries)
+        return dict_id, _dictionaries[dict_id]
+
+
+def compress_text(text: Optional[str]) -> Union[str, bytes, None]:
+    """
+    Сжимает текст (zstd с обученным словарем, если доступен, иначе zlib).
+    Args:
+        text(str): Исходный текст.
+    Returns:
+        Union[str, bytes, None]: Сжатое значение или исходный текст, если
+        сжатие не уменьшает размер.
+    """
+    if not text:
+        return text
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        latest = _latest_dictionary()
+        dictionary = zstandard.ZstdCompressionDict(latest[1]) if latest else None
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+        packed = MAGIC + METHOD_ZSTD + compressor.compress(raw)
+    else:
+        packed = MAGIC + METHOD_ZLIB + zlib.compress(raw, ZLIB_LEVEL)
+    return packed if len(packed) < len(raw) else text
+
+
+def decompress_text(value: Union[str, bytes, None]) -> Optional[str]:
+    """
+    Возвращает текст из значения колонки (сжатого или обычного).
+    Args:
+        value: Значение колонки: str, сжатый BLOB или None.
+    Returns:
+        Optional[str]: Исходный текст.
+    Raises:
+        ValueError: Если значение сжато zstd, а модуль zstandard не установлен
+        или словарь не найден.
+    """
+    if not isinstance(value, (bytes, memoryview)):
+        return value
+    value = bytes(value)
+    if not value.startswith(MAGIC):
+        return value.decode("utf-8")
+    method, payload = value[2:3], value[3:]
+    if method == METHOD_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if method == METHOD_ZSTD:
+        if zstandard is None:
+            raise ValueError("Для чтения текста, сжатого zstd, нужен модуль zstandard.")
+        dict_id = zstandard.get_frame_parameters(payload).dict_id
+        dictionary = None
+        if dict_id:
+            dictionary = zstandard.ZstdCompressionDict(_dictionary(dict_id))
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(payload).decode("utf-8")
+    raise ValueError(f"Неизвестный метод сжатия: {method!r}.")
+
+
+class LazyText:
+    """
+    Текст из БД, который распаковывается только при первом обращении к нему.
+    """
+
+    __slots__ = ("_raw", "_text")
+
+    def __init__(self, raw: Union[str, bytes]):
+        self._raw = raw
+        self._text: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = decompress_text(self._raw)
+            self._raw = None
+        return self._text
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LazyText):
+            other = other.text
+        return self.text == other
+
+    def __hash__(self) -> int:
+        return hash(self.text)
+
+    def __repr__(self) -> str:
+        return f"LazyText({self.text[:30]!r}...)"
+
+
+def lazy_text(value: Union[str, bytes, None]) -> Union[str, LazyText, None]:
+    """Оборачивает сжатое значение колонки в LazyText, обычный текст возвращает как есть."""
+    return LazyText(value) if isinstance(value, (bytes, memoryview)) else value
+
+
+def _transaction(db_name: str, immediate=False):
+    # Импорт внутри функции: модуль connection сам импортирует codec.
+    from .connection import transaction
+    return transaction(db_name, immediate=immediate)
+
+
+def compression_enabled(db_name="harvester_data.db") -> bool:
+    """
+    Проверяет, включено ли сжатие больших текстов для БД.
+    Args:
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+    Returns:
+        bool: True, если новые тексты нужно сжимать.
+    """
+    with _lock:
+        if db_name in _settings:
+            return _settings[db_name]
+    enabled = False
+    try:
+        with _transaction(db_name) as conn:
+            row = conn.execute("SELECT value FROM codec_settings "
+                               "WHERE db_key = 'compression'").fetchone()
+            enabled = bool(row and row[0] == "on")
+    except sqlite3.OperationalError:
+        pass
+    with _lock:
+        _settings[db_name] = enabled
+    return enabled
+
+
+def enable_compression(db_name="harvester_data.db", enabled=True) -> None:
+    """
+    Включает (или выключает) сжатие новых текстов в колонках
+    COMPRESSED_COLUMNS. Настройка сохраняется в БД. Уже записанные тексты
+    сжимаются командой migrate_compression.
+    Args:
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+        enabled(bool): Включить или выключить сжатие.
+    """
+    with _transaction(db_name) as conn:
+        _ensure_tables(conn)
+        conn.execute("INSERT OR REPLACE INTO codec_settings (db_key, value) "
+                     "VALUES ('compression', ?)", ("on" if enabled else "off",))
+    with _lock:
+        _settings[db_name] = enabled
+    logger.info(f"Сжатие текстов в {db_name} {'включено' if enabled else 'выключено'}.")
+
+
+def train_dictionary(db_name="harvester_data.db", samples=1000) -> Optional[int]:
+    """
+    Обучает общий словарь zstd на уже сохраненных текстах. Словарь заметно
+    улучшает сжатие похожих друг на друга текстов.
+    Args:
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+        samples(int): Количество текстов каждой таблицы для обучения.
+    Returns:
+        Optional[int]: ID словаря или None, если zstandard не установлен или
+        текстов недостаточно.
+    """
+    if zstandard is None:
+        logger.warning("Модуль zstandard не установлен, словарь не обучен.")
+        return None
+    with _transaction(db_name) as conn:
+        _ensure_tables(conn)
+        texts = []
+        for table, column in COMPRESSED_COLUMNS.items():
+            rows = conn.execute(f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL "
+                                f"ORDER BY id DESC LIMIT ?", (samples,))
+            texts.extend(decompress_text(row[0]).encode("utf-8") for row in rows)
+    try:
+        dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, texts)
+    except zstandard.ZstdError as e:
+        logger.warning(f"Не удалось обучить словарь: {e}")
+        return None
+    dict_id = dictionary.dict_id()
+    with _transaction(db_name) as conn:
+        conn.execute("INSERT OR REPLACE INTO codec_dictionaries (dict_id, data) VALUES (?, ?)",
+                     (dict_id, dictionary.as_bytes()))
+    with _lock:
+        _dictionaries[dict_id] = dictionary.as_bytes()
+    logger.info(f"Обучен словарь zstd {dict_id} на {len(texts)} текстах.")
+    return dict_id
+
+
+def migrate_compression(db_name="harvester_data.db", batch_size=500,
+                        vacuum=False) -> CompressionReport:
+    """
+    Сжимает уже записанные тексты и включает сжатие для новых.
+    Args:
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+        batch_size(int): Количество записей, сжимаемых в одной транзакции.
+        vacuum(bool): Выполнить VACUUM, чтобы вернуть освободившееся место.
+    Returns:
+        CompressionReport: Количество сжатых записей и их размер до и после.
+    """
+    enable_compression(db_name)
+    rows_total = bytes_before = bytes_after = 0
+    for table, column in COMPRESSED_COLUMNS.items():
+        last_id = 0
+        while True:
+            with _transaction(db_name, immediate=True) as conn:
+                rows = conn.execute(f"SELECT id, {column} FROM {table} "
+                                    f"WHERE id > ? AND typeof({column}) = 'text' "
+                                    f"ORDER BY id LIMIT ?", (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                updates = []
+                for row_id, text in rows:
+                    packed = compress_text(text)
+                    if isinstance(packed, bytes):
+                        updates.append((packed, row_id))
+                        bytes_before += len(text.encode("utf-8"))
+                        bytes_after += len(packed)
+                conn.executemany(f"UPDATE {table} SET {column} = ? WHERE id = ?", updates)
+                rows_total += len(updates)
+                last_id = rows[-1][0]
+    if vacuum:
+        with _transaction(db_name) as conn:
+            conn.commit()
+            conn.execute("VACUUM")
+    report = CompressionReport(rows_total, bytes_before, bytes_after)
+    logger.info(f"Сжато записей: {report.rows}, {report.bytes_before} -> {report.bytes_after} "
+                f"байт (экономия {report.saved_ratio:.0%}).")
+    return report
+
+
+def main():
+    import argparse
+    # При запуске через python -m этот файл выполняется как __main__, поэтому
+    # функции берутся из модуля пакета, состояние которого видит connection.
+    from database.database import initialize_db
+    from database.codec import migrate_compression, train_dictionary
+
+    parser = argparse.ArgumentParser(description="Сжатие больших текстов в БД.")
+    parser.add_argument("--db", default="harvester_data.db", help="Файл БД.")
+    parser.add_argument("--train", action="store_true",
+                        help="Обучить словарь zstd перед сжатием.")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Выполнить VACUUM после сжатия.")
+    args = parser.parse_args()
+
+    initialize_db(args.db)
+    if args.train:
+        train_dictionary(args.db)
+    report = migrate_compression(args.db, vacuum=args.vacuum)
+    print(f"Сжато записей: {report.rows}")
+    print(f"Размер текстов: {report.bytes_before} -> {report.bytes_after} байт "
+          f"(экономия {report.saved_ratio:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import logging
+import threading
+
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .codec import register_connection
+
+
+logger = logging.getLogger(__name__)
+
+# Режим журнала. WAL требует, чтобы все процессы работали с БД на одном
+# хосте; для файла БД на общем сетевом диске нужен DELETE (см.
+# pipeline.workers).
+JOURNAL_MODE = os.environ.get("HARVESTER_JOURNAL_MODE", "WAL")
+
+# Настройки, применяемые к каждому новому соединению.
+PRAGMAS = (
+    f"PRAGMA journal_mode={JOURNAL_MODE}",
+    "PRAGMA synchronous=NORMAL",
+    # Ожидание блокировки на запись, когда в БД пишут несколько процессов.
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+_local = threading.local()
+
+
+def _state() -> threading.local:
+    if not hasattr(_local, "connections"):
+        _local.connections = {}
+        _local.depths = {}
+    return _local
+
+
+def _is_open(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.total_changes
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+
+def _configure(conn: sqlite3.Connection) -> None:
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    register_connection(conn)
+
+
+def get_connection(db_name="harvester_data.db") -> sqlite3.Connection:
+    """
+    Возвращает соединение с БД, общее для всех операций текущего потока.
+    Соединение открывается при первом обращении и настраивается (WAL,
+    synchronous=NORMAL, увеличенный кэш страниц, функция распаковки
+    сжатых текстов harvester_decompress). Повторное использование
+    соединения позволяет sqlite3 переиспользовать подготовленные запросы
+    из своего кэша. Для ':memory:' у каждого потока своя БД.
+    Args:
+        db_name(str): Имя файла БД, по умолчанию 'harvester_data.db'.
+    Returns:
+        sqlite3.Connection: Соединение с БД.
+    """
+    state = _state()
+    conn = state.connections.get(db_name)
+    if conn is not None and _is_open(conn):
+        return conn
+    conn = sqlite3.connect(db_name)
+    try:
+        _configure(conn)
+    except sqlite3.Error as e:
+        logger.warning(f"Не удалось настроить соединение с {db_name}: {e}")
+    state.connections[db_name] = conn
+    state.depths[db_name] = 0
+    return conn
+
+
+@contextmanager
+def transaction(db_name="harvester_data.db", immediate=False) -> Iterator[sqlite3.Connection]:
+    """
+    Контекст транзакции: все записи внутри фиксируются вместе при выходе
+    или откатываются при исключении. Вложенные вызовы (в том числе из
+    функций insert_record и т.п.) присоединяются к внешней транзакции.
+    Args:
+        db_name(str): Имя файла БД.
+        immediate(bool): Сразу захватить блокировку на запись (BEGIN
+        IMMEDIATE), чтобы избежать конфликтов при чтении с последующей записью.
+    Yields:
+        sqlite3.Connection: Соединение с БД.
+    """
+    conn = get_connection(db_name)
+    state = _state()
+    depth = state.depths.get(db_name, 0)
+    if depth == 0 and immediate and not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    state.depths[db_name] = depth + 1
+    try:
+        yield conn
+        if depth == 0:
+            conn.commit()
+    except BaseException:
+        if depth == 0:
+            conn.rollback()
+        raise
+    finally:
+        state.depths[db_name] = depth
+
+
+def close_connection(db_name: Optional[str] = None) -> None:
+    """
+    Закрывает соединения текущего потока.
+    Args:
+        db_name(str): Имя файла БД, по умолчанию закрываются все соединения.
+    """
+    state = _state()
+    names = [db_name] if db_name else list(state.connections)
+    for name in names:
+        conn = state.connections.pop(name, None)
+        state.depths.pop(name, None)
+        if conn is not None and _is_open(conn):
+            conn.close()
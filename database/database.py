@@ -1,7 +1,12 @@
 import sqlite3
 import logging
 
-from typing import Optional, NamedTuple
+from functools import lru_cache
+from typing import Iterable, Optional, NamedTuple
+
+from .codec import COMPRESSED_COLUMNS, compress_text, compression_enabled
+from .connection import transaction
+from .reference import REFERENCE_TABLES, invalidate_reference_cache
 
 
 logger = logging.getLogger(__name__)
@@ -14,7 +19,7 @@ def initialize_db(db_name="harvester_data.db") -> None:
         db_name(str): Имя файла базы данных, по умолчанию 'harvester_data.db'.
     """
     try:
-        with sqlite3.connect(db_name) as conn:
+        with transaction(db_name) as conn:
             cursor = conn.cursor()
 
             # Таблица languages содержит возможные коды языков ("ru", "en"...).
@@ -173,6 +178,9 @@ def initialize_db(db_name="harvester_data.db") -> None:
                     publish_date TEXT,
                     status_id INTEGER,
                     published_url TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT,
+                    updated_at TEXT,
                     FOREIGN KEY (rewrite_id) REFERENCES rewrites(id),
                     FOREIGN KEY (channel_id) REFERENCES channels(id),
                     FOREIGN KEY (status_id) REFERENCES publication_status(id),
@@ -180,33 +188,178 @@ def initialize_db(db_name="harvester_data.db") -> None:
                 );
                 """)
 
-            conn.commit()
+            # Таблица rewrite_progress содержит состояние потоковых рерайтов,
+            # чтобы прерванный рерайт можно было продолжить.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS rewrite_progress (
+                    rewrite_id INTEGER PRIMARY KEY,
+                    translate_id INTEGER,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT,
+                    FOREIGN KEY (rewrite_id) REFERENCES rewrites(id),
+                    FOREIGN KEY (translate_id) REFERENCES translates(id)
+                );
+                """)
+
+            # Таблица jobs содержит состояние обработки роликов конвейером
+            # (video -> fetched -> cleaned -> translated -> rewritten ->
+            # published) и аренды воркеров, обрабатывающих ролики.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    youtube_id TEXT UNIQUE NOT NULL,
+                    state TEXT NOT NULL,
+                    language_code TEXT,
+                    subtitles_kind TEXT,
+                    timings BLOB,
+                    text_id INTEGER,
+                    translate_id INTEGER,
+                    rewrite_id INTEGER,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    FOREIGN KEY (text_id) REFERENCES original_texts(id),
+                    FOREIGN KEY (translate_id) REFERENCES translates(id),
+                    FOREIGN KEY (rewrite_id) REFERENCES rewrites(id)
+                );
+                """)
+
+            # Таблица fingerprints содержит SimHash-отпечатки субтитров роликов
+            # для поиска почти одинаковых текстов (перезаливок, нарезок).
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    youtube_id TEXT PRIMARY KEY,
+                    simhash INTEGER NOT NULL,
+                    duplicate_of TEXT,
+                    created_at TEXT
+                );
+                """)
+
+            # Таблица fingerprint_bands содержит полосы отпечатков (корзины LSH)
+            # для поиска кандидатов в дубликаты. bands - количество полос, на
+            # которое делится отпечаток (зависит от порога max_distance).
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprint_bands (
+                    youtube_id TEXT NOT NULL,
+                    bands INTEGER NOT NULL,
+                    band INTEGER NOT NULL,
+                    value INTEGER NOT NULL,
+                    PRIMARY KEY (youtube_id, bands, band),
+                    FOREIGN KEY (youtube_id) REFERENCES fingerprints(youtube_id)
+                );
+                """)
+
+            # Таблица translation_memory содержит переводы отдельных сегментов
+            # текста для повторного использования без обращения к API.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS translation_memory (
+                    hash TEXT PRIMARY KEY,
+                    source_text TEXT NOT NULL,
+                    translated_text TEXT NOT NULL,
+                    source_language_id INTEGER,
+                    target_language_id INTEGER,
+                    translator_id INTEGER,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT,
+                    last_used_at TEXT,
+                    FOREIGN KEY (source_language_id) REFERENCES languages(id),
+                    FOREIGN KEY (target_language_id) REFERENCES languages(id),
+                    FOREIGN KEY (translator_id) REFERENCES translators(id)
+                );
+                """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_translation_memory_last_used
+                ON translation_memory (last_used_at);
+                """)
+
+            # Колонки, добавленные в существующие таблицы после их создания.
+            migrations = {
+                "publications": {"created_at": "TEXT", "updated_at": "TEXT",
+                                 "attempts": "INTEGER NOT NULL DEFAULT 0"},
+                "jobs": {"subtitles_kind": "TEXT"},
+            }
+            for table_name, columns in migrations.items():
+                existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table_name})")}
+                for column, column_type in columns.items():
+                    if column not in existing:
+                        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {column_type};")
+
+            # Индексы по внешним ключам для соединений таблиц конвейера
+            # videos -> original_texts -> translates -> rewrites -> publications
+            # и фильтров по теме, каналу и статусу.
+            indexes = {
+                "idx_categories_subject": "categories (subject_id)",
+                "idx_topics_category": "topics (category_id)",
+                "idx_channels_platform": "channels (platform_id)",
+                "idx_channels_subject": "channels (subject_id)",
+                "idx_channels_categories_category": "channels_categories (category_id)",
+                "idx_original_texts_topic": "original_texts (topic_id)",
+                "idx_original_texts_language": "original_texts (language_id)",
+                "idx_videos_topic": "videos (topic_id)",
+                "idx_videos_text": "videos (text_id)",
+                "idx_translates_text": "translates (text_id, language_id)",
+                "idx_translates_translator": "translates (translator_id)",
+                "idx_translates_language": "translates (language_id)",
+                "idx_rewrites_translate": "rewrites (translate_id)",
+                "idx_rewrites_topic": "rewrites (topic_id)",
+                "idx_rewrites_language": "rewrites (language_id)",
+                "idx_publications_channel_status": "publications (channel_id, status_id)",
+                "idx_publications_status": "publications (status_id)",
+                "idx_rewrite_progress_translate": "rewrite_progress (translate_id, done)",
+                "idx_jobs_state": "jobs (state, failed, lease_expires_at)",
+                "idx_fingerprint_bands_value": "fingerprint_bands (bands, band, value)",
+            }
+            for index_name, definition in indexes.items():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {definition};")
+
             logger.info(f"База данных {db_name} успешно инициализирована.")
 
     except sqlite3.Error as e:
         logger.error(f"Ошибка инициализации базы данных: {e}")
 
 
+@lru_cache(maxsize=None)
+def _insert_query(record_type: type, table_name: str) -> str:
+    """Строит запрос INSERT для типа записи (один раз на тип и таблицу)."""
+    columns = [field for field in record_type._fields if field != 'table_name']
+    placeholders = ", ".join("?" for _ in columns)
+    return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+def _record_values(record: NamedTuple, db_name: str) -> tuple:
+    """
+    Возвращает значения полей записи без table_name. Если для БД включено
+    сжатие, большие тексты (COMPRESSED_COLUMNS) сжимаются.
+    """
+    compressed = COMPRESSED_COLUMNS.get(record.table_name)
+    if compressed and not compression_enabled(db_name):
+        compressed = None
+    return tuple(compress_text(value) if field == compressed else value
+                 for field, value in zip(record._fields, record) if field != 'table_name')
+
+
 def insert_record(record: NamedTuple, db_name="harvester_data.db") -> Optional[int]:
     """
     Вставляет новую запись в таблицу record.table_name и возвращает ее id.
+    Внутри transaction() запись фиксируется вместе с остальными записями
+    транзакции.
     Args:
         record (NamedTuple): Именованный кортеж для записи в БД.
         db_name (str): Имя БД, по умолчанию значение harvester_data.db.
     Returns:
         Optional[int]: ID добавленной записи или None, если вставка не удалась.
     """
-    data = {k: v for k, v in record._asdict().items() if k != 'table_name'}
-    columns = ", ".join(data.keys())
-    placeholders = ", ".join("?" for _ in data)
-    query = f"INSERT INTO {record.table_name} ({columns}) VALUES ({placeholders})"
-
     try:
-        with sqlite3.connect(db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, tuple(data.values()))
-            conn.commit()
-            return cursor.lastrowid
+        with transaction(db_name) as conn:
+            cursor = conn.execute(_insert_query(type(record), record.table_name),
+                                  _record_values(record, db_name))
+        if record.table_name in REFERENCE_TABLES:
+            invalidate_reference_cache(db_name, record.table_name)
+        return cursor.lastrowid
     except sqlite3.IntegrityError as e:
         logger.error(f"Ошибка целостности данных: {e}")
         return None
@@ -215,6 +368,90 @@ def insert_record(record: NamedTuple, db_name="harvester_data.db") -> Optional[i
         return None
 
 
+@lru_cache(maxsize=None)
+def _insert_many_query(record_type: type, table_name: str, on_conflict: Optional[str],
+                       key: Optional[str]) -> str:
+    """Строит запрос пакетной вставки (один раз на тип, таблицу и режим)."""
+    query = _insert_query(record_type, table_name)
+    if on_conflict == "ignore":
+        return query.replace("INSERT INTO", "INSERT OR IGNORE INTO", 1)
+    if on_conflict == "update":
+        columns = [field for field in record_type._fields if field not in ('table_name', key)]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns)
+        return f"{query} ON CONFLICT ({key}) DO UPDATE SET {updates}"
+    return query
+
+
+def insert_many(records: Iterable[NamedTuple], db_name="harvester_data.db",
+                on_conflict: Optional[str] = None,
+                key: Optional[str] = None) -> list[Optional[int]]:
+    """
+    Вставляет записи пачками в одной транзакции и возвращает их id.
+    Записи группируются по типу и таблице, для каждой группы запрос
+    строится один раз и выполняется через executemany.
+    Args:
+        records (Iterable[NamedTuple]): Именованные кортежи для записи в БД.
+        db_name (str): Имя БД, по умолчанию значение harvester_data.db.
+        on_conflict (str): Поведение при конфликте уникальности: None -
+        ошибка и откат всей вставки, "ignore" - пропустить запись, "update" -
+        обновить существующую запись (требует key).
+        key (str): Уникальная колонка (например, 'youtube_id'). Если задана,
+        id определяются по ее значениям, в том числе для пропущенных или
+        обновленных записей.
+    Returns:
+        list[Optional[int]]: ID записей в порядке records. Без key при
+        пропуске части записей id неизвестны и равны None. Пустой список,
+        если вставка не удалась.
+    """
+    if on_conflict not in (None, "ignore", "update"):
+        raise ValueError(f"Неизвестный режим on_conflict: {on_conflict}.")
+    if on_conflict == "update" and not key:
+        raise ValueError("Для on_conflict='update' необходимо указать key.")
+
+    records = list(records)
+    groups: dict[tuple[type, str], list[int]] = {}
+    for index, record in enumerate(records):
+        groups.setdefault((type(record), record.table_name), []).append(index)
+
+    ids: list[Optional[int]] = [None] * len(records)
+    try:
+        with transaction(db_name, immediate=True) as conn:
+            for (record_type, table_name), indexes in groups.items():
+                query = _insert_many_query(record_type, table_name, on_conflict, key)
+                cursor = conn.executemany(query, (_record_values(records[index], db_name)
+                                             for index in indexes))
+
+                if key:
+                    values = list({getattr(records[index], key) for index in indexes})
+                    found = {}
+                    for offset in range(0, len(values), 500):
+                        batch = values[offset:offset + 500]
+                        placeholders = ", ".join("?" for _ in batch)
+                        found.update(conn.execute(
+                            f"SELECT {key}, rowid FROM {table_name} "
+                            f"WHERE {key} IN ({placeholders})", batch))
+                    for index in indexes:
+                        ids[index] = found.get(getattr(records[index], key))
+                elif cursor.rowcount == len(indexes):
+                    # rowcount, в отличие от total_changes, не учитывает
+                    # строки, записанные триггерами (например, FTS).
+                    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                    first_id = last_id - len(indexes) + 1
+                    for offset, index in enumerate(indexes):
+                        ids[index] = first_id + offset
+        for _, table_name in groups:
+            if table_name in REFERENCE_TABLES:
+                invalidate_reference_cache(db_name, table_name)
+        logger.info(f"Пакетно вставлено записей: {len(records)}.")
+        return ids
+    except sqlite3.IntegrityError as e:
+        logger.error(f"Ошибка целостности данных: {e}")
+        return []
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка базы данных: {e}")
+        return []
+
+
 def main():
     initialize_db()
 
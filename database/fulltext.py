@@ -0,0 +1,189 @@
+import sqlite3
+import logging
+import argparse
+
+from typing import NamedTuple, Optional
+
+from .connection import transaction
+
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["FTS_TABLES", "SearchResult", "fulltext_available", "enable_fulltext",
+           "rebuild_fulltext", "search_texts"]
+
+# Таблицы с полнотекстовым индексом и их индексируемые колонки.
+FTS_TABLES = {
+    "original_texts": "text",
+    "rewrites": "rewrite_text",
+}
+
+
+class SearchResult(NamedTuple):
+    table_name: str
+    id: int
+    rank: float
+    snippet: str
+
+
+def fulltext_available(db_name="harvester_data.db") -> bool:
+    """
+    Проверяет, собран ли sqlite с поддержкой FTS5.
+    Args:
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+    Returns:
+        bool: True, если FTS5 доступен.
+    """
+    try:
+        with transaction(db_name) as conn:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)")
+            conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def enable_fulltext(db_name="harvester_data.db") -> bool:
+    """
+    Создает полнотекстовые индексы FTS5 по оригинальным текстам и рерайтам
+    и триггеры, поддерживающие их в актуальном состоянии. Уже существующие
+    записи индексируются командой rebuild_fulltext. Триггеры вызывают
+    функцию harvester_decompress(), поэтому писать в таблицы можно только
+    через соединения get_connection или зарегистрированные
+    database.codec.register_connection.
+    Args:
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+    Returns:
+        bool: True, если индексы созданы.
+    """
+    if not fulltext_available(db_name):
+        logger.error("SQLite собран без поддержки FTS5, полнотекстовый поиск недоступен.")
+        return False
+    try:
+        with transaction(db_name) as conn:
+            for table, column in FTS_TABLES.items():
+                fts = f"{table}_fts"
+                conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                             f"{column}, tokenize='unicode61 remove_diacritics 2')")
+                # Триггеры пересоздаются, чтобы обновить их определение в
+                # существующих БД. Тексты могут храниться сжатыми, поэтому в
+                # индекс они попадают через harvester_decompress().
+                for trigger in ("insert", "delete", "update"):
+                    conn.execute(f"DROP TRIGGER IF EXISTS {fts}_{trigger}")
+                conn.execute(f"""
+                    CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN
+                        INSERT INTO {fts} (rowid, {column})
+                        VALUES (new.id, harvester_decompress(new.{column}));
+                    END;
+                    """)
+                conn.execute(f"""
+                    CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN
+                        DELETE FROM {fts} WHERE rowid = old.id;
+                    END;
+                    """)
+                conn.execute(f"""
+                    CREATE TRIGGER {fts}_update
+                    AFTER UPDATE OF {column} ON {table} BEGIN
+                        DELETE FROM {fts} WHERE rowid = old.id;
+                        INSERT INTO {fts} (rowid, {column})
+                        VALUES (new.id, harvester_decompress(new.{column}));
+                    END;
+                    """)
+        logger.info(f"Полнотекстовые индексы в {db_name} созданы.")
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка создания полнотекстовых индексов: {e}")
+        return False
+
+
+def rebuild_fulltext(db_name="harvester_data.db") -> int:
+    """
+    Перестраивает полнотекстовые индексы по существующим данным.
+    Args:
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+    Returns:
+        int: Количество проиндексированных записей.
+    """
+    if not enable_fulltext(db_name):
+        return 0
+    indexed = 0
+    try:
+        with transaction(db_name, immediate=True) as conn:
+            for table, column in FTS_TABLES.items():
+                fts = f"{table}_fts"
+                conn.execute(f"DELETE FROM {fts}")
+                cursor = conn.execute(f"INSERT INTO {fts} (rowid, {column}) "
+                                      f"SELECT id, harvester_decompress({column}) FROM {table}")
+                indexed += cursor.rowcount
+            for table in FTS_TABLES:
+                conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('optimize')")
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка перестроения полнотекстовых индексов: {e}")
+        return 0
+    logger.info(f"Полнотекстовые индексы перестроены, записей: {indexed}.")
+    return indexed
+
+
+def _match_query(query: str) -> str:
+    """Превращает строку поиска в запрос FTS5: все слова, каждое в кавычках."""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def search_texts(query: str, db_name="harvester_data.db", limit=10,
+                 tables: Optional[list[str]] = None, raw=False) -> list[SearchResult]:
+    """
+    Ищет тексты по ключевым словам.
+    Args:
+        query(str): Строка поиска. По умолчанию ищутся тексты, содержащие все
+        слова; при raw=True строка передается в FTS5 как есть (AND, OR, NEAR,
+        префиксы*).
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+        limit(int): Максимальное количество результатов.
+        tables(list[str]): Таблицы для поиска, по умолчанию все из FTS_TABLES.
+        raw(bool): Не экранировать синтаксис FTS5.
+    Returns:
+        list[SearchResult]: Результаты, отсортированные по релевантности
+        (bm25, меньше - лучше), с фрагментами текста.
+    """
+    match = query if raw else _match_query(query)
+    if not match:
+        return []
+    selects = []
+    for table in tables or FTS_TABLES:
+        fts = f"{table}_fts"
+        selects.append(f"SELECT '{table}', rowid, bm25({fts}), "
+                       f"snippet({fts}, 0, '[', ']', '…', 12) "
+                       f"FROM {fts} WHERE {fts} MATCH :query")
+    sql = " UNION ALL ".join(selects) + " ORDER BY 3 LIMIT :limit"
+    try:
+        with transaction(db_name) as conn:
+            rows = conn.execute(sql, {"query": match, "limit": limit}).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка полнотекстового поиска: {e}")
+        return []
+    return [SearchResult(*row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Полнотекстовый поиск по текстам.")
+    parser.add_argument("--db", default="harvester_data.db", help="Файл БД.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("enable", help="Создать индексы и триггеры.")
+    subparsers.add_parser("rebuild", help="Перестроить индексы по существующим данным.")
+    search_parser = subparsers.add_parser("search", help="Найти тексты.")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "enable":
+        enable_fulltext(args.db)
+    elif args.command == "rebuild":
+        print(f"Проиндексировано записей: {rebuild_fulltext(args.db)}")
+    else:
+        for result in search_texts(args.query, args.db, limit=args.limit):
+            print(f"{result.table_name}#{result.id} ({result.rank:.2f}): {result.snippet}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import sqlite3
+import logging
+import threading
+
+from typing import Optional
+
+from .connection import get_connection, transaction
+
+
+logger = logging.getLogger(__name__)
+
+# Небольшие справочные таблицы и их колонки со значением.
+REFERENCE_TABLES = {
+    "languages": "code",
+    "translators": "translator",
+    "publication_status": "status",
+    "platforms": "name",
+}
+
+_cache: dict[tuple[str, str], dict[str, int]] = {}
+_cache_lock = threading.Lock()
+
+
+def _load_table(table: str, db_name: str) -> dict[str, int]:
+    with transaction(db_name) as conn:
+        return {value: id_ for id_, value in
+                conn.execute(f"SELECT id, {REFERENCE_TABLES[table]} FROM {table}")}
+
+
+def get_reference_id(table: str, value: str, db_name="harvester_data.db",
+                     **columns) -> Optional[int]:
+    """
+    Возвращает id значения справочной таблицы, при необходимости создает его.
+    Таблица целиком загружается в память процесса при первом обращении,
+    поэтому повторные вызовы не обращаются к БД. Данные, прочитанные или
+    созданные внутри незавершенной внешней транзакции, не кэшируются.
+    Args:
+        table(str): Имя справочной таблицы из REFERENCE_TABLES.
+        value(str): Значение (код языка, название переводчика и т.п.).
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+        **columns: Значения остальных обязательных колонок для новой записи.
+    Returns:
+        Optional[int]: ID значения или None при ошибке БД.
+    """
+    if table not in REFERENCE_TABLES:
+        raise ValueError(f"{table} не является справочной таблицей.")
+
+    cache_key = (db_name, table)
+    with _cache_lock:
+        cached = _cache.get(cache_key)
+        if cached is not None and value in cached:
+            return cached[value]
+
+    column = REFERENCE_TABLES[table]
+    try:
+        if cached is None:
+            cached = _load_table(table, db_name)
+            if not get_connection(db_name).in_transaction:
+                with _cache_lock:
+                    _cache[cache_key] = cached
+            if value in cached:
+                return cached[value]
+
+        names = [column, *columns]
+        placeholders = ", ".join("?" for _ in names)
+        with transaction(db_name) as conn:
+            conn.execute(f"INSERT OR IGNORE INTO {table} ({', '.join(names)}) "
+                         f"VALUES ({placeholders})", (value, *columns.values()))
+            id_ = conn.execute(f"SELECT id FROM {table} WHERE {column} = ?",
+                               (value,)).fetchone()[0]
+        if not conn.in_transaction:
+            with _cache_lock:
+                _cache.setdefault(cache_key, {})[value] = id_
+        return id_
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка базы данных: {e}")
+        return None
+
+
+def get_language_id(code: str, db_name="harvester_data.db") -> Optional[int]:
+    """Возвращает id языка по коду ('ru', 'en'...), создавая его при необходимости."""
+    return get_reference_id("languages", code, db_name)
+
+
+def get_translator_id(translator: str, db_name="harvester_data.db") -> Optional[int]:
+    """Возвращает id переводчика по названию, создавая его при необходимости."""
+    return get_reference_id("translators", translator, db_name)
+
+
+def get_status_id(status: str, db_name="harvester_data.db") -> Optional[int]:
+    """Возвращает id статуса публикации, создавая его при необходимости."""
+    return get_reference_id("publication_status", status, db_name)
+
+
+def get_platform_id(name: str, url: str, db_name="harvester_data.db") -> Optional[int]:
+    """Возвращает id платформы по названию, создавая ее с адресом url при необходимости."""
+    return get_reference_id("platforms", name, db_name, url=url)
+
+
+def invalidate_reference_cache(db_name: Optional[str] = None,
+                               table: Optional[str] = None) -> None:
+    """
+    Сбрасывает кэш справочных таблиц.
+    Args:
+        db_name(str): Имя БД, по умолчанию сбрасывается кэш всех БД.
+        table(str): Имя таблицы, по умолчанию сбрасываются все таблицы.
+    """
+    with _cache_lock:
+        for key in list(_cache):
+            if (db_name is None or key[0] == db_name) and (table is None or key[1] == table):
+                del _cache[key]
@@ -0,0 +1,107 @@
+import sqlite3
+import logging
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from .codec import compress_text, compression_enabled, decompress_text
+from .connection import transaction
+from .database import insert_record
+from .db_models import Rewrite
+
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def start_rewrite(translate_id: Optional[int], language_id: Optional[int] = None,
+                  topic_id: Optional[int] = None,
+                  db_name="harvester_data.db") -> Optional[int]:
+    """
+    Создает пустую запись рерайта, которая будет заполняться по мере
+    получения текста.
+    Args:
+        translate_id(int): ID перевода, по которому делается рерайт.
+        language_id(int): ID языка рерайта.
+        topic_id(int): ID темы.
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+    Returns:
+        Optional[int]: ID записи в таблице rewrites или None при ошибке.
+    """
+    now = _now()
+    try:
+        with transaction(db_name) as conn:
+            rewrite_id = insert_record(Rewrite("", language_id, translate_id, topic_id, now, now),
+                                       db_name=db_name)
+            if rewrite_id is None:
+                raise sqlite3.Error("не удалось создать запись в таблице rewrites")
+            conn.execute("INSERT INTO rewrite_progress (rewrite_id, translate_id, done, updated_at) "
+                         "VALUES (?, ?, 0, ?)", (rewrite_id, translate_id, now))
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка базы данных: {e}")
+        return None
+    return rewrite_id
+
+
+def existing_rewrite(conn: sqlite3.Connection, translate_id: int) -> Optional[int]:
+    """
+    Ищет готовый рерайт перевода (например, полученный через Batch API или
+    завершенный потоковый рерайт).
+    """
+    row = conn.execute("""
+        SELECT r.id FROM rewrites r
+        LEFT JOIN rewrite_progress p ON p.rewrite_id = r.id
+        WHERE r.translate_id = ? AND (p.rewrite_id IS NULL OR p.done = 1)
+        ORDER BY r.id DESC LIMIT 1
+        """, (translate_id,)).fetchone()
+    return row[0] if row else None
+
+
+def find_partial_rewrite(translate_id: int,
+                         db_name="harvester_data.db") -> Optional[tuple[int, str]]:
+    """
+    Ищет незавершенный рерайт перевода.
+    Args:
+        translate_id(int): ID перевода.
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+    Returns:
+        Optional[tuple[int, str]]: ID рерайта и уже полученный текст или None.
+    """
+    try:
+        with transaction(db_name) as conn:
+            row = conn.execute("""
+                SELECT r.id, r.rewrite_text FROM rewrite_progress p
+                JOIN rewrites r ON r.id = p.rewrite_id
+                WHERE p.translate_id = ? AND p.done = 0
+                ORDER BY p.updated_at DESC LIMIT 1
+                """, (translate_id,)).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка базы данных: {e}")
+        return None
+    return (row[0], decompress_text(row[1]) or "") if row else None
+
+
+def save_rewrite_progress(rewrite_id: int, text: str, done=False,
+                          db_name="harvester_data.db") -> None:
+    """
+    Сохраняет полученную часть текста рерайта.
+    Args:
+        rewrite_id(int): ID записи в таблице rewrites.
+        text(str): Весь полученный на данный момент текст.
+        done(bool): Рерайт завершен.
+        db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+    """
+    now = _now()
+    try:
+        with transaction(db_name) as conn:
+            if compression_enabled(db_name):
+                text = compress_text(text)
+            conn.execute("UPDATE rewrites SET rewrite_text = ?, updated_at = ? WHERE id = ?",
+                         (text, now, rewrite_id))
+            conn.execute("UPDATE rewrite_progress SET done = ?, updated_at = ? "
+                         "WHERE rewrite_id = ?", (int(done), now, rewrite_id))
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка базы данных: {e}")
@@ -0,0 +1,197 @@
+import re
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from .connection import transaction
+from .reference import get_language_id, get_translator_id
+
+
+logger = logging.getLogger(__name__)
+
+# Максимальное количество параметров в одном запросе с IN (...).
+LOOKUP_BATCH_SIZE = 500
+# Очистка памяти переводов выполняется после каждых EVICT_INTERVAL записей.
+EVICT_INTERVAL = 1000
+
+
+def normalize_segment(text: str) -> str:
+    """
+    Нормализует сегмент текста для поиска в памяти переводов.
+    Args:
+        text(str): Сегмент текста.
+    Returns:
+        str: Сегмент без лишних пробельных символов.
+    """
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def segment_hash(text: str, src: str, dest: str, translator: str) -> str:
+    """
+    Вычисляет ключ сегмента в памяти переводов.
+    Args:
+        text(str): Сегмент текста.
+        src(str): Язык исходного текста.
+        dest(str): Язык перевода.
+        translator(str): Название переводчика.
+    Returns:
+        str: sha1 от нормализованного сегмента, языков и переводчика.
+    """
+    key = "\x1f".join((src, dest, translator, normalize_segment(text)))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class TranslationMemory:
+    """
+    Память переводов на уровне сегментов, хранящаяся в таблице
+    translation_memory. Размер ограничивается количеством записей (давно не
+    использованные удаляются первыми) и возрастом последнего использования.
+    """
+
+    def __init__(self, db_name="harvester_data.db", max_entries=100000, max_age_days=180):
+        """
+        Args:
+            db_name(str): Имя файла базы данных.
+            max_entries(int): Максимальное количество записей.
+            max_age_days(int): Записи, не использованные дольше этого срока,
+            удаляются.
+        """
+        self.db_name = db_name
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stored_since_evict = 0
+
+    def lookup(self, segments: list[str], src: str, dest: str,
+               translator: str) -> dict[int, str]:
+        """
+        Ищет переводы сегментов пачками.
+        Args:
+            segments(list[str]): Сегменты текста.
+            src(str): Язык исходного текста.
+            dest(str): Язык перевода.
+            translator(str): Название переводчика.
+        Returns:
+            dict[int, str]: Найденные переводы по индексам сегментов.
+        """
+        hashes = [segment_hash(segment, src, dest, translator) for segment in segments]
+        found = {}
+        try:
+            with transaction(self.db_name) as conn:
+                cursor = conn.cursor()
+                for offset in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+                    batch = list(set(hashes[offset:offset + LOOKUP_BATCH_SIZE]))
+                    placeholders = ", ".join("?" for _ in batch)
+                    cursor.execute(f"SELECT hash, translated_text FROM translation_memory "
+                                   f"WHERE hash IN ({placeholders})", batch)
+                    found.update(cursor.fetchall())
+                    cursor.execute(f"UPDATE translation_memory "
+                                   f"SET hits = hits + 1, last_used_at = ? "
+                                   f"WHERE hash IN ({placeholders})", [_now(), *batch])
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения памяти переводов: {e}")
+
+        result = {index: found[key] for index, key in enumerate(hashes) if key in found}
+        with self._lock:
+            self._hits += len(result)
+            self._misses += len(segments) - len(result)
+        return result
+
+    def store(self, pairs: Iterable[tuple[str, str]], src: str, dest: str,
+              translator: str) -> None:
+        """
+        Сохраняет переводы сегментов.
+        Args:
+            pairs(Iterable[tuple[str, str]]): Пары (сегмент, перевод).
+            src(str): Язык исходного текста.
+            dest(str): Язык перевода.
+            translator(str): Название переводчика.
+        """
+        now = _now()
+        src_id = get_language_id(src, self.db_name)
+        dest_id = get_language_id(dest, self.db_name)
+        translator_id = get_translator_id(translator, self.db_name)
+        try:
+            with transaction(self.db_name) as conn:
+                cursor = conn.cursor()
+                rows = [(segment_hash(segment, src, dest, translator), segment, translation,
+                         src_id, dest_id, translator_id, now, now)
+                        for segment, translation in pairs]
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO translation_memory
+                        (hash, source_text, translated_text, source_language_id,
+                         target_language_id, translator_id, created_at, last_used_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, rows)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи в память переводов: {e}")
+            return
+
+        with self._lock:
+            self._stored_since_evict += len(rows)
+            need_evict = self._stored_since_evict >= EVICT_INTERVAL
+            if need_evict:
+                self._stored_since_evict = 0
+        if need_evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Удаляет устаревшие записи и записи сверх max_entries (сначала давно
+        не использованные).
+        Returns:
+            int: Количество удаленных записей.
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.max_age_days)
+                  ).isoformat(timespec="seconds")
+        try:
+            with transaction(self.db_name) as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM translation_memory WHERE last_used_at < ?", (cutoff,))
+                deleted = cursor.rowcount
+                cursor.execute("""
+                    DELETE FROM translation_memory WHERE hash IN (
+                        SELECT hash FROM translation_memory
+                        ORDER BY last_used_at DESC, hits DESC
+                        LIMIT -1 OFFSET ?)
+                    """, (self.max_entries,))
+                deleted += cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка очистки памяти переводов: {e}")
+            return 0
+        if deleted:
+            logger.info(f"Из памяти переводов удалено {deleted} записей.")
+        return deleted
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику памяти переводов.
+        Returns:
+            dict: Попадания и промахи с момента создания объекта, доля
+            попаданий и количество записей в таблице.
+        """
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        entries: Optional[int] = None
+        try:
+            with transaction(self.db_name) as conn:
+                entries = conn.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения памяти переводов: {e}")
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": entries,
+        }
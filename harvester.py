@@ -1,10 +1,24 @@
+import os
+import time
+import argparse
 import logging
 
 from dotenv import load_dotenv
-from content_parser.youtube_parser import youtube_subtitles_parser
-from translate.translate import text_translator_mymemory, text_translator_yandex
-from rewrite.chatgpt_rewrite import gpt_rewrite
-from prompts import PROMPT_REWRITE
+from openai import OpenAI
+from content_parser.youtube_parser import youtube_video_id_parser
+from content_parser.search_cache import SearchCache
+from database import initialize_db, TranslationMemory
+from rewrite.cache import RewriteCache
+from rewrite.batch_api import POLL_INTERVAL as BATCH_POLL_INTERVAL, run_batch_rewrite
+from pipeline.jobs import STAGES, LEASE_SECONDS, JobQueue
+from pipeline.runner import (POLL_INTERVAL as WORKER_POLL_INTERVAL, StageContext, run_stage,
+                             run_video, stream_rewrite)
+from pipeline.workers import DEFAULT_WORKERS, DRAIN_TIMEOUT, MULTI_HOST_HELP, WorkerOptions, Supervisor
+from pipeline.batch import DEFAULT_STAGE_LIMITS, read_video_ids, unique_ids, run_batch, format_report
+from translate.router import TranslatorRouter
+from pipeline.known_videos import KnownVideos
+from pipeline.fingerprint import MAX_DISTANCE, FingerprintIndex
+from publish.publish_to_zen import POOL_SIZE, MAX_CHANNELS, Publisher, retry_failed
 
 
 logging.basicConfig(
@@ -18,40 +32,278 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def main():
+def main(db_name="harvester_data.db"):
     load_dotenv()
     youtube_id = input("Введите ID ролика на YouTube: ")
-    try:
-        logger.info(f"Получаем субтитры для ролика с ID: {youtube_id}")
-        subtitles = youtube_subtitles_parser(youtube_id, 'ru')
-        if subtitles:
-            logger.info(f"Оригинальные русские субтитры получены. Длина текста: {len(subtitles)}.")
-        else:
-            logger.info("Русских субтитров нет, пробую получить английские.")
-            en_subtitles = youtube_subtitles_parser(youtube_id, 'en')
-            if en_subtitles:
-                subtitles = text_translator_yandex(en_subtitles)
-                logger.info(f"Английские субтитры переведены. Длина текста: {len(subtitles)}.")
-            else:
-                logger.error("Английских субтитров нет. Прерывание процесса.")
-                return
-    except Exception as e:
-        logger.error(f"Ошибка при получении или переводе субтитров: {e}")
+    initialize_db(db_name)
+    queue = JobQueue(db_name)
+    # Состояние ролика хранится в таблице jobs: после перезапуска уже
+    # выполненные этапы пропускаются.
+    logger.info(f"Получаем субтитры для ролика с ID: {youtube_id}")
+    job = run_video(queue, youtube_id, StageContext(memory=TranslationMemory(db_name)),
+                    until="translated")
+    if job is None:
+        logger.error("Прерывание процесса.")
         return
 
     try:
-        if subtitles:
-            logger.info("Начинается рерайт текста.")
-            article_text = gpt_rewrite(subtitles, PROMPT_REWRITE, max_tokens=6000)
-            logger.info(f"Рерайт завершен успешно. Длина текста: {len(article_text)}.")
-            print("Текст статьи после рерайта:")
-            print(article_text)
-        else:
-            logger.info("Текст для рерайта не был получен.")
+        logger.info("Начинается рерайт текста.")
+        print("Текст статьи после рерайта:")
+        article_length = 0
+        for part in stream_rewrite(queue, job):
+            print(part, end='', flush=True)
+            article_length += len(part)
+        print()
+        logger.info(f"Рерайт завершен успешно. Длина текста: {article_length}.")
     except Exception as e:
         logger.error(f"Ошибка при рерайте текста: {e}")
         return
 
 
+def batch(args: argparse.Namespace):
+    """Пакетная обработка списка роликов."""
+    load_dotenv()
+    video_ids = collect_ids(args)
+
+    memory = None
+    fingerprints = None
+    known = None
+    if args.db:
+        initialize_db(args.db)
+        memory = TranslationMemory(args.db)
+        fingerprints = FingerprintIndex.load(args.db, args.max_distance)
+        known = KnownVideos.load(args.db)
+
+    rewrite_cache = None
+    if args.rewrite_cache:
+        rewrite_cache = RewriteCache(args.db or "harvester_data.db")
+
+    router = TranslatorRouter(db_name=args.db, hedge_after=args.hedge_after)
+    stage_limits = {stage: getattr(args, f"{stage}_limit") for stage in DEFAULT_STAGE_LIMITS}
+    results = run_batch(video_ids, stage_limits=stage_limits, max_tokens=args.max_tokens,
+                        memory=memory, rewrite_cache=rewrite_cache,
+                        bypass_cache=args.refresh_cache, fingerprints=fingerprints,
+                        reject_duplicates=not args.keep_duplicates, router=router,
+                        clean=not args.no_clean, known=known)
+    # run_batch возвращает результаты только по новым роликам.
+    print(format_report(results, skipped=len(video_ids) - len(results)))
+    logger.info(f"Переводчики: {router.report()}")
+    if memory:
+        logger.info(f"Память переводов: {memory.stats()}")
+
+
+def collect_ids(args: argparse.Namespace) -> list[str]:
+    """Собирает ID роликов из аргументов, файла и поисковых запросов."""
+    video_ids = list(args.ids)
+    if args.file:
+        video_ids.extend(read_video_ids(args.file))
+    if args.query:
+        cache = SearchCache(args.db)
+        video_ids.extend(youtube_video_id_parser(os.environ.get('YOUTUBE_API_KEY'),
+                                                 args.query, args.max_results, cache=cache))
+    return unique_ids(video_ids)
+
+
+def enqueue(args: argparse.Namespace):
+    """Добавление роликов в очередь обработки (таблица jobs)."""
+    load_dotenv()
+    initialize_db(args.db)
+    queue = JobQueue(args.db)
+    added = queue.enqueue(collect_ids(args))
+    if args.retry_failed:
+        print(f"Возвращено в очередь роликов с ошибками: {queue.retry_failed()}.")
+    print(f"Добавлено в очередь: {added}. Состояние очереди: {queue.stats()}")
+
+
+def drain(args: argparse.Namespace):
+    """Обработка очереди роликов в текущем процессе до ее опустошения."""
+    load_dotenv()
+    initialize_db(args.db)
+    queue = JobQueue(args.db)
+    context = StageContext(memory=TranslationMemory(args.db),
+                           router=TranslatorRouter(db_name=args.db),
+                           fingerprints=FingerprintIndex.load(args.db, args.max_distance),
+                           channel_ids=tuple(args.channel or ()))
+    stages = [stage for stage in STAGES if stage != "publish" or context.channel_ids]
+    for stage in stages:
+        done = run_stage(queue, stage, context)
+        logger.info(f"Этап {stage}: обработано роликов {done}.")
+    print(f"Состояние очереди: {queue.stats()}")
+
+
+def worker(args: argparse.Namespace):
+    """Многопроцессная обработка очереди роликов с супервизором."""
+    load_dotenv()
+    initialize_db(args.db)
+    options = WorkerOptions(db_name=args.db, lease_seconds=args.lease,
+                            poll_interval=args.poll_interval,
+                            channel_ids=tuple(args.channel or ()), hedge_after=args.hedge_after,
+                            max_distance=args.max_distance)
+    workers = {stage: getattr(args, stage) for stage in DEFAULT_WORKERS}
+    restarts = Supervisor(workers, options, drain_timeout=args.drain_timeout).run()
+    logger.info(f"Перезапуски воркеров: {restarts}")
+    print(f"Состояние очереди: {JobQueue(args.db).stats()}")
+
+
+def rewrite_batch(args: argparse.Namespace):
+    """Рерайт всех ожидающих переводов через OpenAI Batch API."""
+    load_dotenv()
+    initialize_db(args.db)
+    client = None
+    if args.base_url:
+        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), base_url=args.base_url)
+    reports = run_batch_rewrite(args.db, client=client, limit=args.limit,
+                                poll_interval=args.poll_interval, timeout=args.timeout)
+    for report in reports:
+        print(f"Пакет {report.batch_id} ({report.status}): запросов {report.requests}, "
+              f"рерайтов {report.rewrites}, ошибок {report.errors}, "
+              f"пропущено готовых {report.skipped}.")
+
+
+def publish(args: argparse.Namespace):
+    """
+    Публикация очереди из таблицы publications на Яндекс.Дзен. С --watch
+    очередь проверяется каждые N секунд до Ctrl+C, браузеры каналов при этом
+    не перезапускаются.
+    """
+    initialize_db(args.db)
+    if args.retry_failed:
+        print(f"Возвращено в очередь неудачных публикаций: {retry_failed(args.db)}.")
+    publisher = Publisher(args.db, pool_size=args.pool_size, max_channels=args.max_channels,
+                          profile_root=args.profile_root, headless=not args.show_browser)
+    try:
+        while True:
+            totals = publisher.run()
+            print(f"Опубликовано: {totals['published']}, с ошибками: {totals['failed']}.")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        logger.info("Публикация остановлена.")
+    finally:
+        publisher.close()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сбор, перевод и рерайт роликов YouTube.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser("batch", help="Пакетная обработка списка роликов.")
+    batch_parser.add_argument("ids", nargs="*", help="ID роликов на YouTube.")
+    batch_parser.add_argument("-f", "--file", help="Файл со списком ID (по одному в строке).")
+    batch_parser.add_argument("-q", "--query", action="append",
+                              help="Поисковый запрос для youtube_video_id_parser "
+                                   "(можно указать несколько раз).")
+    batch_parser.add_argument("--max-results", type=int, default=50,
+                              help="Количество роликов из поиска по всем запросам.")
+    batch_parser.add_argument("--db", help="Файл БД для памяти переводов и пропуска "
+                                           "уже собранных роликов.")
+    batch_parser.add_argument("--keep-duplicates", action="store_true",
+                              help="Не отбрасывать почти одинаковые субтитры, только помечать.")
+    batch_parser.add_argument("--max-distance", type=int, default=MAX_DISTANCE,
+                              help="Порог расстояния Хэмминга между отпечатками дубликатов "
+                                   "(0-15; около 10 - находить и частичные перезаливы).")
+    batch_parser.add_argument("--no-clean", action="store_true",
+                              help="Не очищать субтитры перед переводом.")
+    batch_parser.add_argument("--rewrite-cache", action="store_true",
+                              help="Кэшировать результаты рерайта в БД.")
+    batch_parser.add_argument("--refresh-cache", action="store_true",
+                              help="Не читать результаты рерайта из кэша.")
+    batch_parser.add_argument("--max-tokens", type=int,
+                              help="Максимальное количество токенов для рерайта "
+                                   "(по умолчанию выбирается по длине текста).")
+    batch_parser.add_argument("--hedge-after", type=float,
+                              help="Через сколько секунд дублировать медленный перевод "
+                                   "другому переводчику.")
+    for stage, limit in DEFAULT_STAGE_LIMITS.items():
+        batch_parser.add_argument(f"--{stage}-limit", type=int, default=limit,
+                                  help=f"Лимит параллельности этапа {stage}.")
+
+    enqueue_parser = subparsers.add_parser(
+        "enqueue", help="Добавление роликов в очередь обработки в БД.")
+    enqueue_parser.add_argument("ids", nargs="*", help="ID роликов на YouTube.")
+    enqueue_parser.add_argument("-f", "--file", help="Файл со списком ID (по одному в строке).")
+    enqueue_parser.add_argument("-q", "--query", action="append",
+                                help="Поисковый запрос (можно указать несколько раз).")
+    enqueue_parser.add_argument("--max-results", type=int, default=50,
+                                help="Количество роликов из поиска по всем запросам.")
+    enqueue_parser.add_argument("--db", default="harvester_data.db", help="Файл БД.")
+    enqueue_parser.add_argument("--retry-failed", action="store_true",
+                                help="Вернуть в очередь ролики, помеченные failed.")
+
+    drain_parser = subparsers.add_parser(
+        "drain", help="Обработка очереди в текущем процессе с продолжением после перезапуска.")
+    drain_parser.add_argument("--db", default="harvester_data.db", help="Файл БД.")
+    drain_parser.add_argument("--channel", type=int, action="append",
+                              help="ID канала для постановки статей в очередь публикаций.")
+    drain_parser.add_argument("--max-distance", type=int, default=MAX_DISTANCE,
+                              help="Порог расстояния Хэмминга между отпечатками дубликатов.")
+
+    worker_parser = subparsers.add_parser(
+        "worker", help="Обработка очереди несколькими процессами с супервизором.",
+        epilog=MULTI_HOST_HELP, formatter_class=argparse.RawDescriptionHelpFormatter)
+    worker_parser.add_argument("--db", default="harvester_data.db", help="Файл БД.")
+    for stage, count in DEFAULT_WORKERS.items():
+        worker_parser.add_argument(f"--{stage}", type=int, default=count,
+                                   help=f"Количество процессов этапа {stage}.")
+    worker_parser.add_argument("--channel", type=int, action="append",
+                               help="ID канала для постановки статей в очередь публикаций.")
+    worker_parser.add_argument("--lease", type=float, default=LEASE_SECONDS,
+                               help="Время аренды ролика воркером в секундах.")
+    worker_parser.add_argument("--poll-interval", type=float, default=WORKER_POLL_INTERVAL,
+                               help="Пауза между проверками пустой очереди в секундах.")
+    worker_parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                               help="Сколько секунд ждать текущие ролики при остановке.")
+    worker_parser.add_argument("--max-distance", type=int, default=MAX_DISTANCE,
+                               help="Порог расстояния Хэмминга между отпечатками дубликатов.")
+    worker_parser.add_argument("--hedge-after", type=float,
+                               help="Через сколько секунд дублировать медленный перевод "
+                                    "другому переводчику.")
+
+    rewrite_batch_parser = subparsers.add_parser(
+        "rewrite-batch", help="Рерайт ожидающих переводов через OpenAI Batch API.")
+    rewrite_batch_parser.add_argument("--db", default="harvester_data.db", help="Файл БД.")
+    rewrite_batch_parser.add_argument("--limit", type=int,
+                                      help="Максимальное количество переводов.")
+    rewrite_batch_parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL,
+                                      help="Интервал опроса статуса пакета в секундах.")
+    rewrite_batch_parser.add_argument("--timeout", type=float,
+                                      help="Сколько секунд ждать пакет (по умолчанию до "
+                                           "завершения; незавершенный пакет дождется "
+                                           "следующий запуск).")
+    rewrite_batch_parser.add_argument("--base-url", help="Адрес API (например, тестового сервера).")
+
+    publish_parser = subparsers.add_parser("publish", help="Публикация очереди на Яндекс.Дзен.")
+    publish_parser.add_argument("--db", default="harvester_data.db", help="Файл БД.")
+    publish_parser.add_argument("--pool-size", type=int, default=POOL_SIZE,
+                                help="Количество браузеров на канал.")
+    publish_parser.add_argument("--max-channels", type=int, default=MAX_CHANNELS,
+                                help="Количество каналов, публикуемых одновременно.")
+    publish_parser.add_argument("--profile-root",
+                                help="Каталог с профилями Firefox по id каналов.")
+    publish_parser.add_argument("--show-browser", action="store_true",
+                                help="Запускать браузеры с окном.")
+    publish_parser.add_argument("--watch", type=float, metavar="SECONDS",
+                                help="Проверять очередь каждые SECONDS секунд до Ctrl+C, "
+                                     "не перезапуская браузеры.")
+    publish_parser.add_argument("--retry-failed", action="store_true",
+                                help="Вернуть в очередь публикации со статусом failed.")
+    return parser.parse_args(argv)
+
+
 if __name__ == '__main__':
-    main()
+    arguments = parse_args()
+    if arguments.command == "batch":
+        batch(arguments)
+    elif arguments.command == "enqueue":
+        enqueue(arguments)
+    elif arguments.command == "drain":
+        drain(arguments)
+    elif arguments.command == "worker":
+        worker(arguments)
+    elif arguments.command == "rewrite-batch":
+        rewrite_batch(arguments)
+    elif arguments.command == "publish":
+        publish(arguments)
+    else:
+        main()
@@ -0,0 +1,178 @@
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, NamedTuple, Optional
+
+from database.translation_memory import TranslationMemory
+from translate.router import TranslatorRouter
+from rewrite.cache import RewriteCache
+from pipeline.cleaning import CleaningReport
+from pipeline.fingerprint import FingerprintIndex
+from pipeline.known_videos import KnownVideos
+from pipeline.stages import (StageError, subtitles_stage, clean_stage, fingerprint_stage,
+                             translate_stage, rewrite_stage)
+
+
+logger = logging.getLogger(__name__)
+
+# Ограничения одновременных вызовов для каждого этапа конвейера.
+DEFAULT_STAGE_LIMITS = {
+    "subtitles": 8,
+    "translate": 4,
+    "rewrite": 4,
+}
+
+
+class VideoResult(NamedTuple):
+    youtube_id: str
+    success: bool
+    stage: str
+    article: Optional[str] = None
+    error: Optional[str] = None
+    cleaning: Optional[CleaningReport] = None
+
+
+def read_video_ids(path: str) -> list[str]:
+    """
+    Читает список ID роликов из файла (по одному в строке).
+    Пустые строки и строки, начинающиеся с '#', пропускаются, повторы
+    удаляются с сохранением порядка.
+    Args:
+        path(str): Путь к файлу со списком ID.
+    Returns:
+        list[str]: Список ID роликов.
+    """
+    with open(path, encoding="utf-8") as file:
+        lines = (line.strip() for line in file)
+        return unique_ids(line for line in lines if line and not line.startswith('#'))
+
+
+def unique_ids(video_ids: Iterable[str]) -> list[str]:
+    """
+    Удаляет повторяющиеся ID с сохранением исходного порядка.
+    Args:
+        video_ids(Iterable[str]): ID роликов.
+    Returns:
+        list[str]: ID роликов без повторов.
+    """
+    return list(dict.fromkeys(video_ids))
+
+
+def run_batch(video_ids: Iterable[str], stage_limits: Optional[dict] = None,
+              max_tokens: Optional[int] = None,
+              memory: Optional[TranslationMemory] = None,
+              rewrite_cache: Optional[RewriteCache] = None,
+              bypass_cache=False,
+              fingerprints: Optional[FingerprintIndex] = None,
+              reject_duplicates=True,
+              router: Optional[TranslatorRouter] = None,
+              clean=True,
+              known: Optional[KnownVideos] = None) -> list[VideoResult]:
+    """
+    Обрабатывает пачку роликов конвейером субтитры -> очистка -> проверка на
+    дубликаты -> перевод -> рерайт.
+    Каждый ролик проходит этапы последовательно, но разные ролики
+    обрабатываются одновременно, и у каждого этапа свой лимит параллельных
+    вызовов. Ошибка на одном ролике не прерывает обработку остальных.
+    Args:
+        video_ids(Iterable[str]): ID роликов на YouTube.
+        stage_limits(dict): Лимиты параллельности по этапам, по умолчанию
+        DEFAULT_STAGE_LIMITS.
+        max_tokens(int): Максимальное количество токенов для рерайта; None -
+        выбирается планировщиком для каждого ролика.
+        memory(TranslationMemory): Память переводов.
+        rewrite_cache(RewriteCache): Кэш результатов рерайта.
+        bypass_cache(bool): Не читать результаты рерайта из кэша.
+        fingerprints(FingerprintIndex): Индекс отпечатков для отсева
+        почти одинаковых субтитров.
+        reject_duplicates(bool): Прерывать обработку дубликатов (иначе
+        только помечать).
+        router(TranslatorRouter): Маршрутизатор переводчиков.
+        clean(bool): Очищать субтитры перед переводом (см. clean_stage).
+        known(KnownVideos): Уже собранные ролики. Они пропускаются, а успешно
+        обработанные ролики в него записываются (см. KnownVideos.record).
+    Returns:
+        list[VideoResult]: Результаты по каждому ролику в исходном порядке;
+        уже известные ролики в результаты не входят.
+    """
+    video_ids = unique_ids(video_ids)
+    if known is not None:
+        video_ids, _ = known.filter_new(video_ids)
+    if not video_ids:
+        logger.warning("Список роликов для обработки пуст.")
+        return []
+
+    limits = {**DEFAULT_STAGE_LIMITS, **(stage_limits or {})}
+    semaphores = {stage: threading.BoundedSemaphore(limit) for stage, limit in limits.items()}
+
+    def process(youtube_id: str) -> VideoResult:
+        stage = "subtitles"
+        report = None
+        try:
+            with semaphores["subtitles"]:
+                subtitles = subtitles_stage(youtube_id)
+            if clean:
+                stage = "clean"
+                subtitles, report = clean_stage(youtube_id, subtitles)
+            text, language_code = subtitles.text, subtitles.language_code
+            stage = "fingerprint"
+            fingerprint_stage(youtube_id, text, fingerprints, reject=reject_duplicates)
+            stage = "translate"
+            with semaphores["translate"]:
+                text = translate_stage(youtube_id, text, language_code, memory=memory,
+                                       router=router)
+            stage = "rewrite"
+            with semaphores["rewrite"]:
+                article = rewrite_stage(youtube_id, text, max_tokens=max_tokens,
+                                        cache=rewrite_cache, bypass_cache=bypass_cache)
+            if known is not None:
+                known.record(youtube_id)
+            return VideoResult(youtube_id, True, stage, article=article, cleaning=report)
+        except StageError as e:
+            logger.error(f"[{youtube_id}] Ошибка на этапе {e.stage}: {e}")
+            return VideoResult(youtube_id, False, e.stage, error=str(e), cleaning=report)
+        except Exception as e:
+            logger.error(f"[{youtube_id}] Ошибка на этапе {stage}: {e}")
+            return VideoResult(youtube_id, False, stage, error=str(e), cleaning=report)
+
+    max_workers = min(len(video_ids), sum(limits.values()))
+    logger.info(f"Запуск пакетной обработки {len(video_ids)} роликов, потоков: {max_workers}.")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(process, video_ids))
+
+    succeeded = sum(result.success for result in results)
+    logger.info(f"Пакетная обработка завершена: успешно {succeeded}, "
+                f"с ошибками {len(results) - succeeded}.")
+    return results
+
+
+def format_report(results: list[VideoResult], skipped=0) -> str:
+    """
+    Формирует текстовый отчет по результатам пакетной обработки.
+    Args:
+        results(list[VideoResult]): Результаты run_batch.
+        skipped(int): Количество пропущенных уже собранных роликов.
+    Returns:
+        str: Отчет, по одной строке на ролик, и итоговая строка.
+    """
+    lines = []
+    for result in results:
+        saved = ""
+        if result.cleaning:
+            saved = (f", очистка -{result.cleaning.chars_saved} символов "
+                     f"(~{result.cleaning.tokens_saved} токенов)")
+        if result.success:
+            lines.append(f"OK    {result.youtube_id}: статья {len(result.article)} символов{saved}")
+        else:
+            lines.append(f"FAIL  {result.youtube_id}: этап {result.stage}: {result.error}")
+    succeeded = sum(result.success for result in results)
+    lines.append(f"Итого: {len(results)}, успешно: {succeeded}, "
+                 f"с ошибками: {len(results) - succeeded}.")
+    if skipped:
+        lines.append(f"Пропущено уже собранных роликов: {skipped}.")
+    reports = [result.cleaning for result in results if result.cleaning]
+    if reports:
+        lines.append(f"Очистка субтитров: сэкономлено {sum(r.chars_saved for r in reports)} "
+                     f"символов (~{sum(r.tokens_saved for r in reports)} токенов).")
+    return "\n".join(lines)
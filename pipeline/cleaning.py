@@ -0,0 +1,124 @@
+import re
+
+from typing import NamedTuple
+from content_parser.subtitles import Subtitles, GENERATED
+from utils.utils import estimate_tokens
+
+
+# Неречевые пометки: [Music], [Applause], [музыка], (смех), ♪ ... ♪.
+NON_SPEECH = re.compile(r"\[[^\]]*\]|\((?:music|applause|laughter|музыка|аплодисменты|смех)\)|[♪♫]+",
+                        re.IGNORECASE)
+FILLERS = {
+    "en": {"um", "umm", "uh", "uhm", "uhh", "erm", "er", "hmm", "mm", "mhm", "ah"},
+    "ru": {"э", "ээ", "эээ", "эм", "эмм", "мм", "ммм", "хм"},
+}
+WORD = re.compile(r"\S+")
+SENTENCE_END = re.compile(r"[.!?…][\"»”')]*$")
+# Наибольшее перекрытие соседних строк в словах, которое ищется при склейке.
+MAX_OVERLAP_WORDS = 20
+# Наименьшее перекрытие, которое считается повтором: совпадение одного
+# слова на стыке строк обычно является речью ("Go go go.").
+MIN_OVERLAP_WORDS = 2
+# Максимальная длина строки, собранной из нескольких строк субтитров.
+MAX_SENTENCE_CHARS = 400
+
+
+class CleaningReport(NamedTuple):
+    chars_before: int
+    chars_after: int
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def chars_saved(self) -> int:
+        return self.chars_before - self.chars_after
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def _strip_word(word: str) -> str:
+    return word.strip(".,!?…:;\"'«»()").lower()
+
+
+def clean_words(text: str, fillers: set[str]) -> list[str]:
+    """
+    Удаляет из строки неречевые пометки и слова-паразиты.
+    Returns:
+        list[str]: Оставшиеся слова строки.
+    """
+    text = NON_SPEECH.sub(" ", text)
+    return [word for word in WORD.findall(text) if _strip_word(word) not in fillers]
+
+
+def _crosses_sentence(words: list[str]) -> bool:
+    """Проверяет, заканчивается ли предложение внутри слов (кроме последнего)."""
+    return any(SENTENCE_END.search(word) for word in words[:-1])
+
+
+def _overlap(previous: list[str], current: list[str]) -> int:
+    """
+    Длина наибольшего конца previous, совпадающего с началом current (в
+    словах). Перекрытия короче MIN_OVERLAP_WORDS и перекрытия, внутри
+    которых заканчивается предложение, не учитываются.
+    """
+    limit = min(len(previous), len(current), MAX_OVERLAP_WORDS)
+    previous_tail = [_strip_word(word) for word in previous[-limit:]]
+    current_head = [_strip_word(word) for word in current[:limit]]
+    for size in range(limit, MIN_OVERLAP_WORDS - 1, -1):
+        if (previous_tail[limit - size:] == current_head[:size]
+                and not _crosses_sentence(previous[len(previous) - size:])
+                and not _crosses_sentence(current[:size])):
+            return size
+    return 0
+
+
+def clean_subtitles(subtitles: Subtitles) -> tuple[Subtitles, CleaningReport]:
+    """
+    Очищает субтитры перед переводом и рерайтом.
+    Удаляет неречевые пометки ([Music], [Applause], ...) и слова-паразиты,
+    а у автоматических субтитров (kind == GENERATED) - повторяющиеся строки
+    и перекрытия соседних строк (YouTube повторяет конец предыдущей
+    строки), затем склеивает строки в предложения. Время работы линейно
+    по длине текста: перекрытие ищется не более чем по MAX_OVERLAP_WORDS
+    словам.
+    Args:
+        subtitles(Subtitles): Исходные субтитры.
+    Returns:
+        tuple[Subtitles, CleaningReport]: Очищенные субтитры (тайминг
+        строки - от первой до последней вошедшей в нее строки) и отчет об
+        экономии символов и токенов.
+    """
+    fillers = FILLERS.get(subtitles.language_code, set())
+    # В ручных субтитрах перекрытий нет, совпадения на стыке строк - речь.
+    rolling = subtitles.kind == GENERATED
+    sentences = []
+    words: list[str] = []
+    # Последние выведенные слова, с которыми сравнивается начало строки.
+    tail: list[str] = []
+    length = 0
+    start = end = 0.0
+
+    for line in subtitles:
+        current = clean_words(line.text, fillers)
+        if rolling:
+            current = current[_overlap(tail, current):]
+        if not current:
+            continue
+        if not words:
+            start = line.start
+        words.extend(current)
+        length += sum(len(word) + 1 for word in current)
+        tail = (tail + current)[-MAX_OVERLAP_WORDS:]
+        end = max(end, line.end)
+        if SENTENCE_END.search(current[-1]) or length >= MAX_SENTENCE_CHARS:
+            sentences.append((" ".join(words), start, end - start))
+            words, length = [], 0
+    if words:
+        sentences.append((" ".join(words), start, end - start))
+
+    cleaned = Subtitles(sentences, subtitles.language_code, subtitles.kind)
+    report = CleaningReport(len(subtitles.text), len(cleaned.text),
+                            estimate_tokens(subtitles.text), estimate_tokens(cleaned.text))
+    return cleaned, report
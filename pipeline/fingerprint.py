@@ -0,0 +1,259 @@
+import re
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+from database.connection import transaction
+
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_BITS = 64
+# Индекс с порогом max_distance делит 64-битный отпечаток на max_distance + 1
+# полос. Если отпечатки отличаются не более чем в max_distance битах, хотя бы
+# одна полоса у них совпадает, поэтому кандидатов достаточно искать по
+# совпадению полос. Чем больше порог, тем уже полосы и тем больше кандидатов
+# в каждой корзине: при пороге 3 (полосы по 16 бит) поиск почти мгновенный,
+# при пороге 15 (по 4 бита) в корзину попадает 1/16 всех отпечатков.
+# Порог 3 находит повторные загрузки с мелкими отличиями. Отпечаток
+# считается по всему тексту, поэтому ролик, совпадающий с другим на ~90%
+# (вставки, обрезанные начало и конец), находится при пороге около 10-12, а
+# короткие нарезки (меньше половины текста) SimHash не отличает от
+# несвязанных текстов.
+MAX_DISTANCE = 3
+DISTANCE_LIMIT = 15
+SHINGLE_SIZE = 3
+
+WORD = re.compile(r'\w+')
+
+
+class Duplicate(NamedTuple):
+    youtube_id: str
+    distance: int
+    similarity: float
+
+
+def simhash(text: str, shingle_size=SHINGLE_SIZE) -> int:
+    """
+    Вычисляет 64-битный SimHash текста по шинглам из shingle_size слов.
+    Args:
+        text(str): Текст субтитров.
+        shingle_size(int): Количество слов в шингле.
+    Returns:
+        int: Отпечаток текста (беззнаковое 64-битное число).
+    """
+    words = WORD.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = (" ".join(words[i:i + shingle_size])
+                    for i in range(len(words) - shingle_size + 1))
+
+    weights = [0] * SIGNATURE_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(),
+                               "little")
+        for bit in range(SIGNATURE_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """Возвращает количество различающихся бит двух отпечатков."""
+    return bin(first ^ second).count("1")
+
+
+def bands(signature: int, count: int) -> list[int]:
+    """Делит отпечаток на count полос почти одинаковой ширины."""
+    width, extra = divmod(SIGNATURE_BITS, count)
+    values = []
+    offset = 0
+    for band in range(count):
+        bits = width + (band < extra)
+        values.append(signature >> offset & ((1 << bits) - 1))
+        offset += bits
+    return values
+
+
+def _to_signed(value: int) -> int:
+    """Переводит беззнаковое 64-битное число в знаковое для хранения в sqlite."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class FingerprintIndex:
+    """
+    Индекс отпечатков субтитров для поиска почти одинаковых текстов.
+    Отпечатки раскладываются по корзинам полос (LSH), поэтому поиск
+    проверяет лишь несколько кандидатов из совпадающих корзин. Корзины
+    хранятся в таблице fingerprint_bands, и поиск идет по ней, поэтому
+    индексы разных процессов и машин с общей БД видят отпечатки друг друга.
+    У индекса без БД корзины хранятся в памяти.
+    """
+
+    def __init__(self, db_name: Optional[str] = "harvester_data.db", max_distance=MAX_DISTANCE):
+        """
+        Args:
+            db_name(str): Имя БД; None - индекс только в памяти.
+            max_distance(int): Максимальное расстояние Хэмминга, при котором
+            тексты считаются дубликатами (от 0 до DISTANCE_LIMIT).
+        """
+        if not 0 <= max_distance <= DISTANCE_LIMIT:
+            raise ValueError(f"max_distance должен быть от 0 до {DISTANCE_LIMIT}.")
+        self.db_name = db_name
+        self.max_distance = max_distance
+        self.band_count = max_distance + 1
+        self._signatures: dict[str, int] = {}
+        self._buckets: list[dict[int, list[str]]] = [{} for _ in range(self.band_count)]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db_name="harvester_data.db", max_distance=MAX_DISTANCE) -> "FingerprintIndex":
+        """
+        Открывает индекс отпечатков из таблицы fingerprints. Отпечатки,
+        сохраненные индексами с другим порогом, раскладываются по корзинам
+        этого порога.
+        Args:
+            db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+            max_distance(int): Порог расстояния Хэмминга.
+        Returns:
+            FingerprintIndex: Индекс отпечатков.
+        """
+        index = cls(db_name, max_distance)
+        try:
+            with transaction(db_name, immediate=True) as conn:
+                # Отпечатки, сохраненные с другим порогом, раскладываются по
+                # корзинам этого индекса.
+                missing = conn.execute("""
+                    SELECT youtube_id, simhash FROM fingerprints
+                    WHERE youtube_id NOT IN
+                        (SELECT youtube_id FROM fingerprint_bands WHERE bands = ? AND band = 0)
+                    """, (index.band_count,)).fetchall()
+                for youtube_id, signature in missing:
+                    index._save_bands(conn, youtube_id, signature & ((1 << 64) - 1),
+                                      (index.band_count,))
+                count = conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+            logger.info(f"Загружено отпечатков: {count}.")
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка загрузки отпечатков: {e}")
+        return index
+
+    def _add_to_memory(self, youtube_id: str, signature: int) -> None:
+        previous = self._signatures.get(youtube_id)
+        if previous == signature:
+            return
+        if previous is not None:
+            # Повторно обработанный ролик: старый отпечаток убирается из корзин.
+            for band, value in enumerate(bands(previous, self.band_count)):
+                bucket = self._buckets[band][value]
+                bucket.remove(youtube_id)
+                if not bucket:
+                    del self._buckets[band][value]
+        self._signatures[youtube_id] = signature
+        for band, value in enumerate(bands(signature, self.band_count)):
+            self._buckets[band].setdefault(value, []).append(youtube_id)
+
+    def _find(self, signature: int, exclude: Optional[str] = None) -> Optional[Duplicate]:
+        best = None
+        seen = set()
+        for band, value in enumerate(bands(signature, self.band_count)):
+            for candidate in self._buckets[band].get(value, ()):
+                if candidate in seen or candidate == exclude:
+                    continue
+                seen.add(candidate)
+                distance = hamming_distance(signature, self._signatures[candidate])
+                if distance <= self.max_distance and (best is None or distance < best.distance):
+                    best = Duplicate(candidate, distance, 1 - distance / SIGNATURE_BITS)
+        return best
+
+    def _find_in_db(self, conn: sqlite3.Connection, signature: int,
+                    exclude: Optional[str] = None) -> Optional[Duplicate]:
+        values = bands(signature, self.band_count)
+        condition = " OR ".join("(b.band = ? AND b.value = ?)" for _ in values)
+        rows = conn.execute(f"""
+            SELECT DISTINCT f.youtube_id, f.simhash
+            FROM fingerprint_bands b JOIN fingerprints f ON f.youtube_id = b.youtube_id
+            WHERE b.bands = ? AND ({condition}) AND f.youtube_id != ?
+            """, (self.band_count, *(value for pair in enumerate(values) for value in pair),
+                  exclude or "")).fetchall()
+        best = None
+        for candidate, stored in rows:
+            distance = hamming_distance(signature, stored & ((1 << 64) - 1))
+            if distance <= self.max_distance and (best is None or distance < best.distance):
+                best = Duplicate(candidate, distance, 1 - distance / SIGNATURE_BITS)
+        return best
+
+    def find_duplicate(self, text: str) -> Optional[Duplicate]:
+        """
+        Ищет уже известный почти одинаковый текст.
+        Args:
+            text(str): Текст субтитров.
+        Returns:
+            Optional[Duplicate]: Ближайший дубликат или None.
+        """
+        signature = simhash(text)
+        if self.db_name:
+            try:
+                with transaction(self.db_name) as conn:
+                    return self._find_in_db(conn, signature)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка поиска отпечатка: {e}")
+                return None
+        with self._lock:
+            return self._find(signature)
+
+    def check_and_add(self, youtube_id: str, text: str) -> Optional[Duplicate]:
+        """
+        Ищет дубликат текста и запоминает отпечаток ролика. Поиск и
+        добавление выполняются атомарно (у индекса с БД - одной транзакцией
+        с блокировкой на запись), поэтому из двух одновременно
+        обрабатываемых копий новой считается только одна, даже если их
+        обрабатывают разные процессы или машины.
+        Args:
+            youtube_id(str): ID ролика на YouTube.
+            text(str): Текст субтитров.
+        Returns:
+            Optional[Duplicate]: Ближайший дубликат или None, если текст новый.
+        """
+        signature = simhash(text)
+        if not self.db_name:
+            with self._lock:
+                duplicate = self._find(signature, exclude=youtube_id)
+                self._add_to_memory(youtube_id, signature)
+            return duplicate
+        try:
+            with transaction(self.db_name, immediate=True) as conn:
+                duplicate = self._find_in_db(conn, signature, exclude=youtube_id)
+                self._save(conn, youtube_id, signature, duplicate)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка проверки отпечатка: {e}")
+            return None
+        return duplicate
+
+    @staticmethod
+    def _save_bands(conn: sqlite3.Connection, youtube_id: str, signature: int,
+                    band_counts) -> None:
+        conn.executemany("INSERT OR REPLACE INTO fingerprint_bands (youtube_id, bands, band, value) "
+                         "VALUES (?, ?, ?, ?)",
+                         [(youtube_id, count, band, value) for count in band_counts
+                          for band, value in enumerate(bands(signature, count))])
+
+    def _save(self, conn: sqlite3.Connection, youtube_id: str, signature: int,
+              duplicate: Optional[Duplicate]) -> None:
+        conn.execute("""
+            INSERT OR REPLACE INTO fingerprints (youtube_id, simhash, duplicate_of, created_at)
+            VALUES (?, ?, ?, ?)
+            """, (youtube_id, _to_signed(signature), duplicate.youtube_id if duplicate else None,
+                  datetime.now(timezone.utc).isoformat(timespec="seconds")))
+        # Полосы пишутся для всех порогов, с которыми работают индексы этой
+        # БД, чтобы их поиск тоже находил новый отпечаток.
+        band_counts = {self.band_count}
+        band_counts.update(
+            count for count in range(1, DISTANCE_LIMIT + 2)
+            if conn.execute("SELECT 1 FROM fingerprint_bands WHERE bands = ? LIMIT 1",
+                            (count,)).fetchone())
+        conn.execute("DELETE FROM fingerprint_bands WHERE youtube_id = ?", (youtube_id,))
+        self._save_bands(conn, youtube_id, signature, sorted(band_counts))
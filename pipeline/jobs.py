@@ -0,0 +1,253 @@
+import os
+import time
+import socket
+import logging
+import threading
+
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple, Optional
+from content_parser.subtitles import MANUAL, Subtitles
+from database.connection import transaction
+
+
+logger = logging.getLogger(__name__)
+
+# Состояния ролика в порядке обработки.
+STATES = ("video", "fetched", "cleaned", "translated", "rewritten", "published")
+# Этап -> (состояние, из которого он забирает ролики, состояние после него).
+STAGES = {
+    "fetch": ("video", "fetched"),
+    "clean": ("fetched", "cleaned"),
+    "translate": ("cleaned", "translated"),
+    "rewrite": ("translated", "rewritten"),
+    "publish": ("rewritten", "published"),
+}
+# Время аренды ролика воркером по умолчанию (секунды) и максимум попыток.
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+# Колонки jobs, которые может обновить этап при завершении.
+JOB_COLUMNS = ("language_code", "subtitles_kind", "timings", "text_id", "translate_id", "rewrite_id")
+
+
+class Job(NamedTuple):
+    id: int
+    youtube_id: str
+    state: str
+    language_code: Optional[str]
+    subtitles_kind: Optional[str]
+    timings: Optional[bytes]
+    text_id: Optional[int]
+    translate_id: Optional[int]
+    rewrite_id: Optional[int]
+    attempts: int
+    lease_owner: Optional[str]
+
+
+class LeaseLost(Exception):
+    """Аренда ролика истекла и ролик забрал другой воркер."""
+
+
+def _timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def worker_id() -> str:
+    """Идентификатор воркера: хост, процесс и поток."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def pack_timings(subtitles: Subtitles) -> bytes:
+    """Упаковывает тайминги строк субтитров (начала и длительности) в байты."""
+    return subtitles.starts.tobytes() + subtitles.durations.tobytes()
+
+
+def unpack_subtitles(text: str, timings: Optional[bytes], language_code: str,
+                     kind: Optional[str] = None) -> Subtitles:
+    """
+    Восстанавливает субтитры из текста (строки через перевод строки) и
+    упакованных pack_timings таймингов. Без таймингов строки получают
+    нулевое время. Без вида субтитров (kind) они считаются ручными.
+    """
+    lines = text.split("\n") if text else []
+    starts = array('d')
+    durations = array('d')
+    if timings:
+        values = array('d')
+        values.frombytes(timings)
+        half = len(values) // 2
+        starts, durations = values[:half], values[half:]
+    if len(starts) != len(lines):
+        starts = array('d', [0.0] * len(lines))
+        durations = array('d', [0.0] * len(lines))
+    return Subtitles(zip(lines, starts, durations), language_code, kind or MANUAL)
+
+
+class JobQueue:
+    """
+    Очередь обработки роликов в таблице jobs.
+    Ролик находится в одном из состояний STATES. Воркер этапа забирает
+    ролик в исходном состоянии этапа с арендой на lease_seconds, и пока
+    аренда не истекла, другие воркеры его не берут. Результат этапа
+    сохраняется в таблицы original_texts/translates/rewrites в одной
+    транзакции с переходом в следующее состояние, поэтому после
+    перезапуска обработка продолжается с последнего завершенного этапа.
+    Ролик, этап которого упал max_attempts раз, помечается failed.
+    """
+
+    def __init__(self, db_name="harvester_data.db", lease_seconds=LEASE_SECONDS,
+                 max_attempts=MAX_ATTEMPTS):
+        """
+        Args:
+            db_name(str): Имя файла базы данных (таблица jobs создается
+            initialize_db).
+            lease_seconds(float): Время аренды ролика воркером.
+            max_attempts(int): Количество попыток этапа до пометки failed.
+        """
+        self.db_name = db_name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def enqueue(self, youtube_ids: Iterable[str]) -> int:
+        """
+        Добавляет ролики в очередь; уже известные ролики не меняются.
+        Returns:
+            int: Количество добавленных роликов.
+        """
+        now = _timestamp()
+        with transaction(self.db_name, immediate=True) as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO jobs (youtube_id, state, created_at, "
+                             "updated_at) VALUES (?, 'video', ?, ?)",
+                             ((youtube_id, now, now) for youtube_id in youtube_ids))
+            return conn.total_changes - before
+
+    def _row(self, conn, job_id: int) -> Job:
+        row = conn.execute(f"SELECT {', '.join(Job._fields)} FROM jobs WHERE id = ?",
+                           (job_id,)).fetchone()
+        return Job(*row)
+
+    def get(self, youtube_id: str) -> Optional[Job]:
+        """Возвращает ролик из очереди по ID на YouTube."""
+        with transaction(self.db_name) as conn:
+            row = conn.execute(f"SELECT {', '.join(Job._fields)} FROM jobs WHERE youtube_id = ?",
+                               (youtube_id,)).fetchone()
+        return Job(*row) if row else None
+
+    def claim(self, stage: str, owner: Optional[str] = None,
+              youtube_id: Optional[str] = None) -> Optional[Job]:
+        """
+        Забирает ролик для этапа stage: ролик в исходном состоянии этапа без
+        действующей аренды. Выбор и аренда выполняются одной транзакцией
+        BEGIN IMMEDIATE, поэтому один ролик не достанется двум воркерам.
+        Args:
+            stage(str): Этап (ключ STAGES).
+            owner(str): Идентификатор воркера, по умолчанию worker_id().
+            youtube_id(str): Забрать только этот ролик.
+        Returns:
+            Optional[Job]: Арендованный ролик или None, если забирать нечего.
+        """
+        source, _ = STAGES[stage]
+        owner = owner or worker_id()
+        now = time.time()
+        query = ("SELECT id FROM jobs WHERE state = ? AND failed = 0 "
+                 "AND (lease_expires_at IS NULL OR lease_expires_at < ?)")
+        params = [source, now]
+        if youtube_id is not None:
+            query += " AND youtube_id = ?"
+            params.append(youtube_id)
+        query += " ORDER BY updated_at, id LIMIT 1"
+        with transaction(self.db_name, immediate=True) as conn:
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET lease_owner = ?, lease_expires_at = ?, "
+                         "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                         (owner, now + self.lease_seconds, _timestamp(), row[0]))
+            return self._row(conn, row[0])
+
+    def heartbeat(self, job: Job) -> None:
+        """
+        Продлевает аренду ролика.
+        Raises:
+            LeaseLost: Если ролик уже арендован другим воркером.
+        """
+        with transaction(self.db_name, immediate=True) as conn:
+            cursor = conn.execute("UPDATE jobs SET lease_expires_at = ? "
+                                  "WHERE id = ? AND lease_owner = ?",
+                                  (time.time() + self.lease_seconds, job.id, job.lease_owner))
+            if cursor.rowcount == 0:
+                raise LeaseLost(f"Аренда ролика {job.youtube_id} потеряна.")
+
+    def complete(self, job: Job, stage: str, **columns) -> Job:
+        """
+        Переводит ролик в следующее состояние этапа и снимает аренду.
+        Вызывается внутри той же transaction(), что и запись результата
+        этапа, чтобы результат и состояние сохранились вместе.
+        Args:
+            job(Job): Арендованный ролик.
+            stage(str): Завершенный этап.
+            **columns: Обновляемые колонки из JOB_COLUMNS.
+        Returns:
+            Job: Ролик в новом состоянии.
+        Raises:
+            LeaseLost: Если аренда истекла и ролик забрал другой воркер (в
+            этом случае транзакция с результатом должна быть откачена).
+        """
+        unknown = set(columns) - set(JOB_COLUMNS)
+        if unknown:
+            raise ValueError(f"Неизвестные колонки jobs: {', '.join(sorted(unknown))}.")
+        source, target = STAGES[stage]
+        assignments = "".join(f", {column} = ?" for column in columns)
+        with transaction(self.db_name, immediate=True) as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET state = ?, attempts = 0, error = NULL, lease_owner = NULL, "
+                f"lease_expires_at = NULL, updated_at = ?{assignments} "
+                f"WHERE id = ? AND state = ? AND lease_owner = ?",
+                (target, _timestamp(), *columns.values(), job.id, source, job.lease_owner))
+            if cursor.rowcount == 0:
+                raise LeaseLost(f"Аренда ролика {job.youtube_id} потеряна.")
+            return self._row(conn, job.id)
+
+    def fail(self, job: Job, error: str, retry=True) -> None:
+        """
+        Снимает аренду после ошибки этапа. Ролик снова будет забран, пока
+        не исчерпаны попытки; без retry или после max_attempts попыток
+        помечается failed.
+        """
+        failed = int(not retry or job.attempts >= self.max_attempts)
+        with transaction(self.db_name, immediate=True) as conn:
+            conn.execute("UPDATE jobs SET failed = ?, error = ?, lease_owner = NULL, "
+                         "lease_expires_at = NULL, updated_at = ? "
+                         "WHERE id = ? AND lease_owner = ?",
+                         (failed, error, _timestamp(), job.id, job.lease_owner))
+
+    def release(self, job: Job) -> None:
+        """Снимает аренду без ошибки (например, при остановке воркера)."""
+        with transaction(self.db_name, immediate=True) as conn:
+            conn.execute("UPDATE jobs SET lease_owner = NULL, lease_expires_at = NULL, "
+                         "attempts = MAX(0, attempts - 1) WHERE id = ? AND lease_owner = ?",
+                         (job.id, job.lease_owner))
+
+    def retry_failed(self) -> int:
+        """
+        Возвращает в очередь ролики, помеченные failed.
+        Returns:
+            int: Количество возвращенных роликов.
+        """
+        with transaction(self.db_name, immediate=True) as conn:
+            cursor = conn.execute("UPDATE jobs SET failed = 0, attempts = 0, updated_at = ? "
+                                  "WHERE failed = 1", (_timestamp(),))
+            return cursor.rowcount
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает количество роликов по состояниям (failed - отдельно).
+        """
+        counts = dict.fromkeys(STATES, 0)
+        counts["failed"] = 0
+        with transaction(self.db_name) as conn:
+            for state, failed, count in conn.execute(
+                    "SELECT state, failed, COUNT(*) FROM jobs GROUP BY state, failed"):
+                counts["failed" if failed else state] += count
+        return counts
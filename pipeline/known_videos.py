@@ -0,0 +1,133 @@
+import math
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from database.connection import transaction
+
+
+logger = logging.getLogger(__name__)
+
+# При большем количестве известных роликов вместо множества используется
+# фильтр Блума.
+BLOOM_THRESHOLD = 1_000_000
+FALSE_POSITIVE_RATE = 0.001
+
+
+class BloomFilter:
+    """
+    Компактный фильтр Блума для строк. Может ошибочно сообщить, что элемент
+    уже есть (с вероятностью около false_positive_rate), но никогда не
+    пропускает добавленный элемент.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate=FALSE_POSITIVE_RATE):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+
+class KnownVideos:
+    """
+    Множество ID уже собранных роликов для отсева повторов до любых сетевых
+    запросов. Для очень большой истории используется фильтр Блума.
+    """
+
+    def __init__(self, video_ids: Iterable[str] = (), bloom_threshold=BLOOM_THRESHOLD,
+                 db_name: Optional[str] = None):
+        video_ids = list(video_ids)
+        if len(video_ids) > bloom_threshold:
+            # Запас емкости под ролики, добавленные во время работы.
+            self._ids = BloomFilter(len(video_ids) * 2)
+            for video_id in video_ids:
+                self._ids.add(video_id)
+        else:
+            self._ids = set(video_ids)
+        self.count = len(video_ids)
+        self.db_name = db_name
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db_name="harvester_data.db", bloom_threshold=BLOOM_THRESHOLD) -> "KnownVideos":
+        """
+        Загружает ID роликов из таблицы videos.
+        Args:
+            db_name(str): Имя БД, по умолчанию значение harvester_data.db.
+            bloom_threshold(int): Количество роликов, после которого
+            используется фильтр Блума.
+        Returns:
+            KnownVideos: Множество известных роликов.
+        """
+        try:
+            with transaction(db_name) as conn:
+                video_ids = [row[0] for row in conn.execute("SELECT youtube_id FROM videos")]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка загрузки известных роликов: {e}")
+            video_ids = []
+        logger.info(f"Загружено {len(video_ids)} известных роликов.")
+        return cls(video_ids, bloom_threshold=bloom_threshold, db_name=db_name)
+
+    def add(self, video_id: str) -> None:
+        with self._lock:
+            self._ids.add(video_id)
+            self.count += 1
+
+    def record(self, video_id: str) -> None:
+        """
+        Отмечает ролик обработанным: сохраняет его в таблицу videos (если
+        множество загружено из БД) и добавляет в множество.
+        Args:
+            video_id(str): ID ролика.
+        """
+        if self.db_name:
+            now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            try:
+                with transaction(self.db_name) as conn:
+                    conn.execute("INSERT OR IGNORE INTO videos (youtube_id, created_at, updated_at) "
+                                 "VALUES (?, ?, ?)", (video_id, now, now))
+            except sqlite3.Error as e:
+                logger.error(f"[{video_id}] Ошибка сохранения ролика: {e}")
+        if video_id not in self:
+            self.add(video_id)
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._ids
+
+    def filter_new(self, video_ids: Iterable[str]) -> tuple[list[str], int]:
+        """
+        Отбрасывает уже известные ролики.
+        Args:
+            video_ids(Iterable[str]): ID роликов.
+        Returns:
+            tuple[list[str], int]: Новые ID в исходном порядке и количество
+            пропущенных.
+        """
+        new_ids = []
+        skipped = 0
+        for video_id in video_ids:
+            if video_id in self._ids:
+                skipped += 1
+            else:
+                new_ids.append(video_id)
+        if skipped:
+            logger.info(f"Пропущено уже собранных роликов: {skipped}.")
+        return new_ids, skipped
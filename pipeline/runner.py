@@ -0,0 +1,349 @@
+import logging
+import threading
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator, NamedTuple, Optional, Sequence
+from database.codec import decompress_text
+from database.connection import transaction
+from database.database import insert_record
+from database.db_models import Original_text, Rewrite, Translate
+from database.reference import get_language_id, get_status_id, get_translator_id
+from database.rewrite_progress import existing_rewrite, find_partial_rewrite
+from database.translation_memory import TranslationMemory
+from rewrite.cache import RewriteCache
+from rewrite.chatgpt_rewrite import gpt_rewrite_stream, plan
+from rewrite.planner import ContextOverflowError
+from prompts import PROMPT_REWRITE
+from translate.router import TranslatorRouter, default_router
+from translate.translate import TranslationError
+from pipeline.fingerprint import FingerprintIndex
+from pipeline.jobs import STAGES, Job, JobQueue, LeaseLost, pack_timings, unpack_subtitles
+from pipeline.stages import (StageError, subtitles_stage, clean_stage, fingerprint_stage,
+                             rewrite_stage)
+
+
+logger = logging.getLogger(__name__)
+
+# Пауза между попытками забрать ролик из пустой очереди (секунды).
+POLL_INTERVAL = 5
+
+
+class StageContext(NamedTuple):
+    memory: Optional[TranslationMemory] = None
+    router: Optional[TranslatorRouter] = None
+    fingerprints: Optional[FingerprintIndex] = None
+    reject_duplicates: bool = True
+    rewrite_cache: Optional[RewriteCache] = None
+    bypass_cache: bool = False
+    max_tokens: Optional[int] = None
+    # Каналы, в которые ставятся публикации на этапе publish.
+    channel_ids: Sequence[int] = ()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _load_text(conn, table_name: str, column: str, row_id: int) -> str:
+    row = conn.execute(f"SELECT {column} FROM {table_name} WHERE id = ?", (row_id,)).fetchone()
+    if row is None:
+        raise StageError("load", f"Запись {table_name}.{row_id} не найдена.")
+    return decompress_text(row[0]) or ""
+
+
+def _insert(record, db_name: str) -> int:
+    record_id = insert_record(record, db_name=db_name)
+    if record_id is None:
+        raise StageError("checkpoint", f"Не удалось сохранить запись в {record.table_name}.")
+    return record_id
+
+
+def fetch_job(queue: JobQueue, job: Job, context: StageContext) -> Job:
+    """Получает субтитры и сохраняет их в original_texts и videos."""
+    db_name = queue.db_name
+    subtitles = subtitles_stage(job.youtube_id)
+    language_id = get_language_id(subtitles.language_code, db_name)
+    now = _now()
+    with transaction(db_name, immediate=True) as conn:
+        text_id = _insert(Original_text(language_id, subtitles.text, None, now, now), db_name)
+        conn.execute("INSERT INTO videos (youtube_id, text_id, created_at, updated_at) "
+                     "VALUES (?, ?, ?, ?) ON CONFLICT (youtube_id) DO UPDATE SET "
+                     "text_id = excluded.text_id, updated_at = excluded.updated_at",
+                     (job.youtube_id, text_id, now, now))
+        return queue.complete(job, "fetch", text_id=text_id,
+                              language_code=subtitles.language_code,
+                              subtitles_kind=subtitles.kind,
+                              timings=pack_timings(subtitles))
+
+
+def _cleaned_text(job: Job, text: str) -> str:
+    """
+    Очищает исходный текст ролика по его сохраненным таймингам. Исходный
+    текст в БД не заменяется, поэтому повтор этапа или изменение очистки
+    всегда работают с полученными субтитрами.
+    """
+    subtitles = unpack_subtitles(text, job.timings, job.language_code, job.subtitles_kind)
+    cleaned, _ = clean_stage(job.youtube_id, subtitles)
+    return cleaned.text
+
+
+def clean_job(queue: JobQueue, job: Job, context: StageContext) -> Job:
+    """Очищает субтитры и проверяет очищенный текст на дубликаты."""
+    db_name = queue.db_name
+    with transaction(db_name) as conn:
+        text = _load_text(conn, "original_texts", "text", job.text_id)
+    fingerprint_stage(job.youtube_id, _cleaned_text(job, text), context.fingerprints,
+                      reject=context.reject_duplicates)
+    with transaction(db_name, immediate=True):
+        return queue.complete(job, "clean")
+
+
+def translate_job(queue: JobQueue, job: Job, context: StageContext) -> Job:
+    """Переводит очищенный текст на русский и сохраняет перевод в translates."""
+    db_name = queue.db_name
+    with transaction(db_name) as conn:
+        text = _load_text(conn, "original_texts", "text", job.text_id)
+    text = _cleaned_text(job, text)
+    translator_id = None
+    if job.language_code == 'ru':
+        translated = text
+    else:
+        router = context.router or default_router()
+        try:
+            routed = router.translate(text, src=job.language_code, dest='ru',
+                                      memory=context.memory)
+        except TranslationError as e:
+            raise StageError("translate", str(e))
+        if not routed.text:
+            raise StageError("translate", "Перевод вернул пустой текст.")
+        translated = routed.text
+        translators = routed.translators
+        translator_id = get_translator_id(max(translators, key=translators.get), db_name)
+    language_id = get_language_id('ru', db_name)
+    now = _now()
+    with transaction(db_name, immediate=True):
+        translate_id = _insert(Translate(job.text_id, language_id, translated, translator_id,
+                                         now, now), db_name)
+        return queue.complete(job, "translate", translate_id=translate_id)
+
+
+def rewrite_job(queue: JobQueue, job: Job, context: StageContext) -> Job:
+    """
+    Делает рерайт перевода и сохраняет статью в rewrites. Прерванный
+    потоковый рерайт (см. stream_rewrite) продолжается с места обрыва.
+    """
+    db_name = queue.db_name
+    with transaction(db_name) as conn:
+        rewrite_id = existing_rewrite(conn, job.translate_id)
+        text = _load_text(conn, "translates", "translated_text", job.translate_id)
+    if rewrite_id is not None:
+        logger.info(f"[{job.youtube_id}] Рерайт уже готов: {rewrite_id}.")
+        with transaction(db_name, immediate=True):
+            return queue.complete(job, "rewrite", rewrite_id=rewrite_id)
+
+    language_id = get_language_id('ru', db_name)
+    if find_partial_rewrite(job.translate_id, db_name=db_name):
+        for _ in gpt_rewrite_stream(text, PROMPT_REWRITE, max_tokens=context.max_tokens,
+                                    translate_id=job.translate_id, language_id=language_id,
+                                    db_name=db_name):
+            pass
+        with transaction(db_name, immediate=True) as conn:
+            return queue.complete(job, "rewrite",
+                                  rewrite_id=existing_rewrite(conn, job.translate_id))
+
+    article = rewrite_stage(job.youtube_id, text, max_tokens=context.max_tokens,
+                            cache=context.rewrite_cache, bypass_cache=context.bypass_cache)
+    now = _now()
+    with transaction(db_name, immediate=True):
+        rewrite_id = _insert(Rewrite(article, language_id, job.translate_id, None, now, now),
+                             db_name)
+        return queue.complete(job, "rewrite", rewrite_id=rewrite_id)
+
+
+def publish_job(queue: JobQueue, job: Job, context: StageContext) -> Job:
+    """
+    Ставит статью в очередь публикаций (таблица publications) каналов
+    context.channel_ids; сами публикации выполняет publish.publish_to_zen.
+    """
+    db_name = queue.db_name
+    if not context.channel_ids:
+        raise StageError("publish", "Не заданы каналы для публикации.")
+    status_id = get_status_id("pending", db_name)
+    now = _now()
+    with transaction(db_name, immediate=True) as conn:
+        conn.executemany("INSERT OR IGNORE INTO publications (rewrite_id, channel_id, status_id, "
+                         "created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                         ((job.rewrite_id, channel_id, status_id, now, now)
+                          for channel_id in context.channel_ids))
+        return queue.complete(job, "publish")
+
+
+HANDLERS: dict[str, Callable[[JobQueue, Job, StageContext], Job]] = {
+    "fetch": fetch_job,
+    "clean": clean_job,
+    "translate": translate_job,
+    "rewrite": rewrite_job,
+    "publish": publish_job,
+}
+
+
+@contextmanager
+def keep_lease(queue: JobQueue, job: Job):
+    """Продлевает аренду ролика в фоне, пока выполняется этап."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(queue.lease_seconds / 3):
+            try:
+                queue.heartbeat(job)
+            except LeaseLost as e:
+                logger.warning(str(e))
+                return
+            except Exception as e:
+                logger.warning(f"Не удалось продлить аренду ролика {job.youtube_id}: {e}")
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def process_job(queue: JobQueue, stage: str, job: Job, context: StageContext) -> Optional[Job]:
+    """
+    Выполняет этап для арендованного ролика. Ошибки этапа (StageError)
+    помечают ролик failed, прочие ошибки возвращают его в очередь до
+    исчерпания попыток.
+    Returns:
+        Optional[Job]: Ролик в новом состоянии или None при ошибке.
+    """
+    try:
+        with keep_lease(queue, job):
+            return HANDLERS[stage](queue, job, context)
+    except LeaseLost as e:
+        logger.warning(f"[{job.youtube_id}] {e} Результат этапа {stage} отброшен.")
+    except StageError as e:
+        logger.error(f"[{job.youtube_id}] Ошибка на этапе {e.stage}: {e}")
+        queue.fail(job, f"{e.stage}: {e}", retry=False)
+    except Exception as e:
+        logger.error(f"[{job.youtube_id}] Ошибка на этапе {stage} "
+                     f"(попытка {job.attempts} из {queue.max_attempts}): {e}")
+        queue.fail(job, f"{stage}: {e}")
+    return None
+
+
+def run_stage(queue: JobQueue, stage: str, context: StageContext = StageContext(),
+              stop: Optional[threading.Event] = None, wait=False,
+              poll_interval=POLL_INTERVAL) -> int:
+    """
+    Воркер этапа: забирает ролики этапа из очереди и обрабатывает их.
+    Args:
+        queue(JobQueue): Очередь.
+        stage(str): Этап (ключ STAGES).
+        context(StageContext): Общие объекты этапов.
+        stop(threading.Event): Событие остановки; текущий ролик
+        дорабатывается.
+        wait(bool): Ждать новые ролики, когда очередь пуста (иначе
+        завершиться).
+        poll_interval(float): Пауза между проверками пустой очереди.
+    Returns:
+        int: Количество успешно обработанных роликов.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Неизвестный этап: {stage}.")
+    stop = stop or threading.Event()
+    done = 0
+    while not stop.is_set():
+        job = queue.claim(stage)
+        if job is None:
+            if not wait:
+                break
+            stop.wait(poll_interval)
+            continue
+        if process_job(queue, stage, job, context) is not None:
+            done += 1
+    return done
+
+
+def run_video(queue: JobQueue, youtube_id: str, context: StageContext = StageContext(),
+              until="rewritten") -> Optional[Job]:
+    """
+    Проводит один ролик по этапам, начиная с его сохраненного состояния,
+    до состояния until. Завершенные ранее этапы не повторяются.
+    Returns:
+        Optional[Job]: Ролик в последнем достигнутом состоянии или None,
+        если этап завершился ошибкой либо ролик арендован другим воркером.
+    """
+    queue.enqueue([youtube_id])
+    job = queue.get(youtube_id)
+    for stage, (source, target) in STAGES.items():
+        if job.state == until:
+            return job
+        if job.state != source:
+            continue
+        claimed = queue.claim(stage, youtube_id=youtube_id)
+        if claimed is None:
+            logger.error(f"[{youtube_id}] Ролик недоступен для этапа {stage} "
+                         f"(помечен failed или обрабатывается другим воркером).")
+            return None
+        job = process_job(queue, stage, claimed, context)
+        if job is None:
+            return None
+    return job
+
+
+def stream_rewrite(queue: JobQueue, job: Job, max_tokens: Optional[int] = None) -> Iterator[str]:
+    """
+    Выполняет этап rewrite для ролика потоковым рерайтом, отдавая текст по
+    мере генерации. Текст сохраняется в rewrites по ходу генерации, поэтому
+    прерванный рерайт продолжается с места обрыва; для уже переписанного
+    ролика отдается сохраненная статья.
+    Args:
+        queue(JobQueue): Очередь.
+        job(Job): Ролик в состоянии translated или дальше.
+        max_tokens(int): Максимальное количество токенов ответа; None -
+        выбирается планировщиком.
+    Yields:
+        str: Части текста статьи.
+    Raises:
+        StageError: Если ролик недоступен для рерайта или текст не помещается
+        в контекст модели одним запросом (ролик при этом возвращается в
+        очередь).
+    """
+    db_name = queue.db_name
+    if job.rewrite_id is not None:
+        with transaction(db_name) as conn:
+            yield _load_text(conn, "rewrites", "rewrite_text", job.rewrite_id)
+        return
+    claimed = queue.claim("rewrite", youtube_id=job.youtube_id)
+    if claimed is None:
+        raise StageError("rewrite", "Ролик обрабатывается другим воркером или помечен failed.")
+    try:
+        with transaction(db_name) as conn:
+            text = _load_text(conn, "translates", "translated_text", claimed.translate_id)
+        rewrite_plan = plan(text, PROMPT_REWRITE)
+        logger.info(f"[{job.youtube_id}] План рерайта: {rewrite_plan}.")
+        with keep_lease(queue, claimed):
+            yield from gpt_rewrite_stream(text, PROMPT_REWRITE,
+                                          max_tokens=max_tokens or rewrite_plan.max_tokens,
+                                          translate_id=claimed.translate_id,
+                                          language_id=get_language_id('ru', db_name),
+                                          db_name=db_name)
+        with transaction(db_name, immediate=True) as conn:
+            queue.complete(claimed, "rewrite",
+                           rewrite_id=existing_rewrite(conn, claimed.translate_id))
+    except ContextOverflowError as e:
+        # Потоковый рерайт - один запрос; ролик остается этапу rewrite
+        # воркеров, который переписывает текст по секциям.
+        queue.release(claimed)
+        raise StageError("rewrite", f"Текст не помещается в один запрос: {e}") from e
+    except Exception as e:
+        queue.fail(claimed, f"rewrite: {e}")
+        raise
+    except BaseException:
+        # Прерывание пользователем: рерайт продолжится при следующем запуске.
+        queue.release(claimed)
+        raise
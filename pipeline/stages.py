@@ -0,0 +1,153 @@
+import logging
+
+from typing import Optional
+from content_parser.youtube_parser import fetch_subtitles
+from content_parser.subtitles import Subtitles
+from pipeline.cleaning import CleaningReport, clean_subtitles
+from database.translation_memory import TranslationMemory
+from pipeline.fingerprint import FingerprintIndex
+from translate.translate import TranslationError
+from translate.router import TranslatorRouter, default_router
+from rewrite.cache import RewriteCache
+from rewrite.chatgpt_rewrite import SECTION_TOKENS, MAX_WORKERS, gpt_rewrite_long, plan
+from rewrite.planner import ContextOverflowError
+from prompts import PROMPT_REWRITE
+
+
+logger = logging.getLogger(__name__)
+
+
+class StageError(Exception):
+    """Ошибка выполнения одного из этапов конвейера."""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+
+
+def subtitles_stage(youtube_id: str) -> Subtitles:
+    """
+    Получает субтитры ролика за один запрос списка субтитров: ручные или
+    автоматические русские, затем английские, затем перевод YouTube.
+    Args:
+        youtube_id(str): ID ролика на YouTube.
+    Returns:
+        Subtitles: Субтитры с таймингами и кодом языка.
+    Raises:
+        StageError: Если подходящих субтитров нет.
+    """
+    subtitles = fetch_subtitles(youtube_id)
+    if not subtitles or not subtitles.text:
+        raise StageError("subtitles", "Подходящих субтитров нет.")
+    logger.info(f"[{youtube_id}] Субтитры ({subtitles.kind}, {subtitles.language_code}) "
+                f"получены. Длина текста: {len(subtitles.text)}.")
+    return subtitles
+
+
+def clean_stage(youtube_id: str, subtitles: Subtitles) -> tuple[Subtitles, CleaningReport]:
+    """
+    Очищает субтитры от повторов, неречевых пометок и слов-паразитов.
+    Args:
+        youtube_id(str): ID ролика на YouTube (для логов).
+        subtitles(Subtitles): Субтитры ролика.
+    Returns:
+        tuple[Subtitles, CleaningReport]: Очищенные субтитры и отчет об экономии.
+    Raises:
+        StageError: Если после очистки текста не осталось.
+    """
+    cleaned, report = clean_subtitles(subtitles)
+    if not cleaned.text:
+        raise StageError("clean", "После очистки субтитров текста не осталось.")
+    logger.info(f"[{youtube_id}] Субтитры очищены: сэкономлено {report.chars_saved} символов "
+                f"(~{report.tokens_saved} токенов) из {report.chars_before}.")
+    return cleaned, report
+
+
+def fingerprint_stage(youtube_id: str, text: str, index: Optional[FingerprintIndex],
+                      reject=True) -> None:
+    """
+    Проверяет, не является ли текст почти копией уже обработанного.
+    Args:
+        youtube_id(str): ID ролика на YouTube.
+        text(str): Текст субтитров.
+        index(FingerprintIndex): Индекс отпечатков; None - проверка не
+        выполняется.
+        reject(bool): Прерывать обработку дубликата (иначе только пометить
+        в логе и в таблице fingerprints).
+    Raises:
+        StageError: Если текст - дубликат и reject=True.
+    """
+    if index is None:
+        return
+    duplicate = index.check_and_add(youtube_id, text)
+    if duplicate is None:
+        return
+    message = (f"Субтитры совпадают с роликом {duplicate.youtube_id} "
+               f"на {duplicate.similarity:.0%}.")
+    if reject:
+        raise StageError("fingerprint", message)
+    logger.warning(f"[{youtube_id}] {message}")
+
+
+def translate_stage(youtube_id: str, text: str, language_code: str,
+                    memory: Optional[TranslationMemory] = None,
+                    router: Optional[TranslatorRouter] = None) -> str:
+    """
+    Переводит текст на русский язык, если он еще не на русском.
+    Сегменты распределяются между переводчиками маршрутизатором.
+    Args:
+        youtube_id(str): ID ролика на YouTube (для логов).
+        text(str): Текст субтитров.
+        language_code(str): Код языка текста.
+        memory(TranslationMemory): Память переводов.
+        router(TranslatorRouter): Маршрутизатор переводчиков; None - общий
+        маршрутизатор процесса.
+    Returns:
+        str: Текст на русском языке.
+    """
+    if language_code == 'ru':
+        return text
+    router = router or default_router()
+    try:
+        translated = router.translate(text, src=language_code, dest='ru', memory=memory).text
+    except TranslationError as e:
+        raise StageError("translate", str(e))
+    if not translated:
+        raise StageError("translate", "Перевод вернул пустой текст.")
+    logger.info(f"[{youtube_id}] Субтитры переведены. Длина текста: {len(translated)}.")
+    return translated
+
+
+def rewrite_stage(youtube_id: str, text: str, max_tokens: Optional[int] = None,
+                  cache: Optional[RewriteCache] = None, bypass_cache=False) -> str:
+    """
+    Делает рерайт текста в статью (длинный текст переписывается по секциям).
+    Перед отправкой запросов в лог пишется план: токены, max_tokens,
+    ожидаемые стоимость и время.
+    Args:
+        youtube_id(str): ID ролика на YouTube (для логов).
+        text(str): Текст для рерайта.
+        max_tokens(int): Максимальное количество токенов ответа на секцию;
+        None - выбирается планировщиком.
+        cache(RewriteCache): Кэш результатов рерайта.
+        bypass_cache(bool): Не читать результат из кэша.
+    Returns:
+        str: Текст статьи.
+    Raises:
+        StageError: Если секция не помещается в контекст модели или рерайт
+        вернул пустой текст.
+    """
+    try:
+        rewrite_plan = plan(text, PROMPT_REWRITE, SECTION_TOKENS, MAX_WORKERS)
+    except ContextOverflowError as e:
+        raise StageError("rewrite", str(e)) from e
+    logger.info(f"[{youtube_id}] План рерайта: {rewrite_plan}.")
+    if rewrite_plan.truncated and max_tokens is None:
+        logger.warning(f"[{youtube_id}] Ожидаемый ответ не помещается в лимит модели.")
+    article_text = gpt_rewrite_long(text, PROMPT_REWRITE,
+                                    max_tokens=max_tokens or rewrite_plan.max_tokens,
+                                    cache=cache, bypass_cache=bypass_cache)
+    if not article_text:
+        raise StageError("rewrite", "Рерайт вернул пустой текст.")
+    logger.info(f"[{youtube_id}] Рерайт завершен успешно. Длина текста: {len(article_text)}.")
+    return article_text
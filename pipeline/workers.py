@@ -0,0 +1,220 @@
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+
+from typing import NamedTuple, Optional, Sequence
+from pipeline.fingerprint import MAX_DISTANCE
+from pipeline.jobs import STAGES, JobQueue, LEASE_SECONDS
+from pipeline.runner import POLL_INTERVAL, StageContext, run_stage
+
+
+logger = logging.getLogger(__name__)
+
+# Количество процессов на этап по умолчанию. Этап publish включается только
+# при заданных каналах.
+DEFAULT_WORKERS = {
+    "fetch": 2,
+    "clean": 1,
+    "translate": 2,
+    "rewrite": 2,
+    "publish": 0,
+}
+# Задержка перезапуска упавшего воркера: растет вдвое после каждого
+# падения и сбрасывается, если воркер проработал STABLE_SECONDS.
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 300
+STABLE_SECONDS = 60
+# Сколько ждать завершения текущих роликов после SIGTERM.
+DRAIN_TIMEOUT = 600
+CHECK_INTERVAL = 1
+
+MULTI_HOST_HELP = """
+Несколько машин. Очередь - таблица jobs в SQLite, поэтому все воркеры
+должны видеть один файл БД:
+  * Лучше всего запускать все воркеры на машине, где лежит файл БД
+    (сколько угодно процессов через --<этап> N).
+  * Для воркеров на других машинах файл БД размещается на общем диске
+    с корректными блокировками POSIX (NFS v4 с lockd, не SMB) и у всех
+    процессов задается HARVESTER_JOURNAL_MODE=DELETE: режим WAL через
+    сеть не работает. Запись в БД при этом сериализуется, поэтому на
+    удаленные машины стоит выносить долгие сетевые этапы (translate,
+    rewrite), а не частые короткие.
+  * Часы машин должны быть синхронизированы (NTP): аренды роликов
+    сравниваются по времени. --lease должна быть больше самого долгого
+    этапа с запасом; брошенный упавшей машиной ролик вернется в очередь
+    после истечения аренды.
+  * Ролики добавляются с любой машины командой harvester enqueue.
+"""
+
+
+class WorkerOptions(NamedTuple):
+    db_name: str = "harvester_data.db"
+    lease_seconds: float = LEASE_SECONDS
+    poll_interval: float = POLL_INTERVAL
+    channel_ids: Sequence[int] = ()
+    hedge_after: Optional[float] = None
+    max_distance: int = MAX_DISTANCE
+
+
+def build_context(options: WorkerOptions) -> StageContext:
+    """Создает общие объекты этапов в процессе воркера."""
+    from database.translation_memory import TranslationMemory
+    from pipeline.fingerprint import FingerprintIndex
+    from translate.router import TranslatorRouter
+
+    return StageContext(memory=TranslationMemory(options.db_name),
+                        router=TranslatorRouter(db_name=options.db_name,
+                                                hedge_after=options.hedge_after),
+                        fingerprints=FingerprintIndex.load(options.db_name, options.max_distance),
+                        channel_ids=tuple(options.channel_ids))
+
+
+def worker_main(stage: str, options: WorkerOptions) -> None:
+    """
+    Точка входа процесса воркера: обрабатывает ролики этапа, пока не
+    получит SIGTERM; текущий ролик при этом дорабатывается.
+    """
+    from dotenv import load_dotenv
+    from database.connection import close_connection
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO,
+                        format=f'%(asctime)s - {stage}[%(process)d] - %(levelname)s - %(message)s')
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    # Ctrl+C обрабатывает супервизор, воркеры останавливаются по SIGTERM.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    queue = JobQueue(options.db_name, lease_seconds=options.lease_seconds)
+    try:
+        done = run_stage(queue, stage, build_context(options), stop=stop, wait=True,
+                         poll_interval=options.poll_interval)
+        logger.info(f"Воркер остановлен, обработано роликов: {done}.")
+    finally:
+        close_connection()
+
+
+class _Slot:
+    """Место воркера этапа: процесс и статистика его перезапусков."""
+
+    def __init__(self, stage: str, number: int):
+        self.stage = stage
+        self.number = number
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.restart_delay = RESTART_DELAY
+        self.restart_at = 0.0
+        self.restarts = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.stage}-{self.number}"
+
+
+class Supervisor:
+    """
+    Запускает процессы воркеров (по workers[stage] на этап), перезапускает
+    упавшие с растущей задержкой и по SIGTERM/SIGINT останавливает их,
+    давая доработать текущие ролики не дольше drain_timeout секунд.
+    Процессы создаются методом spawn, поэтому не наследуют соединения с БД
+    и потоки родителя.
+    """
+
+    def __init__(self, workers: dict[str, int], options: WorkerOptions = WorkerOptions(),
+                 drain_timeout=DRAIN_TIMEOUT, target=worker_main):
+        """
+        Args:
+            workers(dict[str, int]): Количество процессов по этапам (STAGES).
+            options(WorkerOptions): Параметры воркеров.
+            drain_timeout(float): Время на завершение текущих роликов при
+            остановке, после него процессы завершаются принудительно.
+            target(Callable): Функция процесса (stage, options).
+        """
+        unknown = set(workers) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Неизвестные этапы: {', '.join(sorted(unknown))}.")
+        if workers.get("publish") and not options.channel_ids:
+            raise ValueError("Для этапа publish необходимо указать каналы.")
+        self.options = options
+        self.drain_timeout = drain_timeout
+        self.target = target
+        self.slots = [_Slot(stage, number) for stage, count in workers.items()
+                      for number in range(count)]
+        self.stopping = threading.Event()
+        self._context = multiprocessing.get_context("spawn")
+
+    def _start(self, slot: _Slot) -> None:
+        slot.process = self._context.Process(target=self.target, name=slot.name,
+                                             args=(slot.stage, self.options))
+        slot.process.start()
+        slot.started_at = time.monotonic()
+        logger.info(f"Запущен воркер {slot.name} (pid {slot.process.pid}).")
+
+    def _check(self, slot: _Slot) -> None:
+        """Перезапускает завершившийся воркер с задержкой."""
+        now = time.monotonic()
+        if slot.process is not None:
+            if slot.process.is_alive():
+                return
+            exitcode = slot.process.exitcode
+            if now - slot.started_at >= STABLE_SECONDS:
+                slot.restart_delay = RESTART_DELAY
+            log = logger.warning if exitcode == 0 else logger.error
+            log(f"Воркер {slot.name} завершился с кодом {exitcode}, "
+                f"перезапуск через {slot.restart_delay} с.")
+            slot.process.close()
+            slot.process = None
+            slot.restart_at = now + slot.restart_delay
+            slot.restart_delay = min(MAX_RESTART_DELAY, slot.restart_delay * 2)
+            slot.restarts += 1
+            return
+        if now >= slot.restart_at:
+            self._start(slot)
+
+    def stop(self, *args) -> None:
+        """Начинает остановку (используется как обработчик сигналов)."""
+        if not self.stopping.is_set():
+            logger.info("Остановка воркеров: текущие ролики дорабатываются.")
+        self.stopping.set()
+
+    def _drain(self) -> None:
+        running = [slot.process for slot in self.slots
+                   if slot.process is not None and slot.process.is_alive()]
+        for process in running:
+            process.terminate()
+        deadline = time.monotonic() + self.drain_timeout
+        for process in running:
+            process.join(max(0.0, deadline - time.monotonic()))
+        for process in running:
+            if process.is_alive():
+                logger.warning(f"Воркер {process.name} не завершился за {self.drain_timeout} с, "
+                               f"принудительная остановка (ролик вернется в очередь "
+                               f"после истечения аренды).")
+                process.kill()
+                process.join()
+
+    def run(self, install_signals=True) -> dict[str, int]:
+        """
+        Запускает воркеры и следит за ними до остановки.
+        Args:
+            install_signals(bool): Останавливаться по SIGTERM и SIGINT.
+        Returns:
+            dict[str, int]: Количество перезапусков по воркерам.
+        """
+        if install_signals:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        if not self.slots:
+            logger.warning("Не задано ни одного воркера.")
+            return {}
+        try:
+            for slot in self.slots:
+                self._start(slot)
+            while not self.stopping.wait(CHECK_INTERVAL):
+                for slot in self.slots:
+                    self._check(slot)
+        finally:
+            self._drain()
+        logger.info("Все воркеры остановлены.")
+        return {slot.name: slot.restarts for slot in self.slots}
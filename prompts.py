@@ -8,5 +8,17 @@ PROMPT_REWRITE = """
 {text}
 """
 
+PROMPT_MERGE = """
+Ниже после двоеточия статья, собранная из нескольких последовательных частей.
+Сгладь переходы между частями, убери повторы на стыках, но не сокращай
+текст, не меняй его стиль и не добавляй новых фактов:
+{text}
+"""
+
+PROMPT_CONTINUE = """
+Продолжи текст ровно с того места, где он оборвался, не повторяя уже
+написанное.
+"""
+
 PROMPT_TRANSLATE = """
 """
@@ -1,8 +1,439 @@
-from selenium import webdriver
-from selenium.webdriver.firefox.service import Service
-from webdriver_manager.firefox import GeckoDriverManager
+import queue
+import sqlite3
+import logging
+import threading
+import functools
 
-service = Service(GeckoDriverManager().install())
-driver = webdriver.Firefox(service=service)
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, NamedTuple, Optional
+from database.codec import decompress_text
+from database.connection import transaction
+from database.reference import get_status_id
 
-driver.get("https://zen.yandex.ru/")
+
+logger = logging.getLogger(__name__)
+
+ZEN_URL = "https://dzen.ru"
+# Селекторы редактора Дзена. Браузер должен использовать профиль Firefox, в
+# котором выполнен вход в аккаунт канала (см. publish_pending(profile_root)).
+SELECTORS = {
+    "create": "[data-testid='add-publication-button']",
+    "article": "[data-testid='add-article']",
+    "title": "[data-testid='article-title'] [contenteditable='true']",
+    "body": "[data-testid='article-body'] [contenteditable='true']",
+    "publish": "[data-testid='publish-btn']",
+    "confirm": "[data-testid='publish-confirm']",
+}
+PAGE_TIMEOUT = 60
+TITLE_MAX_CHARS = 120
+# Количество браузеров на канал и количество каналов, публикуемых одновременно.
+POOL_SIZE = 2
+MAX_CHANNELS = 4
+# Публикация в статусе publishing дольше этого времени считается
+# брошенной (процесс завершился) и снова ставится в очередь.
+STALE_AFTER = timedelta(minutes=15)
+# Неудачная публикация повторяется не раньше чем через RETRY_DELAY, после
+# MAX_ATTEMPTS неудач она получает статус failed (см. retry_failed).
+RETRY_DELAY = timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+
+STATUS_PENDING = "pending"
+STATUS_PUBLISHING = "publishing"
+STATUS_PUBLISHED = "published"
+STATUS_FAILED = "failed"
+
+
+class PendingPublication(NamedTuple):
+    id: int
+    rewrite_id: int
+    channel_id: int
+    channel_url: str
+    text: str
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _timestamp(moment: Optional[datetime] = None) -> str:
+    return (moment or _now()).isoformat(timespec="seconds")
+
+
+@functools.lru_cache(maxsize=1)
+def _geckodriver_path() -> str:
+    """Скачивает geckodriver при первом запуске браузера, а не при импорте."""
+    from webdriver_manager.firefox import GeckoDriverManager
+    return GeckoDriverManager().install()
+
+
+def create_driver(profile: Optional[str] = None, headless=True):
+    """
+    Запускает Firefox под управлением Selenium.
+    Args:
+        profile(str): Каталог профиля Firefox (с выполненным входом в Дзен).
+        headless(bool): Запускать без окна.
+    Returns:
+        webdriver.Firefox: Браузер.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.firefox.options import Options
+    from selenium.webdriver.firefox.service import Service
+
+    options = Options()
+    if headless:
+        options.add_argument("-headless")
+    if profile:
+        options.add_argument("-profile")
+        options.add_argument(profile)
+    driver = webdriver.Firefox(service=Service(_geckodriver_path()), options=options)
+    driver.set_page_load_timeout(PAGE_TIMEOUT)
+    return driver
+
+
+class BrowserPool:
+    """
+    Пул браузеров одного канала. Браузеры создаются по мере надобности, не
+    больше size, и переиспользуются между публикациями; браузер, на котором
+    публикация завершилась ошибкой, закрывается.
+    """
+
+    def __init__(self, factory: Callable, size=POOL_SIZE):
+        """
+        Args:
+            factory(Callable): Функция без аргументов, создающая браузер.
+            size(int): Максимальное количество браузеров.
+        """
+        self.factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def session(self):
+        """Выдает свободный браузер на время публикации."""
+        with self._slots:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self.factory()
+            try:
+                yield driver
+            except Exception:
+                self._quit(driver)
+                raise
+            self._idle.put(driver)
+
+    @staticmethod
+    def _quit(driver) -> None:
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Ошибка при закрытии браузера: {e}")
+
+    def close(self) -> None:
+        """Закрывает все свободные браузеры."""
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+def split_title(text: str) -> tuple[str, str]:
+    """
+    Делит статью на заголовок (первая строка или предложение) и текст.
+    Returns:
+        tuple[str, str]: Заголовок и текст статьи.
+    """
+    text = text.strip()
+    line_end = text.find("\n")
+    sentence_end = min((index for index in (text.find(". "), text.find("! "), text.find("? "))
+                        if index >= 0), default=-1)
+    ends = [index for index in (line_end, sentence_end + 1 if sentence_end >= 0 else -1)
+            if 0 < index <= TITLE_MAX_CHARS]
+    if not ends:
+        return text[:TITLE_MAX_CHARS].rsplit(" ", 1)[0], text
+    end = min(ends)
+    return text[:end].strip().rstrip("."), text[end:].strip()
+
+
+def publish_article(driver, channel_url: str, text: str) -> str:
+    """
+    Публикует статью в канале через редактор Дзена.
+    Args:
+        driver: Браузер с выполненным входом в аккаунт канала.
+        channel_url(str): Адрес канала.
+        text(str): Текст статьи (первая строка или предложение - заголовок).
+    Returns:
+        str: Адрес опубликованной статьи.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    def click(name: str):
+        WebDriverWait(driver, PAGE_TIMEOUT).until(
+            expected_conditions.element_to_be_clickable((By.CSS_SELECTOR, SELECTORS[name]))).click()
+
+    def type_into(name: str, value: str):
+        element = WebDriverWait(driver, PAGE_TIMEOUT).until(
+            expected_conditions.presence_of_element_located((By.CSS_SELECTOR, SELECTORS[name])))
+        element.click()
+        element.send_keys(value)
+
+    title, body = split_title(text)
+    driver.get(channel_url)
+    click("create")
+    click("article")
+    type_into("title", title)
+    type_into("body", body)
+    click("publish")
+    click("confirm")
+    WebDriverWait(driver, PAGE_TIMEOUT).until(lambda d: "/a/" in d.current_url)
+    return driver.current_url
+
+
+def release_stale(db_name="harvester_data.db") -> int:
+    """
+    Возвращает в очередь публикации, брошенные в статусе publishing.
+    Returns:
+        int: Количество возвращенных публикаций.
+    """
+    publishing = get_status_id(STATUS_PUBLISHING, db_name)
+    pending = get_status_id(STATUS_PENDING, db_name)
+    with transaction(db_name, immediate=True) as conn:
+        cursor = conn.execute("UPDATE publications SET status_id = ?, updated_at = ? "
+                              "WHERE status_id = ? AND (updated_at IS NULL OR updated_at < ?)",
+                              (pending, _timestamp(), publishing,
+                               _timestamp(_now() - STALE_AFTER)))
+    return cursor.rowcount
+
+
+def pending_channels(db_name="harvester_data.db") -> list[tuple[int, str]]:
+    """Возвращает каналы (id, url), у которых есть публикации в очереди."""
+    pending = get_status_id(STATUS_PENDING, db_name)
+    with transaction(db_name) as conn:
+        return conn.execute("""
+            SELECT DISTINCT c.id, c.url FROM publications p
+            JOIN channels c ON c.id = p.channel_id
+            WHERE (p.status_id IS NULL OR p.status_id = ?)
+              AND (p.publish_date IS NULL OR p.publish_date <= ?)
+              AND (p.attempts = 0 OR p.updated_at <= ?)
+            ORDER BY c.id
+            """, (pending, _timestamp(), _timestamp(_now() - RETRY_DELAY))).fetchall()
+
+
+def claim_publication(channel_id: int,
+                      db_name="harvester_data.db") -> Optional[PendingPublication]:
+    """
+    Забирает из очереди следующую публикацию канала, переводя ее в статус
+    publishing (одной транзакцией, поэтому одну публикацию не заберут двое).
+    Публикации без статуса считаются ожидающими, публикации с publish_date
+    в будущем и неудачные публикации до истечения RETRY_DELAY пропускаются.
+    Args:
+        channel_id(int): ID канала.
+        db_name(str): Имя БД.
+    Returns:
+        Optional[PendingPublication]: Публикация или None, если очередь пуста.
+    """
+    pending = get_status_id(STATUS_PENDING, db_name)
+    publishing = get_status_id(STATUS_PUBLISHING, db_name)
+    with transaction(db_name, immediate=True) as conn:
+        row = conn.execute("""
+            SELECT p.id, p.rewrite_id, p.channel_id, c.url, r.rewrite_text
+            FROM publications p
+            JOIN channels c ON c.id = p.channel_id
+            JOIN rewrites r ON r.id = p.rewrite_id
+            WHERE p.channel_id = ? AND (p.status_id IS NULL OR p.status_id = ?)
+              AND (p.publish_date IS NULL OR p.publish_date <= ?)
+              AND (p.attempts = 0 OR p.updated_at <= ?)
+            ORDER BY p.publish_date, p.id
+            LIMIT 1
+            """, (channel_id, pending, _timestamp(), _timestamp(_now() - RETRY_DELAY))).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE publications SET status_id = ?, updated_at = ? WHERE id = ?",
+                     (publishing, _timestamp(), row[0]))
+    return PendingPublication(row[0], row[1], row[2], row[3], decompress_text(row[4]) or "")
+
+
+def finish_publication(publication_id: int, published_url: Optional[str],
+                       db_name="harvester_data.db") -> None:
+    """
+    Записывает результат публикации: статус published и адрес статьи. Если
+    published_url не задан, публикация возвращается в очередь для повтора
+    через RETRY_DELAY, а после MAX_ATTEMPTS неудач получает статус failed.
+    """
+    now = _timestamp()
+    if published_url:
+        with transaction(db_name) as conn:
+            conn.execute("UPDATE publications SET status_id = ?, published_url = ?, "
+                         "publish_date = COALESCE(publish_date, ?), updated_at = ? WHERE id = ?",
+                         (get_status_id(STATUS_PUBLISHED, db_name), published_url, now, now,
+                          publication_id))
+        return
+    pending = get_status_id(STATUS_PENDING, db_name)
+    failed = get_status_id(STATUS_FAILED, db_name)
+    with transaction(db_name) as conn:
+        conn.execute("UPDATE publications SET attempts = attempts + 1, "
+                     "status_id = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END, "
+                     "updated_at = ? WHERE id = ?",
+                     (MAX_ATTEMPTS, failed, pending, now, publication_id))
+
+
+def retry_failed(db_name="harvester_data.db") -> int:
+    """
+    Возвращает в очередь публикации со статусом failed.
+    Returns:
+        int: Количество возвращенных публикаций.
+    """
+    failed = get_status_id(STATUS_FAILED, db_name)
+    pending = get_status_id(STATUS_PENDING, db_name)
+    with transaction(db_name, immediate=True) as conn:
+        cursor = conn.execute("UPDATE publications SET status_id = ?, attempts = 0, updated_at = ? "
+                              "WHERE status_id = ?", (pending, _timestamp(), failed))
+    return cursor.rowcount
+
+
+def publish_channel(channel_id: int, pool: BrowserPool, publish: Callable = publish_article,
+                    db_name="harvester_data.db") -> dict[str, int]:
+    """
+    Публикует очередь одного канала: pool.size потоков забирают публикации,
+    пока очередь канала не опустеет.
+    Returns:
+        dict[str, int]: Количество опубликованных и неудачных публикаций.
+    """
+    counts = {STATUS_PUBLISHED: 0, STATUS_FAILED: 0}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                publication = claim_publication(channel_id, db_name)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка очереди публикаций канала {channel_id}: {e}")
+                return
+            if publication is None:
+                return
+            url = None
+            try:
+                with pool.session() as driver:
+                    url = publish(driver, publication.channel_url, publication.text)
+                logger.info(f"Публикация {publication.id} опубликована: {url}")
+            except Exception as e:
+                logger.error(f"Ошибка публикации {publication.id} в канале {channel_id}: {e}")
+            finish_publication(publication.id, url, db_name)
+            with lock:
+                counts[STATUS_PUBLISHED if url else STATUS_FAILED] += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, pool.size)) as executor:
+        futures = [executor.submit(worker) for _ in range(max(1, pool.size))]
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            # Незавершенную публикацию вернет в очередь release_stale.
+            logger.error(f"Поток публикации канала {channel_id} остановлен ошибкой: {e}")
+    return counts
+
+
+class Publisher:
+    """
+    Публикует очередь из таблицы publications, сохраняя пулы браузеров
+    каналов между запусками run(), поэтому при периодической публикации
+    браузеры не запускаются заново. Браузеры закрываются методом close().
+    """
+
+    def __init__(self, db_name="harvester_data.db", publish: Callable = publish_article,
+                 factory: Optional[Callable] = None, pool_size=POOL_SIZE,
+                 max_channels=MAX_CHANNELS, profile_root: Optional[str] = None,
+                 headless=True):
+        """
+        Args:
+            db_name(str): Имя БД.
+            publish(Callable): Функция (driver, channel_url, text) -> url.
+            factory(Callable): Функция (channel_id) -> браузер; по умолчанию
+            create_driver с профилем profile_root/<channel_id>.
+            pool_size(int): Количество браузеров на канал.
+            max_channels(int): Количество каналов, публикуемых одновременно.
+            profile_root(str): Каталог с профилями Firefox по id каналов.
+            headless(bool): Запускать браузеры без окна.
+        """
+        if factory is None:
+            def factory(channel_id: int):
+                profile = f"{profile_root}/{channel_id}" if profile_root else None
+                return create_driver(profile, headless=headless)
+
+        self.db_name = db_name
+        self.publish = publish
+        self.factory = factory
+        self.pool_size = pool_size
+        self.max_channels = max_channels
+        self._pools: dict[int, BrowserPool] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, channel_id: int) -> BrowserPool:
+        with self._lock:
+            pool = self._pools.get(channel_id)
+            if pool is None:
+                pool = BrowserPool(lambda: self.factory(channel_id), self.pool_size)
+                self._pools[channel_id] = pool
+            return pool
+
+    def run(self) -> dict[str, int]:
+        """
+        Публикует все ожидающие публикации. Каналы публикуются параллельно
+        (не больше max_channels одновременно), у каждого канала свой пул из
+        pool_size браузеров. Браузеры запускаются только при наличии
+        публикаций.
+        Returns:
+            dict[str, int]: Количество опубликованных и неудачных публикаций.
+        """
+        released = release_stale(self.db_name)
+        if released:
+            logger.warning(f"Возвращено в очередь брошенных публикаций: {released}.")
+        channels = pending_channels(self.db_name)
+        totals = {STATUS_PUBLISHED: 0, STATUS_FAILED: 0}
+        if not channels:
+            logger.info("Очередь публикаций пуста.")
+            return totals
+
+        def run(channel_id: int) -> dict[str, int]:
+            return publish_channel(channel_id, self._pool(channel_id), self.publish,
+                                   self.db_name)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_channels, len(channels)))) \
+                as executor:
+            for counts in executor.map(run, (channel_id for channel_id, _ in channels)):
+                for status, count in counts.items():
+                    totals[status] += count
+        logger.info(f"Публикация завершена: {totals}.")
+        return totals
+
+    def close(self) -> None:
+        """Закрывает браузеры всех каналов."""
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+
+def publish_pending(db_name="harvester_data.db", publish: Callable = publish_article,
+                    factory: Optional[Callable] = None, pool_size=POOL_SIZE,
+                    max_channels=MAX_CHANNELS, profile_root: Optional[str] = None,
+                    headless=True) -> dict[str, int]:
+    """
+    Публикует все ожидающие публикации из таблицы publications одним
+    запуском Publisher и закрывает браузеры по завершении. Параметры - как
+    у Publisher.
+    Returns:
+        dict[str, int]: Количество опубликованных и неудачных публикаций.
+    """
+    publisher = Publisher(db_name, publish, factory, pool_size, max_channels, profile_root,
+                          headless)
+    try:
+        return publisher.run()
+    finally:
+        publisher.close()
@@ -0,0 +1,321 @@
+import io
+import json
+import time
+import sqlite3
+import logging
+
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple, Optional
+from openai import OpenAI
+from prompts import PROMPT_REWRITE
+from database.codec import decompress_text
+from database.connection import transaction
+from database.database import insert_many
+from database.db_models import Rewrite
+from database.rewrite_progress import existing_rewrite
+from rewrite.chatgpt_rewrite import MODEL, SYSTEM_PROMPT, get_client, plan
+from rewrite.planner import ContextOverflowError
+
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# Ограничение Batch API на количество запросов в одном файле.
+MAX_BATCH_REQUESTS = 50000
+POLL_INTERVAL = 60
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+# Пакеты, результаты которых уже не будут получены.
+DEAD_STATUSES = ("failed", "expired", "cancelled")
+
+
+class PendingTranslate(NamedTuple):
+    translate_id: int
+    text: str
+    language_id: Optional[int]
+    topic_id: Optional[int]
+
+
+class BatchReport(NamedTuple):
+    batch_id: str
+    status: str
+    requests: int
+    rewrites: int
+    errors: int
+    # Переводы, рерайт которых уже получен другим путем после отправки пакета.
+    skipped: int = 0
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def custom_id(translate_id: int) -> str:
+    return f"translate-{translate_id}"
+
+
+def _ensure_tables(db_name: str) -> None:
+    with transaction(db_name) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rewrite_batches (
+                batch_id TEXT PRIMARY KEY,
+                input_file_id TEXT,
+                output_file_id TEXT,
+                status TEXT NOT NULL,
+                ingested INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rewrite_batch_items (
+                translate_id INTEGER PRIMARY KEY,
+                batch_id TEXT NOT NULL,
+                FOREIGN KEY (translate_id) REFERENCES translates(id),
+                FOREIGN KEY (batch_id) REFERENCES rewrite_batches(batch_id)
+            );
+            """)
+
+
+def pending_translates(db_name="harvester_data.db",
+                       limit: Optional[int] = None) -> list[PendingTranslate]:
+    """
+    Возвращает переводы без рерайта, которые не ждут результата в уже
+    отправленном пакете.
+    Args:
+        db_name(str): Имя БД.
+        limit(int): Максимальное количество переводов; None - все.
+    Returns:
+        list[PendingTranslate]: Переводы в порядке id.
+    """
+    _ensure_tables(db_name)
+    with transaction(db_name) as conn:
+        rows = conn.execute("""
+            SELECT t.id, t.translated_text, t.language_id, o.topic_id
+            FROM translates t
+            LEFT JOIN original_texts o ON o.id = t.text_id
+            WHERE t.translated_text IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM rewrites r WHERE r.translate_id = t.id)
+              AND NOT EXISTS (
+                  SELECT 1 FROM rewrite_batch_items i
+                  JOIN rewrite_batches b ON b.batch_id = i.batch_id
+                  WHERE i.translate_id = t.id AND b.ingested = 0
+                    AND b.status NOT IN (?, ?, ?))
+            ORDER BY t.id
+            LIMIT ?
+            """, (*DEAD_STATUSES, -1 if limit is None else limit)).fetchall()
+    return [PendingTranslate(row[0], decompress_text(row[1]), row[2], row[3]) for row in rows]
+
+
+def _fits_context(item: PendingTranslate, prompt: str) -> bool:
+    """
+    Проверяет, что перевод помещается в контекст модели одним запросом.
+    Не поместившиеся переводы в пакет не отправляются, их переписывает
+    онлайн-конвейер по секциям.
+    """
+    try:
+        plan(item.text, prompt)
+    except ContextOverflowError as e:
+        logger.error(f"Перевод {item.translate_id} не отправлен в пакет: {e}")
+        return False
+    return True
+
+
+def build_batch_file(items: Iterable[PendingTranslate], prompt=PROMPT_REWRITE,
+                     temperature=0.7) -> bytes:
+    """
+    Формирует JSONL-файл запросов Batch API: по одному запросу
+    chat.completions на перевод, max_tokens выбирается планировщиком.
+    Args:
+        items(Iterable[PendingTranslate]): Переводы.
+        prompt(str): Промпт для рерайта.
+        temperature(float): Температура генерации.
+    Returns:
+        bytes: Содержимое файла в UTF-8.
+    """
+    lines = []
+    for item in items:
+        body = {
+            "model": MODEL,
+            "messages": [{"role": "system", "content": SYSTEM_PROMPT},
+                         {"role": "user", "content": prompt.format(text=item.text)}],
+            "max_tokens": plan(item.text, prompt).max_tokens,
+            "temperature": temperature,
+        }
+        lines.append(json.dumps({"custom_id": custom_id(item.translate_id), "method": "POST",
+                                 "url": ENDPOINT, "body": body}, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def submit_batch(items: list[PendingTranslate], db_name="harvester_data.db",
+                 client: Optional[OpenAI] = None, prompt=PROMPT_REWRITE,
+                 temperature=0.7) -> str:
+    """
+    Загружает файл запросов, создает пакет и запоминает его переводы, чтобы
+    не отправить их повторно.
+    Args:
+        items(list[PendingTranslate]): Переводы (не более MAX_BATCH_REQUESTS).
+        db_name(str): Имя БД.
+        client(OpenAI): Клиент; по умолчанию общий клиент get_client().
+        prompt(str): Промпт для рерайта.
+        temperature(float): Температура генерации.
+    Returns:
+        str: ID пакета.
+    """
+    if len(items) > MAX_BATCH_REQUESTS:
+        raise ValueError(f"В пакете не может быть больше {MAX_BATCH_REQUESTS} запросов.")
+    client = client or get_client()
+    content = build_batch_file(items, prompt, temperature)
+    input_file = client.files.create(file=("rewrites.jsonl", io.BytesIO(content)), purpose="batch")
+    batch = client.batches.create(input_file_id=input_file.id, endpoint=ENDPOINT,
+                                  completion_window=COMPLETION_WINDOW)
+    now = _now()
+    _ensure_tables(db_name)
+    with transaction(db_name) as conn:
+        conn.execute("INSERT INTO rewrite_batches (batch_id, input_file_id, status, created_at, "
+                     "updated_at) VALUES (?, ?, ?, ?, ?)",
+                     (batch.id, input_file.id, batch.status, now, now))
+        conn.executemany("INSERT OR REPLACE INTO rewrite_batch_items (translate_id, batch_id) "
+                         "VALUES (?, ?)", ((item.translate_id, batch.id) for item in items))
+    logger.info(f"Пакет {batch.id} отправлен: {len(items)} запросов, {len(content)} байт.")
+    return batch.id
+
+
+def wait_batch(batch_id: str, db_name="harvester_data.db", client: Optional[OpenAI] = None,
+               poll_interval=POLL_INTERVAL, timeout: Optional[float] = None):
+    """
+    Ожидает завершения пакета, сохраняя его статус в БД.
+    Args:
+        batch_id(str): ID пакета.
+        db_name(str): Имя БД.
+        client(OpenAI): Клиент.
+        poll_interval(float): Интервал опроса в секундах.
+        timeout(float): Максимальное время ожидания; None - без ограничения.
+    Returns:
+        Batch: Пакет в последнем полученном состоянии.
+    """
+    client = client or get_client()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        with transaction(db_name) as conn:
+            conn.execute("UPDATE rewrite_batches SET status = ?, output_file_id = ?, updated_at = ? "
+                         "WHERE batch_id = ?", (batch.status, batch.output_file_id, _now(), batch_id))
+        if batch.status in FINAL_STATUSES:
+            return batch
+        if deadline is not None and time.monotonic() >= deadline:
+            logger.info(f"Пакет {batch_id} еще выполняется: {batch.status}.")
+            return batch
+        time.sleep(poll_interval)
+
+
+def ingest_batch(batch, db_name="harvester_data.db", client: Optional[OpenAI] = None) -> BatchReport:
+    """
+    Загружает результаты завершенного пакета в таблицу rewrites одной
+    транзакцией. Переводы, для которых после отправки пакета уже готов
+    рерайт (онлайн или потоковый), пропускаются, чтобы статья не появилась
+    дважды.
+    Args:
+        batch(Batch): Завершенный пакет (см. wait_batch).
+        db_name(str): Имя БД.
+        client(OpenAI): Клиент.
+    Returns:
+        BatchReport: Количество запросов, сохраненных рерайтов, ошибок и
+        пропущенных переводов.
+    Raises:
+        sqlite3.Error: Если результаты не удалось сохранить.
+    """
+    client = client or get_client()
+    with transaction(db_name) as conn:
+        items = dict(conn.execute("SELECT translate_id, batch_id FROM rewrite_batch_items "
+                                  "WHERE batch_id = ?", (batch.id,)).fetchall())
+        meta = {row[0]: (row[1], row[2]) for row in conn.execute(f"""
+            SELECT t.id, t.language_id, o.topic_id FROM translates t
+            LEFT JOIN original_texts o ON o.id = t.text_id
+            WHERE t.id IN ({",".join("?" * len(items))})
+            """, list(items)).fetchall()} if items else {}
+
+    records = []
+    errors = 0
+    if batch.output_file_id:
+        now = _now()
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            translate_id = int(result["custom_id"].rsplit("-", 1)[1])
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                errors += 1
+                logger.warning(f"Перевод {translate_id}: ошибка в пакете {batch.id}: "
+                               f"{result.get('error') or response.get('status_code')}")
+                continue
+            content = response["body"]["choices"][0]["message"]["content"] or ""
+            # Очистка как в gpt_rewrite.
+            text = content.strip().replace('.\n', '. ').replace('\n', '')
+            language_id, topic_id = meta.get(translate_id, (None, None))
+            records.append(Rewrite(text, language_id, translate_id, topic_id, now, now))
+
+    # Рерайты и отметка о загрузке фиксируются вместе: при ошибке пакет
+    # останется незагруженным и будет целиком загружен при следующем запуске.
+    # Готовые рерайты проверяются в той же транзакции, что и запись.
+    with transaction(db_name, immediate=True) as conn:
+        fresh = [record for record in records
+                 if existing_rewrite(conn, record.translate_id) is None]
+        if fresh and len(insert_many(fresh, db_name=db_name)) != len(fresh):
+            raise sqlite3.Error(f"Не удалось сохранить результаты пакета {batch.id}.")
+        conn.execute("UPDATE rewrite_batches SET ingested = 1, updated_at = ? WHERE batch_id = ?",
+                     (_now(), batch.id))
+    failed = (batch.request_counts.failed if batch.request_counts else 0) or 0
+    report = BatchReport(batch.id, batch.status, len(items), len(fresh), errors + failed,
+                         len(records) - len(fresh))
+    logger.info(f"Пакет {batch.id}: {report.rewrites} рерайтов сохранено, ошибок {report.errors}, "
+                f"пропущено готовых {report.skipped}.")
+    return report
+
+
+def unfinished_batches(db_name="harvester_data.db") -> list[str]:
+    """Возвращает ID отправленных пакетов, результаты которых еще не загружены."""
+    _ensure_tables(db_name)
+    with transaction(db_name) as conn:
+        rows = conn.execute("SELECT batch_id FROM rewrite_batches WHERE ingested = 0 "
+                            "AND status NOT IN (?, ?, ?) ORDER BY created_at",
+                            DEAD_STATUSES).fetchall()
+    return [row[0] for row in rows]
+
+
+def run_batch_rewrite(db_name="harvester_data.db", client: Optional[OpenAI] = None,
+                      limit: Optional[int] = None, prompt=PROMPT_REWRITE,
+                      poll_interval=POLL_INTERVAL, timeout: Optional[float] = None
+                      ) -> list[BatchReport]:
+    """
+    Делает рерайт всех ожидающих переводов через Batch API: формирует
+    пакеты, отправляет, ожидает и сохраняет результаты в rewrites.
+    Сначала дожидаются пакеты, отправленные прошлыми запусками. Переводы с
+    ошибками остаются ожидающими и попадут в следующий запуск.
+    Args:
+        db_name(str): Имя БД.
+        client(OpenAI): Клиент (например, с base_url тестового сервера).
+        limit(int): Максимальное количество переводов; None - все.
+        prompt(str): Промпт для рерайта.
+        poll_interval(float): Интервал опроса в секундах.
+        timeout(float): Максимальное время ожидания каждого пакета.
+    Returns:
+        list[BatchReport]: Отчеты по завершенным пакетам.
+    """
+    client = client or get_client()
+    batch_ids = unfinished_batches(db_name)
+    if batch_ids:
+        logger.info(f"Продолжается ожидание пакетов: {', '.join(batch_ids)}.")
+    items = [item for item in pending_translates(db_name, limit) if _fits_context(item, prompt)]
+    if not items and not batch_ids:
+        logger.info("Нет переводов, ожидающих рерайта.")
+        return []
+    batch_ids += [submit_batch(items[start:start + MAX_BATCH_REQUESTS], db_name, client, prompt)
+                  for start in range(0, len(items), MAX_BATCH_REQUESTS)]
+    reports = []
+    for batch_id in batch_ids:
+        batch = wait_batch(batch_id, db_name, client, poll_interval, timeout)
+        if batch.status in FINAL_STATUSES:
+            reports.append(ingest_batch(batch, db_name, client))
+    return reports
@@ -0,0 +1,105 @@
+import json
+import sqlite3
+import hashlib
+import logging
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from database.connection import transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+def rewrite_key(model: str, system_prompt: str, prompt: str, text: str,
+                temperature: float, max_tokens: int) -> str:
+    """
+    Вычисляет ключ результата рерайта по всем параметрам запроса.
+    Returns:
+        str: sha256 от модели, системного промпта, шаблона промпта, текста,
+        temperature и max_tokens.
+    """
+    payload = json.dumps([model, system_prompt, prompt, text, temperature, max_tokens],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class RewriteCache:
+    """
+    Постоянный кэш результатов gpt_rewrite в таблице rewrite_cache.
+    Записи старше ttl_days не используются и удаляются, при превышении
+    max_entries удаляются самые старые записи.
+    """
+
+    def __init__(self, db_name="harvester_data.db", ttl_days=30, max_entries=10000):
+        """
+        Args:
+            db_name(str): Имя файла базы данных.
+            ttl_days(int): Время жизни записи в днях.
+            max_entries(int): Максимальное количество записей.
+        """
+        self.db_name = db_name
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+        try:
+            with transaction(db_name) as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS rewrite_cache (
+                        key TEXT PRIMARY KEY,
+                        result TEXT NOT NULL,
+                        created_at TEXT NOT NULL
+                    );
+                    """)
+                conn.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_rewrite_cache_created
+                    ON rewrite_cache (created_at);
+                    """)
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка инициализации кэша рерайтов: {e}")
+
+    def _cutoff(self) -> str:
+        return (_now() - timedelta(days=self.ttl_days)).isoformat(timespec="seconds")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает сохраненный результат рерайта.
+        Args:
+            key(str): Ключ, вычисленный rewrite_key.
+        Returns:
+            Optional[str]: Результат или None, если его нет или он устарел.
+        """
+        try:
+            with transaction(self.db_name) as conn:
+                row = conn.execute(
+                    "SELECT result FROM rewrite_cache WHERE key = ? AND created_at >= ?",
+                    (key, self._cutoff())).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения кэша рерайтов: {e}")
+            return None
+        return row[0] if row else None
+
+    def set(self, key: str, result: str) -> None:
+        """
+        Сохраняет результат рерайта и удаляет лишние записи.
+        Args:
+            key(str): Ключ, вычисленный rewrite_key.
+            result(str): Результат рерайта.
+        """
+        try:
+            with transaction(self.db_name) as conn:
+                conn.execute("INSERT OR REPLACE INTO rewrite_cache (key, result, created_at) "
+                             "VALUES (?, ?, ?)",
+                             (key, result, _now().isoformat(timespec="seconds")))
+                conn.execute("DELETE FROM rewrite_cache WHERE created_at < ?", (self._cutoff(),))
+                conn.execute("""
+                    DELETE FROM rewrite_cache WHERE key IN (
+                        SELECT key FROM rewrite_cache
+                        ORDER BY created_at DESC
+                        LIMIT -1 OFFSET ?)
+                    """, (self.max_entries,))
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи в кэш рерайтов: {e}")
@@ -1,9 +1,89 @@
 import os
+import logging
+import threading
 
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+from openai import OpenAI, RateLimitError
+from prompts import PROMPT_MERGE, PROMPT_CONTINUE
+from database.rewrite_progress import start_rewrite, find_partial_rewrite, save_rewrite_progress
+from rewrite.cache import RewriteCache, rewrite_key
+from utils.rate_limit import get_limiter
+from utils.utils import iter_segments, estimate_tokens
+from rewrite.planner import RewritePlan, plan_rewrite
 
 
-def gpt_rewrite(text: str, prompt: str, temperature=0.7, max_tokens=1500) -> str:
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-4o-mini"  # Или другой доступный движок GPT
+SYSTEM_PROMPT = ("Ты David Ogilvy,занимаешься качественным "
+                 "копирайтом текста. Профессионал своего дела.")
+# Размер секции длинного текста (в токенах) и количество параллельных вызовов.
+SECTION_TOKENS = 3000
+MAX_WORKERS = 4
+# Потоковый рерайт сохраняется в БД после каждых STREAM_FLUSH_CHARS символов.
+STREAM_FLUSH_CHARS = 500
+# Максимальный размер ответа модели в токенах.
+MAX_OUTPUT_TOKENS = 16384
+
+_client: Optional[OpenAI] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenAI:
+    """
+    Возвращает общий клиент OpenAI (создается при первом вызове).
+    Returns:
+        OpenAI: Клиент с пулом соединений, общий для всех потоков.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"),)
+        return _client
+
+
+def plan(text: str, prompt: str, section_tokens: Optional[int] = None,
+         max_workers=1) -> RewritePlan:
+    """
+    Планирует рерайт текста текущей моделью (см. rewrite.planner.plan_rewrite).
+    Args:
+        text(str): Текст для рерайта.
+        prompt(str): Промпт для рерайта.
+        section_tokens(int): Размер секции; None - один запрос.
+        max_workers(int): Количество одновременных вызовов.
+    Returns:
+        RewritePlan: Токены, max_tokens, стоимость и время рерайта.
+    """
+    return plan_rewrite(text, MODEL, SYSTEM_PROMPT, prompt, section_tokens=section_tokens,
+                        max_workers=max_workers)
+
+
+def _create_completion(messages: list[dict], max_tokens: int, temperature: float,
+                       stream=False):
+    """
+    Вызывает chat.completions.create через общий ограничитель скорости
+    OpenAI (стоимость - оценка токенов запроса и ответа).
+    """
+    limiter = get_limiter("openai")
+    limiter.acquire(sum(estimate_tokens(message["content"]) for message in messages) + max_tokens)
+    try:
+        response = get_client().chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=stream
+        )
+    except RateLimitError:
+        limiter.on_throttle()
+        raise
+    limiter.on_success()
+    return response
+
+
+def gpt_rewrite(text: str, prompt: str, temperature=0.7, max_tokens=1500,
+                cache: Optional[RewriteCache] = None, bypass_cache=False) -> str:
     """
     Делает рерайт текста с помощью chatgpt.
     Args:
@@ -13,27 +93,174 @@ def gpt_rewrite(text: str, prompt: str, temperature=0.7, max_tokens=1500) -> str
         более креативным будет ответ. По умолчанию значение 0.7.
         max_tokens(int): Максимальное количество токенов chatgpt, по умолчанию
         1500 штук.
+        cache(RewriteCache): Кэш результатов, по умолчанию не используется.
+        bypass_cache(bool): Не читать результат из кэша (новый результат
+        все равно будет сохранен).
     Returns:
         str: Измененный с помощью рерайта текст.
     Raises:
     """
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"),)
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",  # Или другой доступный движок GPT
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "Ты David Ogilvy,занимаешься качественным "
-                    "копирайтом текста. Профессионал своего дела.")
-             },
-            {
-                 "role": "user",
-                 "content": prompt.format(text=text)
-             }
-        ],
-        max_tokens=max_tokens,
-        temperature=temperature
-    )
-
-    return response.choices[0].message.content.strip().replace('.\n', '. ').replace('\n', '')
+    key = None
+    if cache is not None:
+        key = rewrite_key(MODEL, SYSTEM_PROMPT, prompt, text, temperature, max_tokens)
+        if not bypass_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                logger.info("Результат рерайта получен из кэша.")
+                return cached
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt.format(text=text)},
+    ]
+    response = _create_completion(messages, max_tokens, temperature)
+
+    result = response.choices[0].message.content.strip().replace('.\n', '. ').replace('\n', '')
+    if cache is not None:
+        cache.set(key, result)
+    return result
+
+
+def gpt_rewrite_long(text: str, prompt: str, temperature=0.7, max_tokens: Optional[int] = None,
+                     section_tokens=SECTION_TOKENS, max_workers=MAX_WORKERS,
+                     merge=False, cache: Optional[RewriteCache] = None,
+                     bypass_cache=False) -> str:
+    """
+    Делает рерайт длинного текста по секциям.
+    Текст делится по границам предложений на секции не длиннее
+    section_tokens токенов, секции переписываются параллельно (не более
+    max_workers вызовов одновременно) и склеиваются в исходном порядке.
+    Короткий текст переписывается одним вызовом gpt_rewrite.
+    Args:
+        text(str): Текст для рерайта.
+        prompt(str): Промпт для рерайта.
+        temperature(float): Температура генерации.
+        max_tokens(int): Максимальное количество токенов ответа на секцию;
+        None - выбирается планировщиком по длине секций.
+        section_tokens(int): Максимальный размер секции в токенах.
+        max_workers(int): Количество одновременных вызовов chatgpt.
+        merge(bool): Сгладить переходы между секциями дополнительным вызовом.
+        cache(RewriteCache): Кэш результатов (используется для каждой секции).
+        bypass_cache(bool): Не читать результаты из кэша.
+    Returns:
+        str: Измененный с помощью рерайта текст.
+    """
+    if max_tokens is None:
+        max_tokens = plan(text, prompt, section_tokens, max_workers).max_tokens
+    sections = [segment.text for segment in iter_segments(text, section_tokens, unit="tokens")]
+    if len(sections) <= 1:
+        return gpt_rewrite(text, prompt, temperature=temperature, max_tokens=max_tokens,
+                           cache=cache, bypass_cache=bypass_cache)
+
+    logger.info(f"Текст разделен на {len(sections)} секций для рерайта.")
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sections)))) as executor:
+        results = list(executor.map(
+            lambda section: gpt_rewrite(section, prompt, temperature=temperature,
+                                        max_tokens=max_tokens, cache=cache,
+                                        bypass_cache=bypass_cache),
+            sections))
+    article = ' '.join(results)
+
+    if merge:
+        logger.info("Сглаживание переходов между секциями.")
+        article = gpt_rewrite(article, PROMPT_MERGE, temperature=temperature,
+                              max_tokens=min(MAX_OUTPUT_TOKENS, estimate_tokens(article) * 2),
+                              cache=cache,
+                              bypass_cache=bypass_cache)
+    return article
+
+
+def clean_stream(chunks: Iterable[str], strip_start=True) -> Iterator[str]:
+    """
+    Потоковый аналог очистки ответа в gpt_rewrite: убирает пробельные
+    символы в начале и в конце, заменяет '.\n' на '. ' и удаляет остальные
+    переводы строк. Пробельные символы придерживаются, пока не станет
+    понятно, что они не в конце текста.
+    Args:
+        chunks(Iterable[str]): Части ответа модели.
+        strip_start(bool): Убирать пробельные символы в начале (False - для
+        продолжения уже полученного текста).
+    Yields:
+        str: Очищенные части текста.
+    """
+    previous = ''
+    pending = []
+    started = not strip_start
+    for chunk in chunks:
+        output = []
+        for char in chunk:
+            if char.isspace():
+                if started:
+                    if char == '\n':
+                        pending.append(' ' if previous == '.' else '')
+                    else:
+                        pending.append(char)
+            else:
+                started = True
+                output.extend(pending)
+                pending.clear()
+                output.append(char)
+            previous = char
+        if output:
+            yield ''.join(output)
+
+
+def gpt_rewrite_stream(text: str, prompt: str, temperature=0.7,
+                       max_tokens: Optional[int] = None,
+                       translate_id: Optional[int] = None, language_id: Optional[int] = None,
+                       topic_id: Optional[int] = None,
+                       db_name="harvester_data.db") -> Iterator[str]:
+    """
+    Делает рерайт текста с помощью chatgpt, отдавая текст по мере генерации.
+    Если задан translate_id, текст по мере получения сохраняется в таблицу
+    rewrites, а незавершенный ранее рерайт этого перевода продолжается с
+    места обрыва: сначала отдается уже сохраненный текст, затем модель
+    дописывает продолжение.
+    Args:
+        text(str): Текст для рерайта.
+        prompt(str): Промпт для рерайта.
+        temperature(float): Температура генерации.
+        max_tokens(int): Максимальное количество токенов ответа; None -
+        выбирается планировщиком по длине текста.
+        translate_id(int): ID перевода в БД, по умолчанию текст не сохраняется.
+        language_id(int): ID языка рерайта.
+        topic_id(int): ID темы.
+        db_name(str): Имя БД.
+    Yields:
+        str: Очищенные части текста рерайта.
+    """
+    if max_tokens is None:
+        max_tokens = plan(text, prompt).max_tokens
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt.format(text=text)},
+    ]
+
+    rewrite_id = None
+    received = ''
+    if translate_id is not None:
+        partial = find_partial_rewrite(translate_id, db_name=db_name)
+        if partial:
+            rewrite_id, received = partial
+            logger.info(f"Продолжается прерванный рерайт {rewrite_id}, "
+                        f"уже получено {len(received)} символов.")
+            messages.append({"role": "assistant", "content": received})
+            messages.append({"role": "user", "content": PROMPT_CONTINUE})
+            yield received
+        else:
+            rewrite_id = start_rewrite(translate_id, language_id, topic_id, db_name=db_name)
+
+    response = _create_completion(messages, max_tokens, temperature, stream=True)
+    deltas = (chunk.choices[0].delta.content or '' for chunk in response if chunk.choices)
+
+    saved_len = len(received)
+    # Продолжение может начинаться с пробела, отделяющего его от сохраненного текста.
+    for part in clean_stream(deltas, strip_start=not received):
+        received += part
+        yield part
+        if rewrite_id is not None and len(received) - saved_len >= STREAM_FLUSH_CHARS:
+            save_rewrite_progress(rewrite_id, received, db_name=db_name)
+            saved_len = len(received)
+
+    if rewrite_id is not None:
+        save_rewrite_progress(rewrite_id, received, done=True, db_name=db_name)
@@ -0,0 +1,160 @@
+import math
+import logging
+import functools
+
+from typing import NamedTuple, Optional
+from prompts import PROMPT_REWRITE
+from utils.utils import iter_segments, estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # Необязательная зависимость, без нее используется estimate_tokens.
+    tiktoken = None
+
+
+logger = logging.getLogger(__name__)
+
+# Служебные токены на каждое сообщение и на начало ответа в chat.completions.
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+# Ожидаемая длина рерайта относительно текста и запас max_tokens сверху.
+OUTPUT_RATIO = 1.1
+OUTPUT_MARGIN = 0.25
+MIN_OUTPUT_TOKENS = 256
+
+
+class ContextOverflowError(ValueError):
+    """Запрос занимает почти весь контекст модели, и для ответа не остается места."""
+
+
+class ModelLimits(NamedTuple):
+    context_tokens: int
+    max_output_tokens: int
+    # Цены в долларах за 1 млн токенов.
+    input_price: float
+    output_price: float
+    # Время до первого токена (секунды) и скорость генерации (токенов в секунду).
+    first_token_seconds: float
+    output_tokens_per_second: float
+
+
+MODEL_LIMITS = {
+    "gpt-4o-mini": ModelLimits(128000, 16384, 0.15, 0.60, 0.5, 80),
+    "gpt-4o": ModelLimits(128000, 16384, 2.50, 10.00, 0.6, 60),
+}
+
+
+class RewritePlan(NamedTuple):
+    model: str
+    input_tokens: int
+    sections: int
+    max_tokens: int
+    expected_output_tokens: int
+    cost: float
+    latency: float
+    # True, если ожидаемый ответ не помещается в max_tokens и будет обрезан.
+    truncated: bool = False
+
+    def __str__(self) -> str:
+        return (f"{self.model}: вход {self.input_tokens} токенов, секций {self.sections}, "
+                f"max_tokens {self.max_tokens}, ожидается ~{self.expected_output_tokens} "
+                f"токенов ответа, ~${self.cost:.4f}, ~{self.latency:.0f} с")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Словарь кодировки скачивается при первом использовании.
+        logger.warning(f"Кодировка tiktoken недоступна, используется оценка: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Считает токены текста без обращения к API.
+    Использует tiktoken, если он установлен, иначе estimate_tokens.
+    Args:
+        text(str): Текст.
+        model(str): Модель, для которой считаются токены.
+    Returns:
+        int: Количество токенов.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: list[dict], model: str) -> int:
+    """Считает токены запроса chat.completions со служебными токенами."""
+    return (sum(count_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS
+                for message in messages) + REPLY_OVERHEAD_TOKENS)
+
+
+def plan_rewrite(text: str, model: str, system_prompt: str, prompt=PROMPT_REWRITE,
+                 section_tokens: Optional[int] = None, max_workers=1,
+                 output_ratio=OUTPUT_RATIO) -> RewritePlan:
+    """
+    Планирует рерайт до отправки запросов: считает токены запроса, выбирает
+    max_tokens и оценивает стоимость и время.
+    max_tokens выбирается по самой длинной секции: ожидаемая длина ответа
+    (output_ratio от длины секции) с запасом OUTPUT_MARGIN, но не больше
+    лимита ответа модели и остатка контекста после запроса.
+    Args:
+        text(str): Текст для рерайта.
+        model(str): Модель (см. MODEL_LIMITS).
+        system_prompt(str): Системный промпт.
+        prompt(str): Шаблон промпта с {text}.
+        section_tokens(int): Размер секции, как в gpt_rewrite_long; None -
+        текст отправляется одним запросом.
+        max_workers(int): Количество секций, переписываемых одновременно.
+        output_ratio(float): Ожидаемое отношение длины ответа к длине текста.
+    Returns:
+        RewritePlan: План рерайта.
+    Raises:
+        ContextOverflowError: Если после запроса какой-либо секции в контексте
+        остается меньше MIN_OUTPUT_TOKENS токенов на ответ (текст нужно
+        переписывать секциями меньшего размера).
+    """
+    limits = MODEL_LIMITS.get(model, MODEL_LIMITS["gpt-4o-mini"])
+    if section_tokens:
+        sections = [segment.text for segment in iter_segments(text, section_tokens, unit="tokens")]
+    else:
+        sections = [text]
+    sections = sections or [""]
+
+    input_tokens = 0
+    expected_output = 0
+    max_tokens = 0
+    longest_output = 0
+    truncated = False
+    for section in sections:
+        messages = [{"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt.format(text=section)}]
+        section_input = count_message_tokens(messages, model)
+        section_output = math.ceil(count_tokens(section, model) * output_ratio)
+        available = min(limits.max_output_tokens, limits.context_tokens - section_input)
+        if available < MIN_OUTPUT_TOKENS:
+            raise ContextOverflowError(
+                f"Запрос из {section_input} токенов оставляет для ответа {max(0, available)} "
+                f"токенов из {limits.context_tokens}.")
+        wanted = max(MIN_OUTPUT_TOKENS, math.ceil(section_output * (1 + OUTPUT_MARGIN)))
+        if section_output > available:
+            truncated = True
+        input_tokens += section_input
+        expected_output += min(section_output, available)
+        longest_output = max(longest_output, min(section_output, available))
+        max_tokens = max(max_tokens, min(wanted, available))
+
+    rounds = math.ceil(len(sections) / max(1, max_workers))
+    latency = rounds * (limits.first_token_seconds
+                        + longest_output / limits.output_tokens_per_second)
+    cost = (input_tokens * limits.input_price + expected_output * limits.output_price) / 1_000_000
+    return RewritePlan(model, input_tokens, len(sections), max_tokens, expected_output,
+                       cost, latency, truncated)
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from content_parser.subtitles import Subtitles
+from pipeline import batch
+from pipeline.batch import VideoResult, format_report, run_batch
+from pipeline.cleaning import CleaningReport
+from pipeline.stages import StageError
+
+
+def test_run_batch_results_and_stage_limits(monkeypatch):
+    """Функция проверяет порядок результатов, ошибки этапов и лимит параллельности."""
+
+    active = {"translate": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def translate_stage(youtube_id, text, *args, **kwargs):
+        with lock:
+            active["translate"] += 1
+            active["peak"] = max(active["peak"], active["translate"])
+        time.sleep(0.02)
+        with lock:
+            active["translate"] -= 1
+        if youtube_id == "bad":
+            raise StageError("translate", "Перевод не удался.")
+        return f"перевод {text}"
+
+    monkeypatch.setattr(batch, "subtitles_stage",
+                        lambda youtube_id: Subtitles([(f"text {youtube_id}.", 0, 1)], "en"))
+    monkeypatch.setattr(batch, "translate_stage", translate_stage)
+    monkeypatch.setattr(batch, "rewrite_stage", lambda youtube_id, text, **kwargs: f"<{text}>")
+
+    ids = ["a", "bad", "c", "a", "d", "e"]
+    results = run_batch(ids, stage_limits={"translate": 2})
+
+    assert [result.youtube_id for result in results] == ["a", "bad", "c", "d", "e"]
+    assert results[0].article == "<перевод text a.>"
+    assert (results[1].success, results[1].stage) == (False, "translate")
+    assert all(result.success for result in results if result.youtube_id != "bad")
+    assert active["peak"] <= 2
+
+
+def test_run_batch_catches_unexpected_errors(monkeypatch):
+    """Функция проверяет, что непредвиденная ошибка относится к текущему этапу."""
+
+    def subtitles_stage(youtube_id):
+        raise RuntimeError("сеть недоступна")
+
+    monkeypatch.setattr(batch, "subtitles_stage", subtitles_stage)
+
+    assert run_batch(["a"]) == [VideoResult("a", False, "subtitles", error="сеть недоступна")]
+    assert run_batch([]) == []
+
+
+def test_format_report():
+    """Функция проверяет отчет по результатам пакетной обработки."""
+
+    results = [VideoResult("a", True, "rewrite", article="x" * 10,
+                           cleaning=CleaningReport(100, 80, 25, 20)),
+               VideoResult("b", False, "translate", error="Перевод не удался.")]
+
+    assert format_report(results).splitlines() == [
+        "OK    a: статья 10 символов, очистка -20 символов (~5 токенов)",
+        "FAIL  b: этап translate: Перевод не удался.",
+        "Итого: 2, успешно: 1, с ошибками: 1.",
+        "Очистка субтитров: сэкономлено 20 символов (~5 токенов).",
+    ]
+    assert "Пропущено уже собранных роликов: 3." in format_report(results, skipped=3)
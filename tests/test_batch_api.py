@@ -0,0 +1,161 @@
+import json
+import sqlite3
+import threading
+import pytest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+openai = pytest.importorskip("openai")
+
+from database import (initialize_db, insert_many, enable_fulltext, fulltext_available,
+                      Original_text, Rewrite, Translate)
+from rewrite.batch_api import pending_translates, run_batch_rewrite
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Обработчик тестового сервера, повторяющего методы files и batches."""
+
+    state = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, raw=False):
+        body = payload.encode("utf-8") if raw else json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        if self.path == "/v1/files":
+            self.state["requests"] = [json.loads(line) for line in body.splitlines()
+                                      if line.startswith('{"custom_id"')]
+            self._reply({"id": "file-in", "object": "file", "bytes": len(body), "created_at": 0,
+                         "filename": "rewrites.jsonl", "purpose": "batch", "status": "processed"})
+        elif self.path == "/v1/batches":
+            self.state["polls"] = 0
+            self._reply(self._batch("validating"))
+
+    def do_GET(self):
+        if self.path == "/v1/batches/batch-1":
+            self.state["polls"] += 1
+            self._reply(self._batch("in_progress" if self.state["polls"] < 2 else "completed"))
+        elif self.path == "/v1/files/file-out/content":
+            lines = []
+            for index, request in enumerate(self.state["requests"]):
+                text = request["body"]["messages"][1]["content"]
+                status = 500 if index == 1 else 200
+                lines.append(json.dumps({
+                    "id": f"response-{index}", "custom_id": request["custom_id"], "error": None,
+                    "response": {"status_code": status, "request_id": str(index), "body": {
+                        "choices": [{"message": {"content": f"Статья.\n{len(text)}"}}]}}}))
+            self._reply("\n".join(lines), raw=True)
+
+    def _batch(self, status):
+        batch = {"id": "batch-1", "object": "batch", "endpoint": "/v1/chat/completions",
+                 "input_file_id": "file-in", "completion_window": "24h", "status": status,
+                 "created_at": 0}
+        if status == "completed":
+            total = len(self.state["requests"])
+            batch["output_file_id"] = "file-out"
+            batch["request_counts"] = {"total": total, "completed": total, "failed": 0}
+        return batch
+
+
+@pytest.fixture()
+def server():
+    """Фикстура для запуска тестового сервера Batch API."""
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/v1"
+    httpd.shutdown()
+
+
+@pytest.mark.parametrize("fulltext", [False, True])
+def test_run_batch_rewrite(tmp_path, server, fulltext):
+    """Функция проверяет отправку пакета, ожидание и загрузку результатов."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    if fulltext:
+        if not fulltext_available(db_name):
+            pytest.skip("SQLite собран без FTS5.")
+        # Триггеры FTS записывают дополнительные строки при вставке рерайтов.
+        assert enable_fulltext(db_name)
+    text_ids = insert_many([Original_text(None, f"text {i}", None, "now", "now")
+                            for i in range(3)], db_name=db_name)
+    insert_many([Translate(text_id, None, f"перевод {text_id}", None, "now", "now")
+                 for text_id in text_ids], db_name=db_name)
+    client = openai.OpenAI(api_key="test", base_url=server, max_retries=0)
+
+    reports = run_batch_rewrite(db_name, client=client, poll_interval=0)
+
+    assert [(report.status, report.requests, report.rewrites, report.errors)
+            for report in reports] == [("completed", 3, 2, 1)]
+    with sqlite3.connect(db_name) as conn:
+        rewrites = conn.execute("SELECT translate_id, rewrite_text FROM rewrites "
+                                "ORDER BY translate_id").fetchall()
+    assert [row[0] for row in rewrites] == [1, 3]
+    assert rewrites[0][1].startswith("Статья. ")
+    with sqlite3.connect(db_name) as conn:
+        batches = conn.execute("SELECT batch_id, status, ingested FROM rewrite_batches").fetchall()
+    assert batches == [("batch-1", "completed", 1)]
+    # Перевод с ошибкой снова ожидает рерайта.
+    assert [item.translate_id for item in pending_translates(db_name)] == [2]
+
+
+def test_ingest_failure_rolls_back(tmp_path, server, monkeypatch):
+    """Функция проверяет, что при ошибке сохранения пакет не отмечается загруженным."""
+
+    from rewrite import batch_api
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    text_ids = insert_many([Original_text(None, "text", None, "now", "now")], db_name=db_name)
+    insert_many([Translate(text_ids[0], None, "перевод", None, "now", "now")], db_name=db_name)
+    client = openai.OpenAI(api_key="test", base_url=server, max_retries=0)
+    # Рерайты записываются, но сохранение считается неудачным.
+    monkeypatch.setattr(batch_api, "insert_many",
+                        lambda records, db_name: insert_many(records, db_name=db_name) and [])
+
+    with pytest.raises(sqlite3.Error):
+        run_batch_rewrite(db_name, client=client, poll_interval=0)
+
+    with sqlite3.connect(db_name) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM rewrites").fetchone()[0] == 0
+        assert conn.execute("SELECT ingested FROM rewrite_batches").fetchall() == [(0,)]
+
+
+def test_ingest_skips_translates_rewritten_meanwhile(tmp_path, server, monkeypatch):
+    """Функция проверяет, что перевод, переписанный онлайн после отправки пакета, не дублируется."""
+
+    from rewrite import batch_api
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    text_ids = insert_many([Original_text(None, f"text {i}", None, "now", "now")
+                            for i in range(3)], db_name=db_name)
+    insert_many([Translate(text_id, None, f"перевод {text_id}", None, "now", "now")
+                 for text_id in text_ids], db_name=db_name)
+    client = openai.OpenAI(api_key="test", base_url=server, max_retries=0)
+    ingest_batch = batch_api.ingest_batch
+
+    def rewrite_online_then_ingest(batch, db_name, client):
+        insert_many([Rewrite("Онлайн-статья.", None, 1, None, "now", "now")], db_name=db_name)
+        return ingest_batch(batch, db_name, client)
+
+    monkeypatch.setattr(batch_api, "ingest_batch", rewrite_online_then_ingest)
+
+    reports = run_batch_rewrite(db_name, client=client, poll_interval=0)
+
+    assert [(report.rewrites, report.errors, report.skipped) for report in reports] == [(1, 1, 1)]
+    with sqlite3.connect(db_name) as conn:
+        rewrites = conn.execute("SELECT translate_id, rewrite_text FROM rewrites "
+                                "ORDER BY translate_id").fetchall()
+    assert rewrites[0] == (1, "Онлайн-статья.")
+    assert [row[0] for row in rewrites] == [1, 3]
@@ -0,0 +1,149 @@
+import sqlite3
+import threading
+import time
+import pytest
+
+from types import SimpleNamespace
+
+from database import initialize_db, find_partial_rewrite
+from prompts import PROMPT_MERGE, PROMPT_CONTINUE
+from rewrite import chatgpt_rewrite
+from rewrite.chatgpt_rewrite import clean_stream, gpt_rewrite_long, gpt_rewrite_stream
+from utils.utils import iter_segments
+
+
+class FakeCompletions:
+    """Заглушка chat.completions: ответ строит функция reply(messages)."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, max_tokens, temperature, stream=False):
+        with self._lock:
+            self.calls.append(messages)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            content = self.reply(messages)
+        finally:
+            with self._lock:
+                self.active -= 1
+        if stream:
+            return content
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture()
+def completions(monkeypatch):
+    """Фикстура подменяет общий клиент OpenAI заглушкой."""
+
+    def install(reply):
+        fake = FakeCompletions(reply)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=fake))
+        monkeypatch.setattr(chatgpt_rewrite, "_client", client)
+        return fake
+
+    return install
+
+
+def section_of(messages):
+    return messages[1]["content"].split("::", 1)[1]
+
+
+def test_rewrite_long_splits_and_keeps_order(completions):
+    """Функция проверяет деление на секции, параллельность и порядок склейки."""
+
+    text = " ".join(f"Предложение номер {index} о длинном ролике." for index in range(40))
+    sections = [segment.text for segment in iter_segments(text, 40, unit="tokens")]
+
+    def reply(messages):
+        section = section_of(messages)
+        # Первые секции отвечают дольше, чтобы порядок завершения отличался.
+        time.sleep(0.02 * (len(sections) - sections.index(section)) / len(sections))
+        return f"\n<{section}>.\n"
+
+    fake = completions(reply)
+
+    article = gpt_rewrite_long(text, "::{text}", max_tokens=100, section_tokens=40,
+                               max_workers=3)
+
+    assert len(sections) > 3
+    assert article == " ".join(f"<{section}>." for section in sections)
+    assert sorted(section_of(call) for call in fake.calls) == sorted(sections)
+    assert fake.peak <= 3
+
+
+def test_rewrite_long_short_text_and_merge(completions):
+    """Функция проверяет один вызов для короткого текста и сглаживание секций."""
+
+    fake = completions(lambda messages: "Итог")
+
+    assert gpt_rewrite_long("Короткий текст.", "::{text}", max_tokens=100) == "Итог"
+    assert len(fake.calls) == 1
+
+    text = "Первая часть текста. " * 30
+    gpt_rewrite_long(text, "::{text}", max_tokens=100, section_tokens=40, merge=True)
+
+    sections = len(fake.calls) - 2
+    assert sections > 1
+    assert fake.calls[-1][1]["content"] == PROMPT_MERGE.format(text=" ".join(["Итог"] * sections))
+
+
+def stream_of(*parts, error=None):
+    """Поток ответа модели из частей; error прерывает поток после них."""
+
+    for part in parts:
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+    if error is not None:
+        raise error
+
+
+def test_clean_stream():
+    """Функция проверяет потоковую очистку так же, как очистку в gpt_rewrite."""
+
+    chunks = ["\n  Первое", " предложение.\nВто", "рое\nпредложение", ".  \n", " "]
+    cleaned = list(clean_stream(chunks))
+
+    raw = "".join(chunks)
+    assert "".join(cleaned) == raw.strip().replace('.\n', '. ').replace('\n', '')
+    assert cleaned[-1] == "."
+    assert list(clean_stream(["  ", "\n"])) == []
+
+
+def test_rewrite_stream_resumes_after_crash(tmp_path, completions, monkeypatch):
+    """Функция проверяет сохранение потокового рерайта и продолжение после обрыва."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    monkeypatch.setattr(chatgpt_rewrite, "STREAM_FLUSH_CHARS", 5)
+    replies = [stream_of("Начало статьи. ", "Еще", error=RuntimeError("обрыв")),
+               stream_of(" Продолжение", " статьи.\n")]
+    fake = completions(lambda messages: replies.pop(0))
+
+    received = []
+    with pytest.raises(RuntimeError):
+        for part in gpt_rewrite_stream("текст", "::{text}", max_tokens=100, translate_id=1,
+                                       db_name=db_name):
+            received.append(part)
+
+    # Несохраненный хвост "Еще" теряется, модель продолжает с сохраненного места.
+    assert "".join(received) == "Начало статьи. Еще"
+    rewrite_id, saved = find_partial_rewrite(1, db_name=db_name)
+    assert saved == "Начало статьи."
+
+    parts = list(gpt_rewrite_stream("текст", "::{text}", max_tokens=100, translate_id=1,
+                                    db_name=db_name))
+
+    assert parts[0] == saved
+    assert "".join(parts) == "Начало статьи. Продолжение статьи."
+    assert fake.calls[1][2:] == [{"role": "assistant", "content": saved},
+                                 {"role": "user", "content": PROMPT_CONTINUE}]
+    assert find_partial_rewrite(1, db_name=db_name) is None
+    with sqlite3.connect(db_name) as conn:
+        assert conn.execute("SELECT id, rewrite_text FROM rewrites").fetchall() == \
+            [(rewrite_id, "Начало статьи. Продолжение статьи.")]
@@ -0,0 +1,60 @@
+from content_parser.subtitles import Subtitles, GENERATED, MANUAL
+from pipeline.cleaning import clean_subtitles, clean_words, FILLERS
+
+
+def test_clean_words_strips_markers_and_fillers():
+    """Функция проверяет удаление пометок и слов-паразитов."""
+
+    assert clean_words("[Music] so um, this is ♪ uh great", FILLERS["en"]) == \
+        ["so", "this", "is", "great"]
+    assert clean_words("ээ ну (смех) вот", FILLERS["ru"]) == ["ну", "вот"]
+
+
+def test_clean_subtitles_collapses_overlaps_into_sentences():
+    """Функция проверяет склейку перекрывающихся строк в предложения."""
+
+    subtitles = Subtitles([("[Music]", 0, 1),
+                           ("so today we", 1, 2),
+                           ("today we talk about", 2, 2),
+                           ("talk about cats.", 3, 2),
+                           ("talk about cats.", 4, 1),
+                           ("They are great", 5, 1)], "en", GENERATED)
+
+    cleaned, report = clean_subtitles(subtitles)
+
+    assert cleaned.text == "so today we talk about cats.\nThey are great"
+    assert (cleaned[0].start, cleaned[0].end) == (1, 5)
+    assert cleaned.language_code == "en"
+    assert report.chars_saved == len(subtitles.text) - len(cleaned.text)
+    assert report.tokens_saved > 0
+
+
+def test_clean_subtitles_keeps_short_and_cross_sentence_matches():
+    """Функция проверяет, что совпадения в одно слово и через конец предложения - речь."""
+
+    cases = [
+        (["He said no.", "No, I did not."], "He said no.\nNo, I did not."),
+        (["Go go go.", "Go home now"], "Go go go.\nGo home now"),
+        (["It works. Yes", "works. Yes it does."], "It works. Yes works. Yes it does."),
+    ]
+    for lines, expected in cases:
+        subtitles = Subtitles([(line, index, 1) for index, line in enumerate(lines)],
+                              "en", GENERATED)
+        assert clean_subtitles(subtitles)[0].text == expected
+
+
+def test_clean_subtitles_manual_keeps_overlaps():
+    """Функция проверяет, что у ручных субтитров перекрытия не удаляются."""
+
+    subtitles = Subtitles([("we talk about", 0, 1), ("talk about cats.", 1, 1)], "en", MANUAL)
+
+    assert clean_subtitles(subtitles)[0].text == "we talk about talk about cats."
+
+
+def test_clean_subtitles_empty():
+    """Функция проверяет субтитры только из пометок."""
+
+    cleaned, report = clean_subtitles(Subtitles([("[Applause]", 0, 1)], "en"))
+
+    assert cleaned.text == ""
+    assert report.chars_after == 0
@@ -0,0 +1,106 @@
+import sqlite3
+import pytest
+
+from database import codec
+from database import (initialize_db, insert_record, transaction, enable_compression,
+                      migrate_compression, compress_text, decompress_text, lazy_text,
+                      enable_fulltext, fulltext_available, search_texts, train_dictionary,
+                      Original_text)
+
+
+TEXT = "Субтитры ролика о выращивании томатов на балконе. " * 50
+
+
+@pytest.fixture()
+def db_name(tmp_path):
+    """Фикстура для создания временной БД."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    return db_name
+
+
+def test_compress_roundtrip():
+    """Функция проверяет сжатие и распаковку текста."""
+
+    packed = compress_text(TEXT)
+
+    assert isinstance(packed, bytes)
+    assert len(packed) < len(TEXT.encode("utf-8"))
+    assert decompress_text(packed) == TEXT
+    assert compress_text("коротко") == "коротко"
+    assert decompress_text("обычный текст") == "обычный текст"
+    assert lazy_text(packed) == TEXT
+
+
+def test_insert_compressed(db_name):
+    """Функция проверяет сжатие текстов при вставке после включения сжатия."""
+
+    enable_compression(db_name)
+    text_id = insert_record(Original_text(None, TEXT, None, "", ""), db_name=db_name)
+
+    with transaction(db_name) as conn:
+        raw, text = conn.execute("SELECT text, harvester_decompress(text) FROM original_texts "
+                                 "WHERE id = ?", (text_id,)).fetchone()
+    assert isinstance(raw, bytes)
+    assert text == TEXT
+
+
+def test_migrate_compression(db_name):
+    """Функция проверяет сжатие существующих записей и отчет об экономии."""
+
+    insert_record(Original_text(None, TEXT, None, "", ""), db_name=db_name)
+    insert_record(Original_text(None, "коротко", None, "", ""), db_name=db_name)
+
+    report = migrate_compression(db_name)
+
+    assert report.rows == 1
+    assert report.bytes_after < report.bytes_before
+    assert report.saved_ratio > 0.5
+
+
+def test_fulltext_with_compression(db_name):
+    """Функция проверяет индексацию сжатых текстов полнотекстовым поиском."""
+
+    if not fulltext_available(db_name):
+        pytest.skip("SQLite собран без FTS5.")
+    enable_fulltext(db_name)
+    enable_compression(db_name)
+    insert_record(Original_text(None, TEXT, None, "", ""), db_name=db_name)
+
+    assert len(search_texts("томатов балконе", db_name)) == 1
+
+
+def test_fulltext_requires_registered_connection(db_name):
+    """Функция проверяет, что триггеры индекса требуют регистрации соединения."""
+
+    if not fulltext_available(db_name):
+        pytest.skip("SQLite собран без FTS5.")
+    enable_fulltext(db_name)
+    query = "INSERT INTO original_texts (text) VALUES ('томаты на балконе')"
+
+    conn = sqlite3.connect(db_name)
+    with pytest.raises(sqlite3.OperationalError, match="harvester_decompress"):
+        conn.execute(query)
+    codec.register_connection(conn)
+    conn.execute(query)
+    conn.commit()
+    conn.close()
+
+    assert len(search_texts("томаты", db_name)) == 1
+
+
+def test_dictionary_trained_by_other_process(db_name, monkeypatch):
+    """Функция проверяет загрузку словаря, обученного после открытия соединений."""
+
+    pytest.importorskip("zstandard")
+    for index in range(200):
+        insert_record(Original_text(None, f"{TEXT} {index}", None, "", ""), db_name=db_name)
+    dict_id = train_dictionary(db_name)
+    if dict_id is None:
+        pytest.skip("Словарь не обучен.")
+    packed = compress_text(TEXT)
+    # Процесс, который видел БД до обучения словаря.
+    monkeypatch.setattr(codec, "_dictionaries", {})
+
+    assert decompress_text(packed) == TEXT
@@ -1,7 +1,9 @@
 import sqlite3
 import pytest
 
-from database import initialize_db
+from database import (initialize_db, insert_record, get_connection, transaction,
+                      insert_many, start_rewrite, find_partial_rewrite, save_rewrite_progress,
+                      get_language_id, get_translator_id, Language, Translator, Video)
 
 
 @pytest.fixture()
@@ -36,3 +38,106 @@ def test_initialize_db(db_connection, monkeypatch):
 
     for table in expected_tables:
         assert table in actual_tables, f"Таблица {table} не была создана."
+
+
+def test_rewrite_progress(tmp_path):
+    """Функция для тестирования сохранения и продолжения потокового рерайта."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+
+    rewrite_id = start_rewrite(1, db_name=db_name)
+    save_rewrite_progress(rewrite_id, "Первая часть", db_name=db_name)
+
+    assert find_partial_rewrite(1, db_name=db_name) == (rewrite_id, "Первая часть")
+
+    save_rewrite_progress(rewrite_id, "Первая часть. Вторая часть.", done=True, db_name=db_name)
+
+    assert find_partial_rewrite(1, db_name=db_name) is None
+
+
+def test_connection_reused(tmp_path):
+    """Функция проверяет повторное использование соединения и режим WAL."""
+
+    db_name = str(tmp_path / "test.db")
+
+    conn = get_connection(db_name)
+
+    assert get_connection(db_name) is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_transaction_rollback(tmp_path):
+    """Функция проверяет откат всех записей транзакции при ошибке."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+
+    with pytest.raises(RuntimeError):
+        with transaction(db_name):
+            assert insert_record(Language("en"), db_name=db_name) is not None
+            raise RuntimeError("ошибка этапа")
+
+    with transaction(db_name) as conn:
+        insert_record(Language("ru"), db_name=db_name)
+        codes = [row[0] for row in conn.execute("SELECT code FROM languages")]
+    assert codes == ["ru"]
+
+
+def test_insert_many(tmp_path):
+    """Функция для тестирования пакетной вставки записей разных таблиц."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+
+    ids = insert_many([Language("en"), Translator("yandex"), Language("ru")], db_name=db_name)
+
+    assert ids == [1, 1, 2]
+
+
+def test_insert_many_conflicts(tmp_path):
+    """Функция проверяет пропуск и обновление записей при конфликте уникальности."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    first = Video("abc", "Title", "", None, None, "", "")
+    insert_many([first], db_name=db_name)
+
+    assert insert_many([first], db_name=db_name) == []
+
+    ids = insert_many([first._replace(title="New"), Video("def", "Other", "", None, None, "", "")],
+                      db_name=db_name, on_conflict="update", key="youtube_id")
+
+    assert ids[0] == 1
+    assert ids[1] not in (None, 1)
+    with transaction(db_name) as conn:
+        title = conn.execute("SELECT title FROM videos WHERE youtube_id = 'abc'").fetchone()[0]
+    assert title == "New"
+
+
+def test_reference_ids_cached(tmp_path):
+    """Функция для тестирования кэша справочных таблиц."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+
+    en_id = get_language_id("en", db_name)
+    assert get_language_id("en", db_name) == en_id
+    assert get_language_id("ru", db_name) != en_id
+    assert get_translator_id("yandex", db_name) == 1
+
+    insert_record(Language("de"), db_name=db_name)
+    with transaction(db_name) as conn:
+        de_id = conn.execute("SELECT id FROM languages WHERE code = 'de'").fetchone()[0]
+    assert get_language_id("de", db_name) == de_id
+
+
+def test_foreign_key_indexes(tmp_path):
+    """Функция проверяет создание индексов по внешним ключам."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+
+    with transaction(db_name) as conn:
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM translates WHERE text_id = 1").fetchall()
+    assert "idx_translates_text" in str(plan)
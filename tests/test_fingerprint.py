@@ -0,0 +1,138 @@
+import random
+import sqlite3
+import threading
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from database import initialize_db
+from pipeline.fingerprint import (DISTANCE_LIMIT, FingerprintIndex, bands, simhash,
+                                  hamming_distance)
+
+
+def _text(seed: int, words=400) -> str:
+    rng = random.Random(seed)
+    vocabulary = [f"word{index}" for index in range(2000)]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def test_simhash_similar_texts():
+    """Функция проверяет близость отпечатков почти одинаковых текстов."""
+
+    text = _text(1)
+    clip = text + " subscribe to the channel"
+
+    assert hamming_distance(simhash(text), simhash(clip)) <= 3
+    assert hamming_distance(simhash(text), simhash(_text(2))) > 3
+
+
+def test_check_and_add(tmp_path):
+    """Функция проверяет поиск дубликатов и сохранение отпечатков в БД."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    index = FingerprintIndex(db_name)
+    text = _text(1)
+
+    assert index.check_and_add("original", text) is None
+    assert index.check_and_add("other", _text(2)) is None
+    duplicate = index.check_and_add("reupload", text.upper())
+
+    assert duplicate.youtube_id == "original"
+    assert duplicate.distance == 0
+
+    loaded = FingerprintIndex.load(db_name)
+    assert loaded.find_duplicate(text).youtube_id in ("original", "reupload")
+
+
+def test_looser_threshold_finds_partial_reupload():
+    """Функция проверяет поиск частичного перезалива при увеличенном пороге."""
+
+    text = _text(3, words=1500)
+    words = text.split()
+    partial = " ".join(words[100:1450]) + " " + _text(4, words=50)
+
+    strict = FingerprintIndex(None)
+    loose = FingerprintIndex(None, max_distance=12)
+    for index in (strict, loose):
+        index.check_and_add("original", text)
+        index.check_and_add("other", _text(5, words=1500))
+
+    assert strict.find_duplicate(partial) is None
+    assert loose.find_duplicate(partial).youtube_id == "original"
+    assert loose.band_count == 13
+    with pytest.raises(ValueError):
+        FingerprintIndex(None, max_distance=DISTANCE_LIMIT + 1)
+
+
+def test_bands_cover_signature():
+    """Функция проверяет, что полосы любой ширины вместе дают весь отпечаток."""
+
+    signature = simhash(_text(6))
+    for count in (1, 4, 7, 16):
+        offset = restored = 0
+        for value, bits in zip(bands(signature, count),
+                               [64 // count + (band < 64 % count) for band in range(count)]):
+            restored |= value << offset
+            offset += bits
+        assert restored == signature
+
+
+def test_readding_video_keeps_single_bucket_entry():
+    """Функция проверяет, что повторное добавление ролика не дублирует его в корзинах."""
+
+    index = FingerprintIndex(None)
+    index.check_and_add("video", _text(1))
+    index.check_and_add("video", _text(1))
+    index.check_and_add("video", _text(2))
+
+    entries = [video for buckets in index._buckets for bucket in buckets.values()
+               for video in bucket]
+    assert entries == ["video"] * index.band_count
+    assert index.find_duplicate(_text(1)) is None
+
+
+def test_bands_stored_for_lookup_threshold(tmp_path):
+    """Функция проверяет, что в БД хранятся полосы порогов, по которым идет поиск."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    strict = FingerprintIndex.load(db_name)
+    text = _text(7)
+    strict.check_and_add("original", text)
+
+    # Индекс с другим порогом раскладывает уже сохраненные отпечатки по своим
+    # корзинам, а новые отпечатки сохраняются с полосами обоих порогов.
+    loose = FingerprintIndex.load(db_name, max_distance=10)
+    loose.check_and_add("other", _text(8))
+    with sqlite3.connect(db_name) as conn:
+        counts = dict(conn.execute("SELECT bands, COUNT(*) FROM fingerprint_bands GROUP BY bands"))
+    assert counts == {strict.band_count: 2 * strict.band_count,
+                      loose.band_count: 2 * loose.band_count}
+
+    assert FingerprintIndex(db_name).find_duplicate(text.upper()).youtube_id == "original"
+    assert FingerprintIndex(db_name, max_distance=10).find_duplicate(text).youtube_id == "original"
+    assert FingerprintIndex(db_name).find_duplicate(_text(9)) is None
+
+
+def test_indexes_share_fingerprints_through_db(tmp_path):
+    """Функция проверяет, что индексы разных процессов с общей БД видят отпечатки друг друга."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    # Индексы загружены до появления отпечатков, как в воркерах разных процессов.
+    indexes = [FingerprintIndex.load(db_name) for _ in range(8)]
+    text = _text(10)
+    barrier = threading.Barrier(len(indexes))
+
+    def check(number: int):
+        barrier.wait()
+        return indexes[number].check_and_add(f"copy{number}", text)
+
+    with ThreadPoolExecutor(max_workers=len(indexes)) as executor:
+        results = list(executor.map(check, range(len(indexes))))
+
+    assert sum(result is None for result in results) == 1
+    with sqlite3.connect(db_name) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM fingerprints "
+                            "WHERE duplicate_of IS NULL").fetchone() == (1,)
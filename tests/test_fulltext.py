@@ -0,0 +1,65 @@
+import pytest
+
+from database import (initialize_db, insert_record, insert_many, transaction, enable_fulltext,
+                      fulltext_available, rebuild_fulltext, search_texts, Original_text, Rewrite)
+
+
+@pytest.fixture()
+def db_name(tmp_path):
+    """Фикстура для создания временной БД с полнотекстовым индексом."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    if not fulltext_available(db_name):
+        pytest.skip("SQLite собран без FTS5.")
+    return db_name
+
+
+def test_search_after_insert(db_name):
+    """Функция проверяет индексацию новых записей триггерами."""
+
+    enable_fulltext(db_name)
+    text_id = insert_record(Original_text(None, "Как вырастить томаты на балконе", None, "", ""),
+                            db_name=db_name)
+    insert_record(Rewrite("Огурцы в теплице", None, None, None, "", ""), db_name=db_name)
+
+    results = search_texts("томаты балконе", db_name)
+
+    assert [(result.table_name, result.id) for result in results] == [("original_texts", text_id)]
+    assert "[томаты]" in results[0].snippet
+
+
+def test_insert_many_ids_with_triggers(db_name):
+    """Функция проверяет, что строки, записанные триггерами FTS, не мешают вернуть id."""
+
+    enable_fulltext(db_name)
+    ids = insert_many([Original_text(None, "Первый текст", None, "", ""),
+                       Original_text(None, "Второй текст", None, "", "")], db_name=db_name)
+
+    assert ids == [1, 2]
+    assert [result.id for result in search_texts("второй", db_name)] == [2]
+
+
+def test_search_after_update_and_delete(db_name):
+    """Функция проверяет обновление индекса при изменении и удалении записей."""
+
+    enable_fulltext(db_name)
+    text_id = insert_record(Original_text(None, "старый текст", None, "", ""), db_name=db_name)
+    with transaction(db_name) as conn:
+        conn.execute("UPDATE original_texts SET text = 'новый текст' WHERE id = ?", (text_id,))
+
+    assert search_texts("старый", db_name) == []
+    assert len(search_texts("новый", db_name)) == 1
+
+    with transaction(db_name) as conn:
+        conn.execute("DELETE FROM original_texts WHERE id = ?", (text_id,))
+    assert search_texts("новый", db_name) == []
+
+
+def test_rebuild_indexes_existing_rows(db_name):
+    """Функция проверяет индексацию записей, созданных до включения поиска."""
+
+    insert_record(Original_text(None, "существующий текст", None, "", ""), db_name=db_name)
+
+    assert rebuild_fulltext(db_name) == 1
+    assert len(search_texts("существующий", db_name)) == 1
@@ -0,0 +1,183 @@
+import sqlite3
+import pytest
+
+from content_parser.subtitles import GENERATED, Subtitles
+from database import initialize_db, find_partial_rewrite, save_rewrite_progress, start_rewrite
+from pipeline import runner
+from pipeline.jobs import JobQueue, LeaseLost, pack_timings, unpack_subtitles
+from pipeline.runner import StageContext, run_stage, run_video
+from translate.router import TranslatorRouter
+
+
+@pytest.fixture()
+def queue(tmp_path):
+    """Фикстура для создания очереди во временной БД."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    return JobQueue(db_name, lease_seconds=60, max_attempts=2)
+
+
+def test_claim_is_exclusive(queue):
+    """Функция проверяет, что арендованный ролик не достается другому воркеру."""
+
+    assert queue.enqueue(["a", "b", "a"]) == 2
+    first = queue.claim("fetch", owner="w1")
+    second = queue.claim("fetch", owner="w2")
+
+    assert {first.youtube_id, second.youtube_id} == {"a", "b"}
+    assert queue.claim("fetch", owner="w3") is None
+    assert queue.claim("clean", owner="w3") is None
+
+
+def test_complete_and_lost_lease(queue):
+    """Функция проверяет переход состояния и потерю аренды."""
+
+    queue.enqueue(["a"])
+    job = queue.claim("fetch", owner="w1")
+
+    job = queue.complete(job, "fetch", language_code="en")
+    assert (job.state, job.language_code, job.lease_owner) == ("fetched", "en", None)
+
+    stale = queue.claim("clean", owner="w1")
+    with sqlite3.connect(queue.db_name) as conn:
+        conn.execute("UPDATE jobs SET lease_expires_at = 0")
+    assert queue.claim("clean", owner="w2").lease_owner == "w2"
+    with pytest.raises(LeaseLost):
+        queue.complete(stale, "clean")
+
+
+def test_fail_retries_then_marks_failed(queue):
+    """Функция проверяет повтор этапа и пометку failed после max_attempts."""
+
+    queue.enqueue(["a"])
+    queue.fail(queue.claim("fetch"), "network")
+    queue.fail(queue.claim("fetch"), "network")
+
+    assert queue.claim("fetch") is None
+    assert queue.stats()["failed"] == 1
+    assert queue.retry_failed() == 1
+    assert queue.claim("fetch") is not None
+
+
+def test_timings_round_trip():
+    """Функция проверяет упаковку таймингов субтитров."""
+
+    subtitles = Subtitles([("one", 0.5, 1.0), ("two", 1.5, 2.0)], "en")
+
+    restored = unpack_subtitles(subtitles.text, pack_timings(subtitles), "en")
+
+    assert list(restored) == list(subtitles)
+
+
+def test_run_video_resumes_after_crash(queue, monkeypatch):
+    """Функция проверяет, что после сбоя рерайта готовые этапы не повторяются."""
+
+    calls = {"subtitles": 0, "translate": 0, "rewrite": 0}
+
+    def subtitles_stage(youtube_id):
+        calls["subtitles"] += 1
+        # Автоматические субтитры: повтор строки удаляется при очистке.
+        return Subtitles([("[Music]", 0, 1), ("hello world.", 1, 2), ("hello world.", 3, 1)],
+                         "en", GENERATED)
+
+    translated = []
+
+    def translate(segments, src, dest):
+        calls["translate"] += 1
+        translated.extend(segments)
+        return ["привет мир." for _ in segments]
+
+    def rewrite_stage(youtube_id, text, **kwargs):
+        calls["rewrite"] += 1
+        if calls["rewrite"] == 1:
+            raise RuntimeError("process died")
+        return f"Статья: {text}"
+
+    monkeypatch.setattr(runner, "subtitles_stage", subtitles_stage)
+    monkeypatch.setattr(runner, "rewrite_stage", rewrite_stage)
+    context = StageContext(router=TranslatorRouter({"fake": translate}))
+
+    assert run_video(queue, "a", context) is None
+    assert queue.get("a").state == "translated"
+
+    job = run_video(queue, "a", context)
+
+    assert job.state == "rewritten"
+    assert job.subtitles_kind == GENERATED
+    assert calls == {"subtitles": 1, "translate": 1, "rewrite": 2}
+    assert translated == ["hello world."]
+    with sqlite3.connect(queue.db_name) as conn:
+        # Исходный текст сохраняется, переводится очищенный.
+        assert conn.execute("SELECT text FROM original_texts").fetchall() == \
+            [("[Music]\nhello world.\nhello world.",)]
+        assert conn.execute("SELECT rewrite_text FROM rewrites WHERE id = ?",
+                            (job.rewrite_id,)).fetchone() == ("Статья: привет мир.",)
+        assert conn.execute("SELECT text_id FROM videos WHERE youtube_id = 'a'").fetchone() == \
+            (job.text_id,)
+
+
+def test_run_stage_stops_on_stage_error(queue, monkeypatch):
+    """Функция проверяет пометку failed при ошибке этапа без повторов."""
+
+    def subtitles_stage(youtube_id):
+        raise runner.StageError("subtitles", "Подходящих субтитров нет.")
+
+    monkeypatch.setattr(runner, "subtitles_stage", subtitles_stage)
+    queue.enqueue(["a", "b"])
+
+    assert run_stage(queue, "fetch") == 0
+    assert queue.stats()["failed"] == 2
+
+
+def test_stream_rewrite_rejects_text_over_context(queue, monkeypatch):
+    """Функция проверяет, что текст больше контекста не отправляется потоковым рерайтом."""
+
+    def gpt_rewrite_stream(*args, **kwargs):
+        raise AssertionError("запрос не должен отправляться")
+
+    monkeypatch.setattr(runner, "gpt_rewrite_stream", gpt_rewrite_stream)
+    queue.enqueue(["a"])
+    with sqlite3.connect(queue.db_name) as conn:
+        conn.execute("INSERT INTO translates (translated_text) VALUES (?)", ("word " * 200000,))
+        conn.execute("UPDATE jobs SET state = 'translated', translate_id = 1")
+
+    with pytest.raises(runner.StageError):
+        list(runner.stream_rewrite(queue, queue.get("a")))
+
+    # Ролик возвращен в очередь для рерайта по секциям.
+    job = queue.get("a")
+    assert (job.state, job.lease_owner, job.attempts) == ("translated", None, 0)
+    assert queue.stats()["failed"] == 0
+    assert queue.claim("rewrite") is not None
+
+
+def test_rewrite_job_resumes_partial_stream(queue, monkeypatch):
+    """Функция проверяет, что этап rewrite продолжает прерванный потоковый рерайт."""
+
+    def gpt_rewrite_stream(text, prompt, translate_id, db_name, **kwargs):
+        rewrite_id, received = find_partial_rewrite(translate_id, db_name=db_name)
+        yield received
+        save_rewrite_progress(rewrite_id, received + " Конец.", done=True, db_name=db_name)
+        yield " Конец."
+
+    def rewrite_stage(*args, **kwargs):
+        raise AssertionError("рерайт не должен начинаться заново")
+
+    monkeypatch.setattr(runner, "gpt_rewrite_stream", gpt_rewrite_stream)
+    monkeypatch.setattr(runner, "rewrite_stage", rewrite_stage)
+    queue.enqueue(["a"])
+    with sqlite3.connect(queue.db_name) as conn:
+        conn.execute("INSERT INTO translates (translated_text) VALUES ('перевод')")
+        conn.execute("UPDATE jobs SET state = 'translated', translate_id = 1")
+    rewrite_id = start_rewrite(1, db_name=queue.db_name)
+    save_rewrite_progress(rewrite_id, "Начало.", db_name=queue.db_name)
+
+    assert run_stage(queue, "rewrite") == 1
+
+    job = queue.get("a")
+    assert (job.state, job.rewrite_id) == ("rewritten", rewrite_id)
+    with sqlite3.connect(queue.db_name) as conn:
+        assert conn.execute("SELECT rewrite_text FROM rewrites").fetchall() == \
+            [("Начало. Конец.",)]
+        assert conn.execute("SELECT done FROM rewrite_progress").fetchall() == [(1,)]
@@ -0,0 +1,67 @@
+from content_parser.subtitles import Subtitles
+from database import initialize_db, insert_many, Video
+from pipeline import batch
+from pipeline.known_videos import BloomFilter, KnownVideos
+
+
+def test_filter_new_from_db(tmp_path):
+    """Функция проверяет отсев роликов, уже сохраненных в таблице videos."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    insert_many([Video("old1", "", "", None, None, "", ""),
+                 Video("old2", "", "", None, None, "", "")], db_name=db_name)
+
+    known = KnownVideos.load(db_name)
+
+    assert known.filter_new(["new1", "old1", "new2", "old2"]) == (["new1", "new2"], 2)
+
+
+def test_bloom_filter():
+    """Функция проверяет, что фильтр Блума не теряет добавленные элементы."""
+
+    bloom = BloomFilter(1000)
+    items = [f"video{index}" for index in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    false_positives = sum(f"other{index}" in bloom for index in range(10000))
+    assert false_positives < 100
+
+
+def test_known_videos_uses_bloom_for_large_history():
+    """Функция проверяет переключение на фильтр Блума для большой истории."""
+
+    known = KnownVideos([f"video{index}" for index in range(100)], bloom_threshold=10)
+
+    assert isinstance(known._ids, BloomFilter)
+    assert "video5" in known
+    known.add("new")
+    assert "new" in known
+
+
+def test_run_batch_skips_recorded_videos(tmp_path, monkeypatch):
+    """Функция проверяет, что повторный запуск пакета пропускает обработанные ролики."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    fetched = []
+
+    def fake_subtitles(youtube_id):
+        fetched.append(youtube_id)
+        if youtube_id == "bad":
+            raise RuntimeError("нет субтитров")
+        return Subtitles([(f"text {youtube_id}", 0, 1)], "en")
+
+    monkeypatch.setattr(batch, "subtitles_stage", fake_subtitles)
+    monkeypatch.setattr(batch, "translate_stage", lambda youtube_id, text, *args, **kwargs: text)
+    monkeypatch.setattr(batch, "rewrite_stage", lambda youtube_id, text, **kwargs: text)
+
+    first = batch.run_batch(["v1", "bad", "v2"], known=KnownVideos.load(db_name))
+    second = batch.run_batch(["v1", "bad", "v2", "v3"], known=KnownVideos.load(db_name))
+
+    assert [result.success for result in first] == [True, False, True]
+    # Ролик с ошибкой не записывается и обрабатывается снова.
+    assert [result.youtube_id for result in second] == ["bad", "v3"]
+    assert sorted(fetched) == ["bad", "bad", "v1", "v2", "v3"]
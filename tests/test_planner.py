@@ -0,0 +1,46 @@
+import pytest
+
+from rewrite.planner import (MODEL_LIMITS, MIN_OUTPUT_TOKENS, ContextOverflowError, plan_rewrite,
+                             count_tokens)
+
+
+def test_plan_scales_with_text():
+    """Функция проверяет, что max_tokens и стоимость растут с длиной текста."""
+
+    short = plan_rewrite("Короткий текст.", "gpt-4o-mini", "system", "{text}")
+    long = plan_rewrite("Длинный текст. " * 500, "gpt-4o-mini", "system", "{text}")
+
+    assert short.max_tokens == MIN_OUTPUT_TOKENS
+    assert long.max_tokens > short.max_tokens
+    assert long.input_tokens > count_tokens("Длинный текст. " * 500, "gpt-4o-mini")
+    assert long.cost > short.cost > 0
+    assert long.latency > short.latency
+    assert not long.truncated
+
+
+def test_plan_respects_model_limits():
+    """Функция проверяет ограничение max_tokens лимитом ответа модели."""
+
+    text = "Очень длинный текст. " * 5000
+    limits = MODEL_LIMITS["gpt-4o-mini"]
+
+    whole = plan_rewrite(text, "gpt-4o-mini", "system", "{text}")
+    sections = plan_rewrite(text, "gpt-4o-mini", "system", "{text}",
+                            section_tokens=3000, max_workers=4)
+
+    assert whole.max_tokens == limits.max_output_tokens
+    assert whole.truncated
+    assert sections.sections > 1
+    assert sections.max_tokens < whole.max_tokens
+    assert not sections.truncated
+
+
+def test_plan_rejects_request_without_room_for_answer():
+    """Функция проверяет ошибку, когда запрос занимает весь контекст модели."""
+
+    text = "word " * 200000
+
+    with pytest.raises(ContextOverflowError):
+        plan_rewrite(text, "gpt-4o-mini", "system", "{text}")
+    sections = plan_rewrite(text, "gpt-4o-mini", "system", "{text}", section_tokens=3000)
+    assert sections.max_tokens >= MIN_OUTPUT_TOKENS
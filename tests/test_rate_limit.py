@@ -0,0 +1,38 @@
+import time
+
+from utils.rate_limit import RateLimiter, TokenBucket
+
+
+def test_token_bucket():
+    """Функция проверяет выдачу и пополнение токенов."""
+
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() > 0
+    time.sleep(0.12)
+    assert bucket.try_acquire() == 0
+
+
+def test_limiter_units():
+    """Функция проверяет ограничение по количеству символов."""
+
+    limiter = RateLimiter("test", requests_per_second=100, units_per_minute=600)
+
+    assert limiter.acquire(600) == 0
+    started = time.monotonic()
+    limiter.acquire(2)
+    assert time.monotonic() - started >= 0.15
+
+
+def test_limiter_adapts_to_throttling():
+    """Функция проверяет снижение и восстановление скорости после 429."""
+
+    limiter = RateLimiter("test", requests_per_second=10)
+
+    limiter.on_throttle()
+    assert limiter._requests.rate == 5
+    for _ in range(20):
+        limiter.on_success()
+    assert limiter._requests.rate == 10
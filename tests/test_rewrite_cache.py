@@ -0,0 +1,47 @@
+import pytest
+
+from rewrite.cache import RewriteCache, rewrite_key
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    """Фикстура для создания кэша рерайтов во временной БД."""
+
+    return RewriteCache(str(tmp_path / "test.db"), max_entries=2)
+
+
+def test_rewrite_key_depends_on_parameters():
+    """Функция проверяет, что ключ зависит от всех параметров запроса."""
+
+    key = rewrite_key("model", "system", "{text}", "text", 0.7, 1500)
+
+    assert key == rewrite_key("model", "system", "{text}", "text", 0.7, 1500)
+    assert key != rewrite_key("model", "system", "{text}", "text", 0.5, 1500)
+    assert key != rewrite_key("model", "system", "{text}", "text", 0.7, 1000)
+    assert key != rewrite_key("other", "system", "{text}", "text", 0.7, 1500)
+
+
+def test_cache_get_set(cache):
+    """Функция проверяет сохранение и чтение результата."""
+
+    assert cache.get("key") is None
+    cache.set("key", "result")
+    assert cache.get("key") == "result"
+
+
+def test_cache_ttl(tmp_path):
+    """Функция проверяет, что устаревшие записи не возвращаются."""
+
+    cache = RewriteCache(str(tmp_path / "test.db"), ttl_days=-1)
+    cache.set("key", "result")
+    assert cache.get("key") is None
+
+
+def test_cache_max_entries(cache):
+    """Функция проверяет ограничение количества записей."""
+
+    for index in range(3):
+        cache.set(f"key{index}", "result")
+
+    stored = [key for key in ("key0", "key1", "key2") if cache.get(key)]
+    assert len(stored) == 2
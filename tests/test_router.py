@@ -0,0 +1,106 @@
+import time
+import pytest
+
+pytest.importorskip("requests")
+
+from translate.router import TranslatorRouter, OPEN, HALF_OPEN, CLOSED
+from translate.translate import TranslationError
+
+
+def upper(segments, src, dest):
+    return [segment.upper() for segment in segments]
+
+
+def test_router_falls_back_and_opens_circuit():
+    """Функция проверяет переход на другой переводчик и отключение сломанного."""
+
+    calls = {"broken": 0}
+
+    def broken(segments, src, dest):
+        calls["broken"] += 1
+        raise TranslationError("down")
+
+    router = TranslatorRouter({"broken": broken, "ok": upper}, failure_threshold=2,
+                              reset_timeout=60)
+    # Отключенный переводчик идет первым, пока у него нет статистики.
+    router.stats["ok"].seconds_per_char = 1.0
+    for _ in range(3):
+        result = router.translate("hello world.", src="en", dest="ru")
+        assert result.text == "HELLO WORLD."
+        assert result.translators == {"ok": 1}
+    assert calls["broken"] == 2
+    assert router.stats["broken"].state == OPEN
+
+
+def test_router_half_open_recovers():
+    """Функция проверяет возврат переводчика после пробного запроса."""
+
+    router = TranslatorRouter({"ok": upper}, reset_timeout=0)
+    router.stats["ok"].state = OPEN
+    router.stats["ok"].opened_at = time.monotonic()
+    assert router._available() == ["ok"]
+    assert router.stats["ok"].state == HALF_OPEN
+    router._release_trials(["ok"])
+    router.translate("text", src="en", dest="ru")
+    assert router.stats["ok"].state == CLOSED
+
+
+def test_router_hedges_slow_backend():
+    """Функция проверяет дублирование медленного запроса."""
+
+    def slow(segments, src, dest):
+        time.sleep(1)
+        return segments
+
+    router = TranslatorRouter({"slow": slow, "fast": upper}, hedge_after=0.05)
+    translations, name = router.translate_batch(["a"], src="en", dest="ru")
+    assert (translations, name) == (["A"], "fast")
+
+
+def test_router_half_open_single_trial():
+    """Функция проверяет, что пробный запрос достается только одной пачке."""
+
+    router = TranslatorRouter({"fast": upper, "trial": upper}, reset_timeout=0)
+    router.stats["fast"].seconds_per_char = 0.0
+    router.stats["trial"].seconds_per_char = 1.0
+    router.stats["trial"].state = OPEN
+
+    assert router._available() == ["fast", "trial"]
+    assert router._available() == ["fast"]
+
+    # Пачку перевел быстрый переводчик, пробный запрос освобождается.
+    router._release_trials(["trial"])
+    assert router.translate_batch(["a"], src="en", dest="ru") == (["A"], "fast")
+    assert router.stats["trial"].trial_running is False
+    assert router._available() == ["fast", "trial"]
+
+
+def test_router_hedges_in_shared_executor():
+    """Функция проверяет, что дублируемые запросы выполняются в общем пуле роутера."""
+
+    def slow(segments, src, dest):
+        time.sleep(0.2)
+        return segments
+
+    router = TranslatorRouter({"slow": slow, "fast": upper}, hedge_after=0.01, max_workers=2)
+    router.stats["slow"].seconds_per_char = 0.0
+    router.stats["fast"].seconds_per_char = 1.0
+    for _ in range(3):
+        assert router.translate_batch(["a"], src="en", dest="ru") == (["A"], "fast")
+    executor = router._executor
+
+    assert executor is not None and executor._max_workers == 4
+    router.close()
+    assert router._executor is None
+    assert router.stats["slow"].calls == 3
+
+
+def test_router_raises_when_all_fail():
+    """Функция проверяет ошибку, когда все переводчики недоступны."""
+
+    def broken(segments, src, dest):
+        raise TranslationError("down")
+
+    router = TranslatorRouter({"broken": broken})
+    with pytest.raises(TranslationError):
+        router.translate("text", src="en", dest="ru")
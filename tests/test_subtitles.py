@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+from content_parser.subtitles import (Subtitles, SubtitleLine, select_transcript,
+                                      MANUAL, GENERATED, TRANSLATED)
+
+
+def transcript(language_code, is_generated, translation_languages=()):
+    """Функция создает заглушку субтитров YouTube."""
+
+    item = SimpleNamespace(language_code=language_code, is_generated=is_generated,
+                           is_translatable=bool(translation_languages),
+                           translation_languages=[{"language_code": code}
+                                                  for code in translation_languages])
+    item.translate = lambda code: transcript(code, True)
+    return item
+
+
+def test_subtitles_lines_and_timings():
+    """Функция проверяет хранение строк и таймингов."""
+
+    subtitles = Subtitles.from_entries([{"text": "hello", "start": 0.0, "duration": 1.5},
+                                        {"text": "world", "start": 1.5, "duration": 2.0}], "en")
+
+    assert subtitles.text == "hello\nworld"
+    assert len(subtitles) == 2
+    assert subtitles[1] == SubtitleLine("world", 1.5, 2.0)
+    assert subtitles[-1].end == 3.5
+    assert list(subtitles)[0].text == "hello"
+    assert subtitles.line_at(subtitles.text.index("world")) == 1
+    assert subtitles.time_at(2) == 0.0
+    assert subtitles.duration == 3.5
+
+
+def test_select_transcript_preferences():
+    """Функция проверяет порядок выбора субтитров."""
+
+    en_manual = transcript("en", False, ["ru"])
+    ru_auto = transcript("ru", True)
+
+    assert select_transcript([en_manual, ru_auto])[1:] == ("ru", GENERATED)
+    assert select_transcript([en_manual])[1:] == ("en", MANUAL)
+
+    chosen, language_code, kind = select_transcript([transcript("de", False, ["ru"])])
+    assert (chosen.language_code, language_code, kind) == ("ru", "ru", TRANSLATED)
+    assert select_transcript([transcript("de", False)]) is None
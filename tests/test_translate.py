@@ -0,0 +1,87 @@
+import pytest
+import requests
+
+from translate import translate
+from translate.translate import TranslationError, pack_batches, yandex_translate_segments
+
+
+class FakeResponse:
+    """Ответ Yandex Translate API для тестов."""
+
+    def __init__(self, status_code, texts=()):
+        self.status_code = status_code
+        self._texts = texts
+
+    def json(self):
+        return {"translations": [{"text": text.upper()} for text in self._texts]}
+
+
+@pytest.fixture()
+def requests_log(monkeypatch):
+    """Фикстура подменяет transport.post и записывает тексты каждого запроса."""
+
+    log = []
+
+    def install(reply):
+        def post(url, json, **kwargs):
+            log.append(json["texts"])
+            return reply(json["texts"])
+        monkeypatch.setattr(translate.transport, "post", post)
+        return log
+
+    return install
+
+
+def test_pack_batches():
+    """Функция проверяет упаковку сегментов в пачки с сохранением порядка."""
+
+    assert pack_batches(["aaa", "bb", "c", "dddd", "eeeeeeeeee", "f"], 6) == \
+        [["aaa", "bb", "c"], ["dddd"], ["eeeeeeeeee"], ["f"]]
+    assert pack_batches([], 6) == []
+
+
+def test_yandex_segments_keep_order(requests_log, monkeypatch):
+    """Функция проверяет порядок переводов при параллельной отправке пачек."""
+
+    monkeypatch.setattr(translate, "YANDEX_MAX_BATCH_CHARS", 4)
+    log = requests_log(lambda texts: FakeResponse(200, texts))
+    segments = [f"s{index}" for index in range(10)]
+
+    assert yandex_translate_segments(segments, max_workers=4) == \
+        [segment.upper() for segment in segments]
+    assert len(log) == 5
+
+
+def test_yandex_splits_rejected_batch(requests_log):
+    """Функция проверяет деление пачки, которую API отклонил из-за содержимого."""
+
+    log = requests_log(lambda texts: FakeResponse(400 if "bad" in texts and len(texts) > 1
+                                                  else 200, texts))
+
+    assert yandex_translate_segments(["a", "bad", "c", "d"]) == ["A", "BAD", "C", "D"]
+    assert log[0] == ["a", "bad", "c", "d"]
+    assert len(log) == 5
+
+
+@pytest.mark.parametrize("status", [401, 403, 429, 500])
+def test_yandex_does_not_split_on_auth_or_quota(requests_log, status):
+    """Функция проверяет, что ошибки ключа, квоты и сервера не делят пачку."""
+
+    log = requests_log(lambda texts: FakeResponse(status))
+
+    with pytest.raises(TranslationError):
+        yandex_translate_segments(["a", "b", "c", "d"])
+    assert len(log) == 1
+
+
+def test_yandex_does_not_split_on_network_error(requests_log):
+    """Функция проверяет, что сетевая ошибка не делит пачку."""
+
+    def reply(texts):
+        raise requests.exceptions.ConnectionError("нет сети")
+
+    log = requests_log(reply)
+
+    with pytest.raises(TranslationError):
+        yandex_translate_segments(["a", "b", "c", "d"])
+    assert len(log) == 1
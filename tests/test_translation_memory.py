@@ -0,0 +1,49 @@
+import sqlite3
+import pytest
+
+from database import initialize_db, TranslationMemory
+
+
+@pytest.fixture()
+def memory(tmp_path):
+    """Фикстура для создания памяти переводов во временной БД."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    return TranslationMemory(db_name, max_entries=2)
+
+
+def test_lookup_returns_only_stored(memory):
+    """Функция проверяет, что из памяти возвращаются только сохраненные сегменты."""
+
+    memory.store([("Hello  world.", "Привет, мир.")], "en", "ru", "yandex")
+
+    found = memory.lookup(["Hello world.", "Unknown."], "en", "ru", "yandex")
+
+    assert found == {0: "Привет, мир."}
+    assert memory.lookup(["Hello world."], "en", "ru", "mymemory") == {}
+    stats = memory.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_store_creates_reference_rows(memory):
+    """Функция проверяет заполнение таблиц languages и translators."""
+
+    memory.store([("One.", "Один.")], "en", "ru", "yandex")
+
+    with sqlite3.connect(memory.db_name) as conn:
+        languages = {row[0] for row in conn.execute("SELECT code FROM languages")}
+        translators = {row[0] for row in conn.execute("SELECT translator FROM translators")}
+    assert languages == {"en", "ru"}
+    assert translators == {"yandex"}
+
+
+def test_evict_keeps_max_entries(memory):
+    """Функция проверяет ограничение размера памяти переводов."""
+
+    memory.store([("One.", "Один."), ("Two.", "Два."), ("Three.", "Три.")],
+                 "en", "ru", "yandex")
+
+    assert memory.evict() == 1
+    assert memory.stats()["entries"] == 2
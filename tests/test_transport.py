@@ -0,0 +1,128 @@
+import pytest
+import requests
+
+from email.utils import formatdate
+from utils import transport
+from utils.transport import RetryPolicy
+
+
+class FakeResponse:
+    """Ответ сервера для тестов."""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """Сессия, возвращающая заранее заданные ответы или исключения."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls.append((method, url, timeout))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture()
+def fake_session(monkeypatch):
+    """Фикстура подменяет сессию и паузы транспорта, паузы записываются."""
+
+    delays = []
+
+    def install(*replies):
+        session = FakeSession(replies)
+        monkeypatch.setattr(transport, "get_session", lambda url: session)
+        return session
+
+    monkeypatch.setattr(transport.time, "sleep", delays.append)
+    install.delays = delays
+    return install
+
+
+def test_retries_retryable_status(fake_session):
+    """Функция проверяет повтор при 503 и учет попыток в статистике."""
+
+    session = fake_session(FakeResponse(503), FakeResponse(200))
+    before = transport.stats()
+
+    response = transport.get("https://api.example.com/x", retry=RetryPolicy(backoff_time=1))
+
+    after = transport.stats()
+    assert response.status_code == 200
+    assert len(session.calls) == 2
+    assert session.calls[0][2] == transport.DEFAULT_TIMEOUT
+    assert 0.5 <= fake_session.delays[0] <= 1
+    assert after["requests"] - before["requests"] == 2
+    assert after["retries"] - before["retries"] == 1
+    assert after["failures"] == before["failures"]
+
+
+def test_honours_retry_after(fake_session):
+    """Функция проверяет паузу по заголовку Retry-After, ограниченную max_backoff."""
+
+    fake_session(FakeResponse(429, {"Retry-After": "7"}),
+                 FakeResponse(429, {"Retry-After": "600"}), FakeResponse(200))
+
+    transport.post("https://api.example.com/x", retry=RetryPolicy(max_backoff=60))
+
+    assert fake_session.delays == [7, 60]
+
+
+def test_returns_last_response_when_attempts_exhausted(fake_session):
+    """Функция проверяет, что без успешной попытки возвращается последний ответ."""
+
+    session = fake_session(FakeResponse(500), FakeResponse(500), FakeResponse(502))
+    before = transport.stats()
+
+    response = transport.get("https://api.example.com/x", retry=RetryPolicy(retries=3))
+
+    assert response.status_code == 502
+    assert len(session.calls) == 3
+    assert transport.stats()["failures"] - before["failures"] == 1
+
+
+def test_does_not_retry_client_errors(fake_session):
+    """Функция проверяет, что ответы вне retry_statuses не повторяются."""
+
+    session = fake_session(FakeResponse(401), FakeResponse(200))
+
+    assert transport.get("https://api.example.com/x").status_code == 401
+    assert len(session.calls) == 1
+    assert fake_session.delays == []
+
+
+def test_network_errors(fake_session):
+    """Функция проверяет повтор сетевых ошибок и исключение после последней попытки."""
+
+    fake_session(requests.exceptions.ConnectionError("reset"), FakeResponse(200))
+    assert transport.get("https://api.example.com/x").status_code == 200
+
+    fake_session(requests.exceptions.Timeout("slow"), requests.exceptions.Timeout("slow"))
+    with pytest.raises(requests.exceptions.Timeout):
+        transport.get("https://api.example.com/x", retry=RetryPolicy(retries=2))
+
+
+def test_retry_after_delay_formats():
+    """Функция проверяет разбор Retry-After в секундах и в виде HTTP-даты."""
+
+    assert transport.retry_after_delay(FakeResponse(429, {"Retry-After": "3"})) == 3
+    assert transport.retry_after_delay(FakeResponse(429)) is None
+    assert transport.retry_after_delay(FakeResponse(429, {"Retry-After": "soon"})) is None
+    date = formatdate(transport.time.time() + 30, usegmt=True)
+    assert 25 <= transport.retry_after_delay(FakeResponse(429, {"Retry-After": date})) <= 30
+
+
+def test_sessions_shared_per_host():
+    """Функция проверяет, что запросы к одному хосту используют одну сессию."""
+
+    first = transport.get_session("https://host.example.com/a")
+
+    assert transport.get_session("https://host.example.com/b?q=1") is first
+    assert transport.get_session("https://other.example.com/a") is not first
+    transport.close()
@@ -0,0 +1,59 @@
+import pytest
+
+from utils.utils import iter_segments, split_text, estimate_tokens
+
+
+def test_iter_segments_offsets():
+    """Функция проверяет, что смещения сегментов указывают на исходный текст."""
+
+    text = "First sentence here. Second one is longer! Third?  Tail without end"
+    segments = list(iter_segments(text, 25))
+
+    assert segments
+    for segment in segments:
+        assert text[segment.start:segment.end] == segment.text
+        assert len(segment.text) <= 25
+
+
+def test_iter_segments_prefers_sentence_boundary():
+    """Функция проверяет разрез по границе предложения, а не посреди слова."""
+
+    text = "Hello world. This is a test sentence."
+    segments = [segment.text for segment in iter_segments(text, 20)]
+
+    assert segments[0] == "Hello world."
+    assert " ".join(segments) == text
+
+
+def test_iter_segments_window_ends_on_space():
+    """Функция проверяет, что окно, кончающееся на пробеле, не режется по раннему предложению."""
+
+    text = "Hi. " + "abcd " * 20
+    segments = [segment.text for segment in iter_segments(text, 38)]
+
+    assert segments[0] == text[:38].rstrip()
+    assert all(len(segment) > 30 for segment in segments[:-1])
+    assert " ".join(segments) == text.strip()
+
+
+def test_iter_segments_long_word():
+    """Функция проверяет разрез сплошного текста без пробелов."""
+
+    assert split_text("abcdefghij", 3) == ["abc", "def", "ghi", "j"]
+
+
+def test_iter_segments_tokens():
+    """Функция проверяет ограничение длины сегментов в токенах."""
+
+    text = "Привет мир. Как дела? Хорошо. " * 20
+    for segment in iter_segments(text, 10, unit="tokens"):
+        assert estimate_tokens(segment.text) <= 10
+
+
+def test_iter_segments_invalid_args():
+    """Функция проверяет обработку некорректных параметров."""
+
+    with pytest.raises(ValueError):
+        list(iter_segments("text", 0))
+    with pytest.raises(ValueError):
+        list(iter_segments("text", 10, unit="words"))
@@ -0,0 +1,58 @@
+import os
+import time
+import signal
+import threading
+import pytest
+
+from pipeline import workers
+from pipeline.workers import Supervisor, WorkerOptions
+
+
+def flaky_worker(stage, options):
+    """Функция воркера: первый запуск падает, следующие ждут SIGTERM и пишут отметку."""
+
+    marker = os.path.join(options.db_name, f"{stage}.started")
+    first = not os.path.exists(marker)
+    with open(marker, "a") as file:
+        file.write("x")
+    if first:
+        os._exit(3)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    stop.wait(30)
+    with open(os.path.join(options.db_name, f"{stage}.drained"), "w") as file:
+        file.write("ok")
+
+
+def test_supervisor_restarts_and_drains(tmp_path, monkeypatch):
+    """Функция проверяет перезапуск упавшего воркера и остановку с дообработкой."""
+
+    monkeypatch.setattr(workers, "RESTART_DELAY", 0.1)
+    monkeypatch.setattr(workers, "CHECK_INTERVAL", 0.1)
+    supervisor = Supervisor({"fetch": 1}, WorkerOptions(db_name=str(tmp_path)),
+                            drain_timeout=30, target=flaky_worker)
+
+    def stop_when_restarted():
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            marker = tmp_path / "fetch.started"
+            if marker.exists() and marker.read_text() == "xx":
+                time.sleep(0.5)
+                break
+            time.sleep(0.1)
+        supervisor.stop()
+
+    threading.Thread(target=stop_when_restarted, daemon=True).start()
+    restarts = supervisor.run(install_signals=False)
+
+    assert restarts == {"fetch-0": 1}
+    assert (tmp_path / "fetch.drained").read_text() == "ok"
+
+
+def test_supervisor_validates_stages():
+    """Функция проверяет проверку этапов и каналов."""
+
+    with pytest.raises(ValueError):
+        Supervisor({"unknown": 1})
+    with pytest.raises(ValueError):
+        Supervisor({"publish": 1})
@@ -1,10 +1,160 @@
+import sqlite3
+import threading
 import pytest
 
-from unittest.mock import patch
 from publish import publish_to_zen
+from database import initialize_db, insert_many, Channel, Rewrite
 
 
-def test_publish_to_zen_success():
-    """Функция тестирует успешность публикации статьи через API Яндекс.Дзен."""
+def test_import_starts_nothing():
+    """Функция проверяет, что импорт модуля не запускает браузер."""
 
-    pass
+    assert publish_to_zen._geckodriver_path.cache_info().currsize == 0
+    assert not hasattr(publish_to_zen, "driver")
+
+
+def test_split_title():
+    """Функция проверяет выделение заголовка статьи."""
+
+    assert publish_to_zen.split_title("Заголовок\nТекст статьи.") == ("Заголовок", "Текст статьи.")
+    assert publish_to_zen.split_title("Первое. Второе.") == ("Первое", "Второе.")
+
+
+class FakeDriver:
+    """Заглушка браузера: запоминает канал и закрытие."""
+
+    def __init__(self, channel_id):
+        self.channel_id = channel_id
+        self.closed = False
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture()
+def db_name(tmp_path):
+    """Фикстура для создания БД с двумя каналами и очередью публикаций."""
+
+    db_name = str(tmp_path / "test.db")
+    initialize_db(db_name)
+    insert_many([Channel("one", "https://dzen.ru/one", None, None),
+                 Channel("two", "https://dzen.ru/two", None, None)], db_name=db_name)
+    insert_many([Rewrite(f"Статья {i}. Текст.", None, None, None, "now", "now")
+                 for i in range(6)], db_name=db_name)
+    with sqlite3.connect(db_name) as conn:
+        conn.executemany("INSERT INTO publications (rewrite_id, channel_id) VALUES (?, ?)",
+                         [(rewrite_id, 1 + rewrite_id % 2) for rewrite_id in range(1, 7)])
+        conn.execute("INSERT INTO publications (rewrite_id, channel_id, publish_date) "
+                     "VALUES (2, 2, '2999-01-01')")
+    return db_name
+
+
+def test_publish_pending(db_name):
+    """Функция проверяет публикацию очереди с пулом браузеров на канал."""
+
+    created = []
+    lock = threading.Lock()
+
+    def factory(channel_id):
+        with lock:
+            created.append(FakeDriver(channel_id))
+            return created[-1]
+
+    def publish(driver, channel_url, text):
+        if text.startswith("Статья 3."):
+            raise RuntimeError("editor error")
+        return f"{channel_url}/a/{text.split('.')[0][-1]}"
+
+    totals = publish_to_zen.publish_pending(db_name, publish=publish, factory=factory,
+                                            pool_size=2)
+
+    assert totals == {"published": 5, "failed": 1}
+    assert all(driver.closed for driver in created)
+    for channel_id in (1, 2):
+        assert sum(driver.channel_id == channel_id for driver in created) <= 3
+    with sqlite3.connect(db_name) as conn:
+        rows = dict(conn.execute("""
+            SELECT p.rewrite_id || '@' || p.channel_id, s.status || ' ' || IFNULL(p.published_url, '')
+            FROM publications p LEFT JOIN publication_status s ON s.id = p.status_id
+            """).fetchall())
+    assert rows["1@2"] == "published https://dzen.ru/two/a/0"
+    # Неудачная публикация ждет повтора (RETRY_DELAY) в очереди.
+    assert rows["4@1"] == "pending "
+    # Публикация с датой в будущем остается в очереди.
+    assert publish_to_zen.pending_channels(db_name) == []
+    with sqlite3.connect(db_name) as conn:
+        assert conn.execute("SELECT status_id FROM publications "
+                            "WHERE publish_date = '2999-01-01'").fetchone() == (None,)
+
+
+def test_publisher_reuses_browsers(db_name):
+    """Функция проверяет, что браузеры каналов переиспользуются между запусками."""
+
+    created = []
+
+    def factory(channel_id):
+        created.append(FakeDriver(channel_id))
+        return created[-1]
+
+    def publish(driver, channel_url, text):
+        return f"{channel_url}/a/{text.split('.')[0][-1]}"
+
+    publisher = publish_to_zen.Publisher(db_name, publish=publish, factory=factory, pool_size=1)
+    assert publisher.run() == {"published": 6, "failed": 0}
+    with sqlite3.connect(db_name) as conn:
+        conn.execute("INSERT INTO publications (rewrite_id, channel_id) VALUES (1, 1), (4, 2)")
+    assert publisher.run() == {"published": 2, "failed": 0}
+
+    assert sorted(driver.channel_id for driver in created) == [1, 2]
+    assert not any(driver.closed for driver in created)
+    publisher.close()
+    assert all(driver.closed for driver in created)
+
+
+def test_failed_publication_retries(db_name, monkeypatch):
+    """Функция проверяет повтор неудачной публикации и статус failed после MAX_ATTEMPTS."""
+
+    attempts = []
+
+    def publish(driver, channel_url, text):
+        if text.startswith("Статья 3."):
+            attempts.append(text)
+            raise RuntimeError("editor error")
+        return f"{channel_url}/a"
+
+    def status():
+        with sqlite3.connect(db_name) as conn:
+            return conn.execute("""
+                SELECT s.status, p.attempts FROM publications p
+                JOIN publication_status s ON s.id = p.status_id WHERE p.rewrite_id = 4
+                """).fetchone()
+
+    publish_to_zen.publish_pending(db_name, publish=publish, factory=FakeDriver)
+    assert status() == ("pending", 1)
+    # До истечения RETRY_DELAY публикация не повторяется.
+    assert publish_to_zen.publish_pending(db_name, publish=publish, factory=FakeDriver) == \
+        {"published": 0, "failed": 0}
+
+    monkeypatch.setattr(publish_to_zen, "RETRY_DELAY", publish_to_zen.timedelta(0))
+    publish_to_zen.publish_pending(db_name, publish=publish, factory=FakeDriver)
+    assert len(attempts) == publish_to_zen.MAX_ATTEMPTS
+    assert status() == ("failed", publish_to_zen.MAX_ATTEMPTS)
+
+    assert publish_to_zen.retry_failed(db_name) == 1
+    assert status() == ("pending", 0)
+    assert publish_to_zen.pending_channels(db_name) == [(1, "https://dzen.ru/one")]
+
+
+def test_publish_channel_logs_worker_errors(db_name, monkeypatch, caplog):
+    """Функция проверяет, что ошибка потока публикации не теряется."""
+
+    def finish_publication(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(publish_to_zen, "finish_publication", finish_publication)
+    pool = publish_to_zen.BrowserPool(lambda: FakeDriver(1), size=1)
+
+    publish_to_zen.publish_channel(1, pool, lambda driver, url, text: f"{url}/a", db_name)
+    pool.close()
+
+    assert "database is locked" in caplog.text
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+from content_parser import youtube_parser
+from content_parser.search_cache import SearchCache, search_key
+
+
+def fake_api(pages, calls):
+    """Функция создает заглушку transport.get, отдающую страницы выдачи по токену."""
+
+    def get(url, params=None, headers=None, **kwargs):
+        calls.append((params["q"], params.get("pageToken"), dict(headers or {})))
+        page = pages[(params["q"], params.get("pageToken"))]
+        if headers and headers.get("If-None-Match") == page["etag"]:
+            return SimpleNamespace(status_code=304, headers={}, json=lambda: {})
+        return SimpleNamespace(status_code=200, headers={}, json=lambda: page)
+
+    return get
+
+
+def page(etag, ids, next_token=None):
+    """Функция создает ответ метода search."""
+
+    data = {"etag": etag, "items": [{"id": {"videoId": video_id}, "snippet": {"title": video_id}}
+                                    for video_id in ids]}
+    if next_token:
+        data["nextPageToken"] = next_token
+    return data
+
+
+PAGES = {
+    ("cats", None): page("c1", ["a", "b"], "t2"),
+    ("cats", "t2"): page("c2", ["c", "d"], "t3"),
+    ("cats", "t3"): page("c3", ["e"]),
+    ("dogs", None): page("d1", ["b", "x"]),
+}
+
+
+def test_search_follows_pages_and_dedupes(monkeypatch):
+    """Функция проверяет переход по страницам и отсев повторов между запросами."""
+
+    calls = []
+    monkeypatch.setattr(youtube_parser.transport, "get", fake_api(PAGES, calls))
+
+    ids = youtube_parser.youtube_video_id_parser("key", ["cats", "dogs"], 10)
+
+    assert sorted(ids) == ["a", "b", "c", "d", "e", "x"]
+    assert len(calls) == 4
+
+
+def test_search_stops_early(monkeypatch):
+    """Функция проверяет, что лишние страницы не запрашиваются."""
+
+    calls = []
+    monkeypatch.setattr(youtube_parser.transport, "get", fake_api(PAGES, calls))
+
+    assert youtube_parser.youtube_video_id_parser("key", "cats", 2) == ["a", "b"]
+    assert calls == [("cats", None, {})]
+
+
+def test_search_uses_etag_cache(monkeypatch):
+    """Функция проверяет повторный поиск через If-None-Match."""
+
+    calls = []
+    monkeypatch.setattr(youtube_parser.transport, "get", fake_api(PAGES, calls))
+    cache = SearchCache()
+
+    first = youtube_parser.youtube_video_id_parser("key", "dogs", 5, cache=cache)
+    second = youtube_parser.youtube_video_id_parser("key", "dogs", 5, cache=cache)
+
+    assert first == second == ["b", "x"]
+    assert calls[-1][2] == {"If-None-Match": "d1"}
+
+
+def test_search_cache_persists(tmp_path):
+    """Функция проверяет хранение ответов в БД без учета API ключа."""
+
+    db_name = str(tmp_path / "test.db")
+    key = search_key({"q": "cats", "key": "secret"})
+    assert key == search_key({"q": "cats", "key": "other"})
+
+    SearchCache(db_name).set(key, "etag", {"items": []})
+
+    assert SearchCache(db_name).get(key) == ("etag", {"items": []})
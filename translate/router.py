@@ -0,0 +1,325 @@
+import time
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, NamedTuple, Optional
+
+from database.reference import get_translator_id
+from database.translation_memory import TranslationMemory
+from translate.translate import (TranslationError, YANDEX_MAX_BATCH_CHARS, YANDEX_SEGMENT_LEN,
+                                 pack_batches, translate_segments, yandex_translate_segments,
+                                 mymemory_translate_segments)
+from utils.utils import iter_segments
+
+
+logger = logging.getLogger(__name__)
+
+# Сглаживание скользящей средней задержки.
+LATENCY_ALPHA = 0.3
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT = 60
+MAX_WORKERS = 4
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class RoutedSegment(NamedTuple):
+    source: str
+    translation: str
+    translator: str
+    translator_id: Optional[int] = None
+
+
+class RoutedTranslation(NamedTuple):
+    text: str
+    segments: list[RoutedSegment]
+
+    @property
+    def translators(self) -> dict[str, int]:
+        """Количество сегментов, переведенных каждым переводчиком."""
+        counts: dict[str, int] = {}
+        for segment in self.segments:
+            counts[segment.translator] = counts.get(segment.translator, 0) + 1
+        return counts
+
+
+class BackendStats:
+    """Статистика и состояние автомата отключения одного переводчика."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds_per_char: Optional[float] = None
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_running = False
+
+
+def _strict(translate: Callable) -> Callable:
+    """Оборачивает функцию перевода так, что непереведенный сегмент - ошибка."""
+    def wrapper(segments: list[str], src: str, dest: str) -> list[str]:
+        translated = translate(segments, src, dest)
+        if any(translation is None for translation in translated):
+            raise TranslationError("Часть сегментов не переведена.")
+        return translated
+    return wrapper
+
+
+DEFAULT_BACKENDS = {
+    "yandex": yandex_translate_segments,
+    "mymemory": _strict(mymemory_translate_segments),
+}
+
+
+class TranslatorRouter:
+    """
+    Распределяет пачки сегментов между переводчиками: каждая пачка уходит
+    самому быстрому исправному переводчику (по скользящей средней задержке
+    на символ). После failure_threshold ошибок подряд переводчик
+    отключается на reset_timeout секунд, затем получает одну пробную пачку.
+    Если задан hedge_after, пачка, не переведенная за это время,
+    дублируется следующему переводчику и берется первый результат.
+    """
+
+    def __init__(self, backends: Optional[dict[str, Callable]] = None,
+                 failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT,
+                 hedge_after: Optional[float] = None, max_workers=MAX_WORKERS,
+                 db_name: Optional[str] = None):
+        """
+        Args:
+            backends(dict[str, Callable]): Переводчики: название ->
+            функция (segments, src, dest) -> list[str], бросающая исключение
+            при ошибке. По умолчанию Yandex и MyMemory.
+            failure_threshold(int): Ошибок подряд до отключения переводчика.
+            reset_timeout(float): Время отключения в секундах.
+            hedge_after(float): Через сколько секунд дублировать медленную
+            пачку другому переводчику; None - не дублировать.
+            max_workers(int): Количество пачек, переводимых одновременно.
+            db_name(str): БД для определения id переводчиков в таблице
+            translators; None - id не определяются.
+        """
+        self.backends = dict(backends or DEFAULT_BACKENDS)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_after = hedge_after
+        self.max_workers = max_workers
+        self.db_name = db_name
+        self.stats = {name: BackendStats(name) for name in self.backends}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _hedge_executor(self) -> ThreadPoolExecutor:
+        """
+        Общий пул потоков для дублируемых запросов. Проигравший запрос
+        отменить нельзя, он дорабатывает в пуле, поэтому размер пула
+        ограничивает количество одновременных запросов ко всем переводчикам.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers * len(self.backends),
+                    thread_name_prefix="translator-hedge")
+            return self._executor
+
+    def close(self) -> None:
+        """Останавливает пул дублируемых запросов, дожидаясь незавершенных."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _available(self) -> list[str]:
+        """
+        Возвращает исправные переводчики, самые быстрые первыми. Пробный
+        запрос полуоткрытого переводчика занимается сразу при выборе, чтобы
+        его не получили одновременно несколько пачек; невостребованный
+        пробный запрос освобождается _release_trials.
+        """
+        now = time.monotonic()
+        available = []
+        with self._lock:
+            for name, stats in self.stats.items():
+                if stats.state == OPEN and now - stats.opened_at >= self.reset_timeout:
+                    stats.state = HALF_OPEN
+                    stats.trial_running = False
+                if stats.state == OPEN or (stats.state == HALF_OPEN and stats.trial_running):
+                    continue
+                if stats.state == HALF_OPEN:
+                    stats.trial_running = True
+                available.append(name)
+        # Переводчики без статистики идут первыми, чтобы ее накопить.
+        return sorted(available, key=lambda name: self.stats[name].seconds_per_char or 0.0)
+
+    def _release_trials(self, names: list[str]) -> None:
+        """Освобождает занятые _available пробные запросы, которые не понадобились."""
+        with self._lock:
+            for name in names:
+                if self.stats[name].state == HALF_OPEN:
+                    self.stats[name].trial_running = False
+
+    def _record(self, name: str, chars: int, elapsed: Optional[float]) -> None:
+        """Учитывает результат вызова: elapsed=None означает ошибку."""
+        with self._lock:
+            stats = self.stats[name]
+            stats.calls += 1
+            stats.trial_running = False
+            if elapsed is None:
+                stats.errors += 1
+                stats.consecutive_failures += 1
+                if stats.state == HALF_OPEN or stats.consecutive_failures >= self.failure_threshold:
+                    stats.state = OPEN
+                    stats.opened_at = time.monotonic()
+                    logger.warning(f"Переводчик {name} отключен на {self.reset_timeout} секунд.")
+                return
+            per_char = elapsed / max(1, chars)
+            if stats.seconds_per_char is None:
+                stats.seconds_per_char = per_char
+            else:
+                stats.seconds_per_char += LATENCY_ALPHA * (per_char - stats.seconds_per_char)
+            stats.consecutive_failures = 0
+            stats.state = CLOSED
+
+    def _call(self, name: str, segments: list[str], src: str, dest: str,
+              memory: Optional[TranslationMemory]) -> list[str]:
+        chars = sum(len(segment) for segment in segments)
+        started = time.monotonic()
+        try:
+            translated = translate_segments(segments, lambda batch: self.backends[name](
+                batch, src, dest), src, dest, name, memory)
+        except Exception as e:
+            self._record(name, chars, None)
+            logger.warning(f"Ошибка переводчика {name}: {e}")
+            raise
+        self._record(name, chars, time.monotonic() - started)
+        return translated
+
+    def translate_batch(self, segments: list[str], src='en', dest='ru',
+                        memory: Optional[TranslationMemory] = None) -> tuple[list[str], str]:
+        """
+        Переводит пачку сегментов самым быстрым исправным переводчиком, при
+        ошибке - следующим.
+        Args:
+            segments(list[str]): Сегменты текста.
+            src(str): Язык исходного текста.
+            dest(str): Язык перевода.
+            memory(TranslationMemory): Память переводов.
+        Returns:
+            tuple[list[str], str]: Переводы сегментов и название переводчика.
+        Raises:
+            TranslationError: Если пачку не перевел ни один переводчик.
+        """
+        candidates = self._available()
+        if not candidates:
+            raise TranslationError("Нет доступных переводчиков.")
+        remaining = list(candidates)
+        try:
+            if self.hedge_after is not None and len(candidates) > 1:
+                return self._hedged(remaining, segments, src, dest, memory)
+
+            while remaining:
+                name = remaining.pop(0)
+                try:
+                    return self._call(name, segments, src, dest, memory), name
+                except Exception:
+                    continue
+            raise TranslationError("Пачку сегментов не удалось перевести ни одним переводчиком.")
+        finally:
+            self._release_trials(remaining)
+
+    def _hedged(self, remaining: list[str], segments: list[str], src: str, dest: str,
+                memory: Optional[TranslationMemory]) -> tuple[list[str], str]:
+        """
+        Переводит пачку с дублированием медленного запроса следующему
+        переводчику. Запущенные переводчики удаляются из remaining.
+        """
+        executor = self._hedge_executor()
+        pending = {}
+
+        def launch():
+            name = remaining.pop(0)
+            pending[executor.submit(self._call, name, segments, src, dest, memory)] = name
+
+        launch()
+        while pending:
+            timeout = self.hedge_after if remaining else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.info(f"Переводчик {list(pending.values())[0]} отвечает медленно, "
+                            f"запрос дублируется {remaining[0]}.")
+                launch()
+                continue
+            for future in done:
+                name = pending.pop(future)
+                if future.exception() is None:
+                    return future.result(), name
+            if not pending and remaining:
+                launch()
+        raise TranslationError("Пачку сегментов не удалось перевести ни одним переводчиком.")
+
+    def translate(self, text: str, src='en', dest='ru',
+                  memory: Optional[TranslationMemory] = None) -> RoutedTranslation:
+        """
+        Переводит текст: делит на сегменты, упаковывает в пачки и переводит
+        пачки параллельно через translate_batch.
+        Args:
+            text(str): Текст для перевода.
+            src(str): Язык исходного текста.
+            dest(str): Язык перевода.
+            memory(TranslationMemory): Память переводов.
+        Returns:
+            RoutedTranslation: Переведенный текст и сегменты с переводчиками.
+        Raises:
+            TranslationError: Если часть текста не удалось перевести.
+        """
+        segments = [segment.text for segment in iter_segments(text, YANDEX_SEGMENT_LEN)]
+        batches = pack_batches(segments, YANDEX_MAX_BATCH_CHARS)
+        if not batches:
+            return RoutedTranslation('', [])
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(batches)))) as executor:
+            results = list(executor.map(
+                lambda batch: self.translate_batch(batch, src, dest, memory), batches))
+
+        translator_ids = {}
+        routed = []
+        for batch, (translations, name) in zip(batches, results):
+            if name not in translator_ids:
+                translator_ids[name] = (get_translator_id(name, self.db_name)
+                                        if self.db_name else None)
+            routed.extend(RoutedSegment(source, translation, name, translator_ids[name])
+                          for source, translation in zip(batch, translations))
+        result = RoutedTranslation(' '.join(segment.translation for segment in routed), routed)
+        logger.info(f"Текст переведен, сегментов по переводчикам: {result.translators}.")
+        return result
+
+    def report(self) -> dict[str, dict]:
+        """
+        Возвращает статистику переводчиков.
+        Returns:
+            dict[str, dict]: Для каждого переводчика: состояние, количество
+            вызовов и ошибок, средняя задержка на 1000 символов.
+        """
+        with self._lock:
+            return {name: {
+                "state": stats.state,
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "seconds_per_1000_chars": (stats.seconds_per_char * 1000
+                                           if stats.seconds_per_char is not None else None),
+            } for name, stats in self.stats.items()}
+
+
+_default_router: Optional[TranslatorRouter] = None
+_default_lock = threading.Lock()
+
+
+def default_router() -> TranslatorRouter:
+    """Возвращает общий для процесса маршрутизатор с переводчиками по умолчанию."""
+    global _default_router
+    with _default_lock:
+        if _default_router is None:
+            _default_router = TranslatorRouter()
+        return _default_router
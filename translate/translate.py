@@ -1,63 +1,247 @@
 import os
-import time
-import random
 import logging
 import requests
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
 from dotenv import load_dotenv
-from utils.utils import split_text
+from database.translation_memory import TranslationMemory
+from utils import transport
+from utils.transport import RetryPolicy
+from utils.utils import iter_segments
 
 logger = logging.getLogger(__name__)
 
 
-def text_translator_yandex(text: str, src='en', dest='ru') -> str:
+YANDEX_API_URL = "https://translate.api.cloud.yandex.net/translate/v2/translate"
+# Суммарная длина текстов в одном запросе к Yandex Translate API.
+YANDEX_MAX_BATCH_CHARS = 10000
+YANDEX_SEGMENT_LEN = 500
+YANDEX_MAX_WORKERS = 4
+# Статусы, которыми API отклоняет содержимое или размер пачки. Только на них
+# пачка делится: ошибки ключа, квоты и сети повторились бы для каждой части.
+YANDEX_PAYLOAD_STATUSES = (400, 413)
+
+
+class TranslationError(Exception):
+    """Ошибка перевода, после которой нельзя получить полный текст."""
+
+
+class PayloadError(TranslationError):
+    """API отклонил пачку из-за ее содержимого или размера."""
+
+
+def pack_batches(segments: Iterable[str], max_chars: int) -> list[list[str]]:
     """
-    Переводит текст с использованием Yandex Translate API.
+    Упаковывает сегменты в пачки суммарной длиной не более max_chars.
+    Порядок сегментов сохраняется, сегмент длиннее max_chars попадает в
+    отдельную пачку.
     Args:
-        text (str): Текст для перевода.
-        src (str): Язык исходного текста (например, 'en').
-        dest (str): Язык перевода (например, 'ru').
+        segments(Iterable[str]): Сегменты текста.
+        max_chars(int): Максимальная суммарная длина пачки.
+    Returns:
+        list[list[str]]: Список пачек сегментов.
+    """
+    batches = []
+    batch, batch_len = [], 0
+    for segment in segments:
+        if batch and batch_len + len(segment) > max_chars:
+            batches.append(batch)
+            batch, batch_len = [], 0
+        batch.append(segment)
+        batch_len += len(segment)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _yandex_translate_batch(texts: list[str], src: str, dest: str,
+                            headers: dict) -> list[str]:
+    """
+    Переводит пачку сегментов одним запросом к Yandex Translate API.
+    Raises:
+        PayloadError: Если API отклонил пачку (см. YANDEX_PAYLOAD_STATUSES)
+        или вернул не все переводы.
+        TranslationError: Если запрос завершился другой ошибкой (ключ,
+        квота, сеть).
+    """
+    body = {
+        "sourceLanguageCode": src,
+        "targetLanguageCode": dest,
+        "texts": texts
+    }
+    try:
+        response = transport.post(YANDEX_API_URL, json=body, headers=headers,
+                                  provider="yandex", cost=sum(len(text) for text in texts))
+    except requests.exceptions.RequestException as e:
+        raise TranslationError(f"Ошибка сети при попытке перевода: {e}") from e
+
+    if response.status_code in YANDEX_PAYLOAD_STATUSES:
+        raise PayloadError(f"Пачка отклонена: {response.status_code}")
+    if response.status_code != 200:
+        raise TranslationError(f"Ошибка перевода: {response.status_code}")
+    translations = response.json().get('translations', [])
+    if len(translations) != len(texts):
+        raise PayloadError(f"Получено {len(translations)} переводов вместо {len(texts)}.")
+    return [translation['text'] for translation in translations]
+
+
+def _yandex_translate_splitting(texts: list[str], src: str, dest: str,
+                                headers: dict) -> list[str]:
+    """
+    Переводит пачку, а если API отклонил ее содержимое, делит пополам и
+    переводит части отдельно, чтобы изолировать проблемный сегмент.
+    Остальные ошибки пробрасываются сразу.
+    Raises:
+        TranslationError: Если запрос завершился ошибкой, не связанной с
+        содержимым пачки, или не удалось перевести отдельный сегмент.
+    """
+    try:
+        return _yandex_translate_batch(texts, src, dest, headers)
+    except PayloadError as e:
+        if len(texts) == 1:
+            raise
+        logger.warning(f"{e} Пачка из {len(texts)} сегментов будет разделена.")
+    middle = len(texts) // 2
+    return (_yandex_translate_splitting(texts[:middle], src, dest, headers)
+            + _yandex_translate_splitting(texts[middle:], src, dest, headers))
+
+
+def translate_segments(segments: list[str], translate_batch: Callable, src: str,
+                       dest: str, translator: str,
+                       memory: Optional[TranslationMemory] = None) -> list[Optional[str]]:
+    """
+    Переводит сегменты, используя память переводов, если она задана.
+    В API отправляются только сегменты, которых нет в памяти; полученные
+    переводы сохраняются в память.
+    Args:
+        segments(list[str]): Сегменты текста.
+        translate_batch(Callable): Функция перевода списка сегментов,
+        возвращающая список переводов той же длины (None - сегмент не переведен).
+        src(str): Язык исходного текста.
+        dest(str): Язык перевода.
+        translator(str): Название переводчика.
+        memory(TranslationMemory): Память переводов.
     Returns:
-        str: Переведённый текст или сообщение об ошибке.
+        list[Optional[str]]: Переводы сегментов в исходном порядке.
+    """
+    if memory is None:
+        return translate_batch(segments)
+
+    translations = memory.lookup(segments, src, dest, translator)
+    misses = [index for index in range(len(segments)) if index not in translations]
+    logger.info(f"Найдено в памяти переводов: {len(translations)} из {len(segments)} сегментов.")
+    if misses:
+        translated = translate_batch([segments[index] for index in misses])
+        translations.update(zip(misses, translated))
+        memory.store(((segments[index], translations[index]) for index in misses
+                      if translations[index] is not None), src, dest, translator)
+    return [translations[index] for index in range(len(segments))]
+
+
+def yandex_translate_segments(segments: list[str], src='en', dest='ru',
+                              max_workers=YANDEX_MAX_WORKERS) -> list[str]:
+    """
+    Переводит список сегментов через Yandex Translate API.
+    Сегменты упаковываются в пачки по несколько сегментов на запрос; пачки
+    отправляются параллельно, порядок сегментов сохраняется.
+    Args:
+        segments (list[str]): Сегменты текста.
+        src (str): Язык исходного текста.
+        dest (str): Язык перевода.
+        max_workers (int): Количество одновременно отправляемых пачек.
+    Returns:
+        list[str]: Переводы сегментов.
+    Raises:
+        TranslationError: Если часть сегментов не удалось перевести.
     """
-    YANDEX_API_URL = "https://translate.api.cloud.yandex.net/translate/v2/translate"
     YANDEX_API_KEY = os.environ.get('YANDEX_API_KEY')
 
     headers = {
         "Authorization": f"Api-Key {YANDEX_API_KEY}"
     }
 
-    chanks = split_text(text, 8000)
-    translated_text = []
+    batches = pack_batches(segments, YANDEX_MAX_BATCH_CHARS)
+    if not batches:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        results = executor.map(
+            lambda batch: _yandex_translate_splitting(batch, src, dest, headers), batches)
+        translated = [segment for batch in results for segment in batch]
+    logger.info(f"Переведено {len(translated)} сегментов за {len(batches)} запросов.")
+    return translated
 
-    for chunk in chanks:
-        try:
-            body = {
-                "sourceLanguageCode": src,
-                "targetLanguageCode": dest,
-                "texts": [chunk]
-            }
 
-            response = requests.post(YANDEX_API_URL, json=body, headers=headers)
+def text_translator_yandex(text: str, src='en', dest='ru',
+                           max_workers=YANDEX_MAX_WORKERS,
+                           memory: Optional[TranslationMemory] = None) -> str:
+    """
+    Переводит текст с использованием Yandex Translate API.
+    Текст делится на сегменты, которые переводятся пачками
+    (см. yandex_translate_segments).
+    Args:
+        text (str): Текст для перевода.
+        src (str): Язык исходного текста (например, 'en').
+        dest (str): Язык перевода (например, 'ru').
+        max_workers (int): Количество одновременно отправляемых пачек.
+        memory (TranslationMemory): Память переводов, по умолчанию не используется.
+    Returns:
+        str: Переведённый текст.
+    Raises:
+        TranslationError: Если часть текста не удалось перевести.
+    """
+    def translate_batch(segments: list[str]) -> list[str]:
+        return yandex_translate_segments(segments, src, dest, max_workers)
 
-            if response.status_code == 200:
-                result = response.json()
-                translated_chunk = result['translations'][0]['text']
-                translated_text.append(translated_chunk)
-                logger.info(f"Часть текста успешно переведена: {translated_chunk[:30]}...")
-            else:
-                logger.error(f"Ошибка перевода: {response.status_code}")
-                break
+    segments = [segment.text for segment in iter_segments(text, YANDEX_SEGMENT_LEN)]
+    translated_text = translate_segments(segments, translate_batch, src, dest, "yandex", memory)
+    return ' '.join(translated_text)
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка сети при попытке перевода: {e}")
-            return "Ошибка сети при переводе текста."
 
-    return ' '.join(translated_text)
+def _mymemory_translate_segment(segment: str, src: str, dest: str,
+                                retry: RetryPolicy) -> Optional[str]:
+    """Переводит один сегмент через MyMemory, возвращает None при ошибке."""
+    url = "https://api.mymemory.translated.net/get"
+    params = {
+        'q': segment,
+        'langpair': f'{src}|{dest}'
+    }
+    try:
+        response = transport.get(url, params=params, retry=retry,
+                                 provider="mymemory", cost=len(segment))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Ошибка сети при попытке перевода: {e}. Перевод части текста прерван.")
+        return None
+    if response.status_code != 200:
+        logger.error(f"Ошибка перевода части текста: {response.status_code}. "
+                     f"Превышено количество попыток, перевод части текста прерван.")
+        return None
+    json_response = response.json()
+    translated_chunk = json_response['responseData']['translatedText']
+    logger.info(f"Успешно переведена часть текста: {translated_chunk[:30]}...")
+    return translated_chunk
+
+
+def mymemory_translate_segments(segments: list[str], src='en', dest='ru',
+                                retries=3, backoff_time=2) -> list[Optional[str]]:
+    """
+    Переводит список сегментов через MyMemory (по одному сегменту на запрос).
+    Args:
+        segments(list[str]): Сегменты текста.
+        src(str): Язык оригинального текста.
+        dest(str): Язык перевода.
+        retries(int): Количество повторных попыток в случае неудачи.
+        backoff_time(int): Начальное время задержки между попытками (в секундах).
+    Returns:
+        list[Optional[str]]: Переводы сегментов, None - сегмент не переведен.
+    """
+    retry = RetryPolicy(retries=retries, backoff_time=backoff_time)
+    return [_mymemory_translate_segment(segment, src, dest, retry) for segment in segments]
 
 
 def text_translator_mymemory(text: str, src='en', dest='ru',
-                             retries=3, backoff_time=2) -> str:
+                             retries=3, backoff_time=2,
+                             memory: Optional[TranslationMemory] = None) -> str:
     """
     Переводит текст.
     Переводит полученный текст с языка src, на язык dest, используя
@@ -68,46 +252,17 @@ def text_translator_mymemory(text: str, src='en', dest='ru',
         dest(str): Язык, на который необходимо произвести перевод.
         retries(int): Количество повторных попыток в случае неудачи.
         backoff_time(int): Начальное время задержки между попытками (в секундах).
+        memory(TranslationMemory): Память переводов, по умолчанию не используется.
     Returns:
         str: Переведенный текст.
     Raises:
     """
-    url = "https://api.mymemory.translated.net/get"
-    translated_text = []
-    chunks = split_text(text, 500)
-    for chunk in chunks:
-        for attempt in range(retries):
-            try:
-                params = {
-                    'q': chunk,
-                    'langpair': f'{src}|{dest}'
-                }
-                response = requests.get(url, params=params)
-                if response.status_code == 200:
-                    json_response = response.json()
-                    translated_chunk = json_response['responseData']['translatedText']
-                    translated_text.append(translated_chunk)
-                    logger.info(f"Успешно переведена часть текста: {translated_chunk[:30]}...")
-                    time.sleep(1 + random.uniform(0, 1))
-                    break
-                else:
-                    logger.error(f"Ошибка перевода части текста: {response.status_code}, попытка {attempt+1}.")
-                    if attempt < retries - 1:
-                        wait_time = backoff_time * (2 ** attempt) + random.uniform(0, 1)
-                        logger.info(f"Повтор попытки через {wait_time:.2f} секунд.")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error("Превышено количество попыток. Перевод прерван.")
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Ошибка сети при попытке перевода: {e}")
-                if attempt < retries - 1:
-                    wait_time = backoff_time * (2 ** attempt) + random.uniform(0, 1)
-                    logger.info(f"Повтор попытки через {wait_time:.2f} секунд.")
-                    time.sleep(wait_time)
-                else:
-                    logger.error("Превышено количество попыток. Перевод прерван.")
+    def translate_batch(segments: list[str]) -> list[Optional[str]]:
+        return mymemory_translate_segments(segments, src, dest, retries, backoff_time)
 
-    return ' '.join(translated_text)
+    segments = [segment.text for segment in iter_segments(text, 500)]
+    translated_text = translate_segments(segments, translate_batch, src, dest, "mymemory", memory)
+    return ' '.join(chunk for chunk in translated_text if chunk is not None)
 
 
 def main():
@@ -0,0 +1,202 @@
+import time
+import asyncio
+import logging
+import threading
+
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Лимиты по умолчанию для внешних API: запросов в секунду и единиц
+# (символов или токенов) в минуту. None - без ограничения.
+PROVIDER_LIMITS = {
+    "youtube": {"requests_per_second": 5, "units_per_minute": None},
+    "yandex": {"requests_per_second": 20, "units_per_minute": 1_000_000 // 60},
+    "mymemory": {"requests_per_second": 1, "units_per_minute": None},
+    "openai": {"requests_per_second": 8, "units_per_minute": 200_000},
+}
+
+# Адаптация к ответам 429: скорость уменьшается в THROTTLE_FACTOR раз и
+# затем восстанавливается на RECOVERY_STEP от лимита после каждого
+# успешного запроса.
+THROTTLE_FACTOR = 0.5
+RECOVERY_STEP = 0.05
+MIN_RATE_FRACTION = 0.05
+
+
+class TokenBucket:
+    """
+    Потокобезопасное ведро токенов: пополняется со скоростью rate токенов в
+    секунду до capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float = 1) -> float:
+        """
+        Пытается забрать amount токенов.
+        Args:
+            amount(float): Количество токенов (не больше capacity).
+        Returns:
+            float: 0, если токены получены, иначе время ожидания в секундах.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def release(self, amount: float = 1) -> None:
+        """Возвращает в ведро токены, которые не были использованы."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def drain(self, seconds: float) -> None:
+        """Опустошает ведро так, чтобы следующий токен появился через seconds."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class RateLimiter:
+    """
+    Ограничитель скорости запросов к одному API: ведро запросов и ведро
+    единиц (символов или токенов), общие для всех потоков и задач asyncio.
+    При ответах 429 скорость снижается и затем плавно восстанавливается.
+    """
+
+    def __init__(self, name: str, requests_per_second: Optional[float] = None,
+                 units_per_minute: Optional[float] = None):
+        """
+        Args:
+            name(str): Название API (для логов).
+            requests_per_second(float): Лимит запросов в секунду.
+            units_per_minute(float): Лимит символов или токенов в минуту.
+        """
+        self.name = name
+        self.requests_per_second = requests_per_second
+        self.units_per_minute = units_per_minute
+        self._requests = (TokenBucket(requests_per_second, max(1.0, requests_per_second))
+                          if requests_per_second else None)
+        self._units = (TokenBucket(units_per_minute / 60, units_per_minute)
+                       if units_per_minute else None)
+        self._fraction = 1.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, units: float) -> float:
+        if self._requests is not None:
+            wait = self._requests.try_acquire(1)
+            if wait:
+                return wait
+        if self._units is not None and units:
+            wait = self._units.try_acquire(units)
+            if wait:
+                # Запрос не состоится сейчас, возвращаем токен запроса.
+                if self._requests is not None:
+                    self._requests.release(1)
+                return wait
+        return 0.0
+
+    def acquire(self, units: float = 0) -> float:
+        """
+        Блокирует поток, пока запрос не укладывается в лимиты.
+        Args:
+            units(float): Стоимость запроса в символах или токенах.
+        Returns:
+            float: Общее время ожидания в секундах.
+        """
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(units)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, units: float = 0) -> float:
+        """Асинхронный вариант acquire() для задач asyncio."""
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(units)
+            if not wait:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _set_fraction(self, fraction: float) -> None:
+        self._fraction = fraction
+        if self._requests is not None:
+            self._requests.rate = self.requests_per_second * fraction
+        if self._units is not None:
+            self._units.rate = self.units_per_minute / 60 * fraction
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """
+        Сообщает об ответе 429: снижает скорость и, если известно, выдерживает
+        паузу Retry-After для всех потоков.
+        Args:
+            retry_after(float): Значение заголовка Retry-After в секундах.
+        """
+        with self._lock:
+            self._set_fraction(max(MIN_RATE_FRACTION, self._fraction * THROTTLE_FACTOR))
+            fraction = self._fraction
+        if retry_after and self._requests is not None:
+            self._requests.drain(retry_after)
+        logger.warning(f"API {self.name} ограничивает запросы, скорость снижена "
+                       f"до {fraction:.0%} от лимита.")
+
+    def on_success(self) -> None:
+        """Сообщает об успешном запросе: скорость постепенно восстанавливается."""
+        if self._fraction >= 1.0:
+            return
+        with self._lock:
+            self._set_fraction(min(1.0, self._fraction + RECOVERY_STEP))
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> RateLimiter:
+    """
+    Возвращает общий ограничитель скорости для API.
+    Args:
+        provider(str): Название API из PROVIDER_LIMITS.
+    Returns:
+        RateLimiter: Ограничитель, общий для всего процесса.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = RateLimiter(provider, **PROVIDER_LIMITS.get(provider, {}))
+            _limiters[provider] = limiter
+        return limiter
+
+
+def configure_limiter(provider: str, requests_per_second: Optional[float] = None,
+                      units_per_minute: Optional[float] = None) -> RateLimiter:
+    """
+    Задает лимиты API (например, под квоту конкретного аккаунта).
+    Args:
+        provider(str): Название API.
+        requests_per_second(float): Лимит запросов в секунду.
+        units_per_minute(float): Лимит символов или токенов в минуту.
+    Returns:
+        RateLimiter: Новый ограничитель для API.
+    """
+    limiter = RateLimiter(provider, requests_per_second, units_per_minute)
+    with _limiters_lock:
+        _limiters[provider] = limiter
+    return limiter
@@ -0,0 +1,196 @@
+import time
+import random
+import logging
+import threading
+import requests
+
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from utils.rate_limit import get_limiter
+
+
+logger = logging.getLogger(__name__)
+
+# Таймауты по умолчанию: (соединение, чтение) в секундах.
+DEFAULT_TIMEOUT = (5, 60)
+POOL_MAXSIZE = 16
+
+
+class RetryPolicy(NamedTuple):
+    retries: int = 3
+    backoff_time: float = 2
+    max_backoff: float = 60
+    retry_statuses: tuple = (429, 500, 502, 503, 504)
+
+
+DEFAULT_RETRY = RetryPolicy()
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_stats = {"requests": 0, "retries": 0, "failures": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, value=1) -> None:
+    with _stats_lock:
+        _stats[name] += value
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Возвращает общую сессию с пулом keep-alive соединений для хоста url.
+    Args:
+        url(str): Адрес запроса.
+    Returns:
+        requests.Session: Сессия, общая для всех запросов к этому хосту.
+    """
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+            session.mount(host, adapter)
+            _sessions[host] = session
+        return session
+
+
+def backoff_delay(attempt: int, policy: RetryPolicy = DEFAULT_RETRY) -> float:
+    """
+    Вычисляет задержку перед повторной попыткой (экспоненциальная, с джиттером).
+    Args:
+        attempt(int): Номер неудачной попытки, начиная с 0.
+        policy(RetryPolicy): Политика повторов.
+    Returns:
+        float: Время задержки в секундах.
+    """
+    delay = min(policy.max_backoff, policy.backoff_time * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
+
+
+def retry_after_delay(response: requests.Response) -> Optional[float]:
+    """
+    Разбирает заголовок Retry-After (число секунд или HTTP-дата).
+    Args:
+        response(requests.Response): Ответ сервера.
+    Returns:
+        Optional[float]: Задержка в секундах или None, если заголовка нет.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def request(method: str, url: str, retry: RetryPolicy = DEFAULT_RETRY,
+            timeout=DEFAULT_TIMEOUT, provider: Optional[str] = None, cost: float = 0,
+            **kwargs) -> requests.Response:
+    """
+    Выполняет HTTP-запрос через общий пул соединений с повторами.
+    Повторяет запрос при сетевых ошибках и статусах из retry.retry_statuses,
+    учитывая заголовок Retry-After. Остальные ответы возвращаются как есть.
+    Если задан provider, каждая попытка проходит через общий ограничитель
+    скорости этого API, а ответы 429 снижают его скорость.
+    Args:
+        method(str): HTTP-метод.
+        url(str): Адрес запроса.
+        retry(RetryPolicy): Политика повторов.
+        timeout: Таймаут (соединение, чтение) в секундах.
+        provider(str): Название API для ограничителя скорости (см.
+        utils.rate_limit.PROVIDER_LIMITS).
+        cost(float): Стоимость запроса в символах или токенах.
+        **kwargs: Параметры requests (params, json, headers, ...).
+    Returns:
+        requests.Response: Ответ сервера (последний, если попытки исчерпаны).
+    Raises:
+        requests.exceptions.RequestException: Если все попытки завершились
+        сетевой ошибкой.
+    """
+    session = get_session(url)
+    limiter = get_limiter(provider) if provider else None
+    attempts = max(1, retry.retries)
+    for attempt in range(attempts):
+        if limiter is not None:
+            limiter.acquire(cost)
+        _count("requests")
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == attempts - 1:
+                _count("failures")
+                raise
+            delay = backoff_delay(attempt, retry)
+            logger.warning(f"Ошибка сети при запросе к {urlsplit(url).netloc}: {e}. "
+                           f"Попытка {attempt + 1} из {attempts}, повтор через {delay:.2f} секунд.")
+        else:
+            if limiter is not None:
+                if response.status_code == 429:
+                    limiter.on_throttle(retry_after_delay(response))
+                elif response.status_code < 400:
+                    limiter.on_success()
+            if response.status_code not in retry.retry_statuses or attempt == attempts - 1:
+                if response.status_code >= 400:
+                    _count("failures")
+                return response
+            delay = retry_after_delay(response)
+            if delay is None:
+                delay = backoff_delay(attempt, retry)
+            delay = min(delay, retry.max_backoff)
+            logger.warning(f"Ответ {response.status_code} от {urlsplit(url).netloc}. "
+                           f"Попытка {attempt + 1} из {attempts}, повтор через {delay:.2f} секунд.")
+        _count("retries")
+        time.sleep(delay)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET-запрос через request()."""
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """POST-запрос через request()."""
+    return request("POST", url, **kwargs)
+
+
+def stats() -> dict:
+    """
+    Возвращает счетчики транспорта.
+    Returns:
+        dict: Количество запросов, повторов, неудач, а также открытых и
+        переиспользованных соединений по всем пулам.
+    """
+    with _stats_lock:
+        result = dict(_stats)
+    connections = reused = 0
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    for session in sessions:
+        for adapter in session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                connections += pool.num_connections
+                reused += max(0, pool.num_requests - pool.num_connections)
+    result["connections"] = connections
+    result["reused"] = reused
+    return result
+
+
+def close() -> None:
+    """Закрывает все сессии и их пулы соединений."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
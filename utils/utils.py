@@ -1,10 +1,122 @@
+import re
+
+from typing import Iterator, NamedTuple
+
+
+# Граница предложения: знак конца предложения, закрывающие кавычки/скобки и
+# пробельный символ после них.
+SENTENCE_END = re.compile(r'[.!?…]+["»”)\]]*\s+')
+WHITESPACE = re.compile(r'\s+')
+
+# Средняя стоимость символа в токенах: латиница кодируется примерно по 4
+# символа на токен, кириллица и прочие символы - примерно по 2.5.
+ASCII_TOKEN_COST = 1 / 4
+NON_ASCII_TOKEN_COST = 1 / 2.5
+
+
+class Segment(NamedTuple):
+    text: str
+    start: int
+    end: int
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Приблизительно оценивает количество токенов в тексте.
+    Args:
+        text (str): Исходный текст.
+    Returns:
+        int: Оценка количества токенов.
+    """
+    ascii_chars = sum(1 for char in text if char.isascii())
+    cost = ascii_chars * ASCII_TOKEN_COST + (len(text) - ascii_chars) * NON_ASCII_TOKEN_COST
+    return int(cost + 0.999)
+
+
+def _window_end(text: str, start: int, max_len: int, unit: str) -> int:
+    """Возвращает конец окна, начинающегося в start, длиной max_len единиц."""
+    if unit == "chars":
+        return min(len(text), start + max_len)
+    budget = float(max_len)
+    position = start
+    while position < len(text):
+        budget -= ASCII_TOKEN_COST if text[position].isascii() else NON_ASCII_TOKEN_COST
+        if budget < 0:
+            break
+        position += 1
+    return max(position, start + 1)
+
+
+def _last_match_end(pattern: re.Pattern, text: str, start: int, end: int) -> int:
+    """Возвращает конец последнего совпадения pattern в text[start:end] или -1."""
+    last = -1
+    for match in pattern.finditer(text, start, end):
+        last = match.end()
+    return last
+
+
+def iter_segments(text: str, max_len: int, unit="chars") -> Iterator[Segment]:
+    """
+    Лениво разбивает текст на сегменты по границам предложений.
+    Каждый сегмент не превышает max_len символов (или оценочных токенов).
+    Разрез делается по последней границе предложения во второй половине
+    окна, если ее нет - по последнему пробелу, и только для сплошного текста без
+    пробелов - посреди слова. Пробелы на границах сегментов отбрасываются,
+    а смещения start/end указывают на сегмент в исходном тексте:
+    text[segment.start:segment.end] == segment.text.
+    Args:
+        text (str): Исходный текст.
+        max_len (int): Максимальная длина одного сегмента.
+        unit (str): Единица длины: "chars" (символы) или "tokens" (токены).
+    Yields:
+        Segment: Текст сегмента и его смещения в исходном тексте.
+    Raises:
+        ValueError: Если max_len не положительный или unit неизвестен.
+    """
+    if max_len <= 0:
+        raise ValueError("max_len должно быть больше нуля.")
+    if unit not in ("chars", "tokens"):
+        raise ValueError(f"Неизвестная единица длины: {unit}.")
+
+    start = 0
+    length = len(text)
+    while start < length:
+        # Пропускаем пробелы между сегментами.
+        while start < length and text[start].isspace():
+            start += 1
+        if start >= length:
+            break
+
+        end = _window_end(text, start, max_len, unit)
+        if end < length:
+            # Граница предложения используется, только если она во второй
+            # половине окна, иначе сегменты получатся слишком короткими.
+            cut = _last_match_end(SENTENCE_END, text, start, end + 1)
+            if cut <= start + (end - start) // 2:
+                # Если окно кончается на пробеле, слово не разрезается и
+                # окно используется целиком.
+                if text[end].isspace():
+                    cut = end
+                else:
+                    cut = _last_match_end(WHITESPACE, text, start, end + 1)
+            if cut > start:
+                end = cut
+
+        segment_end = end
+        while segment_end > start and text[segment_end - 1].isspace():
+            segment_end -= 1
+        yield Segment(text[start:segment_end], start, segment_end)
+        start = end
+
+
 def split_text(text: str, max_len: int) -> list[str]:
     """
     Разбивает текст на части, чтобы каждая часть не превышала max_len символов.
+    Части режутся по границам предложений и слов (см. iter_segments).
     Args:
         text (str): Исходный текст.
         max_len (int): Максимальная длина одной части.
     Returns:
         list[str]: Список частей текста.
     """
-    return [text[i:i+max_len] for i in range(0, len(text), max_len)]
+    return [segment.text for segment in iter_segments(text, max_len)]